@@ -16,8 +16,13 @@
 
 from eulcore.django.testsetup import starting_tests, finished_tests
 from eulcore.django.existdb.db import ExistDB, ExistDBException
+from eulcore.existdb.query import lookup_usage
 from django.conf import settings
 
+# record the lookups used with each model, for index configuration
+if getattr(settings, 'EXISTDB_RECORD_LOOKUPS', False):
+    lookup_usage.enabled = True
+
 _stored_default_collection = None
 
 def _use_test_collection(sender, **kwargs):    
@@ -34,6 +39,8 @@ def _use_test_collection(sender, **kwargs):
     db = ExistDB()
     # create test collection (don't complain if collection already exists)
     db.createCollection(settings.EXISTDB_ROOT_COLLECTION, True)
+    # tests exercise the application's queries; record the lookups they use
+    lookup_usage.enabled = True
 
 
 def _restore_root_collection(sender, **kwargs):
@@ -0,0 +1,78 @@
+# file django/existdb/cache.py
+#
+#   Copyright 2010 Emory University General Library
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Cache :class:`~eulcore.existdb.query.QuerySet` results with the Django
+cache framework.
+
+When ``EXISTDB_CACHE_RESULTS`` is True in Django settings, querysets
+created by :class:`~eulcore.django.existdb.manager.Manager` use
+:func:`default_backend`, so identical searches from any process sharing
+the Django cache are answered without contacting eXist.
+``EXISTDB_CACHE_TIMEOUT`` may be used to set the number of seconds results
+are cached; by default, the Django cache default timeout is used.
+
+"""
+
+from django.core.cache import cache as django_cache
+from django.conf import settings
+
+from eulcore.existdb.cache import CacheBackend
+
+__all__ = ['DjangoCacheBackend', 'default_backend']
+
+
+class DjangoCacheBackend(CacheBackend):
+    """:class:`~eulcore.existdb.cache.CacheBackend` that stores values in a
+    Django cache.
+
+    :param cache: Django cache to use; defaults to the configured cache
+    :param timeout: optional number of seconds values are kept; defaults to
+        the cache default timeout
+    """
+
+    def __init__(self, cache=None, timeout=None):
+        super(DjangoCacheBackend, self).__init__()
+        self.cache = cache or django_cache
+        self.timeout = timeout
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value):
+        if self.timeout is None:
+            self.cache.set(key, value)
+        else:
+            self.cache.set(key, value, self.timeout)
+
+    def delete(self, key):
+        self.cache.delete(key)
+
+    def clear(self):
+        # Django caches may be shared with other data, so keys can't be
+        # removed selectively; changing generation tokens for the whole
+        # database makes all cached results unreachable instead
+        self.invalidate('/', collection=True)
+
+
+_default_backend = None
+
+def default_backend():
+    "Get the shared :class:`DjangoCacheBackend` configured by Django settings."
+    global _default_backend
+    if _default_backend is None:
+        _default_backend = DjangoCacheBackend(
+            timeout=getattr(settings, 'EXISTDB_CACHE_TIMEOUT', None))
+    return _default_backend
@@ -14,6 +14,8 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+import json
 import urlparse
 import warnings
 
@@ -22,7 +24,7 @@ from eulcore.existdb.db import ExistDB as BaseExistDB
 from eulcore.existdb.db import ExistDBException
 from django.core.paginator import Paginator, Page
 
-__all__ = ['ExistDB', 'ResultPaginator']
+__all__ = ['ExistDB', 'ResultPaginator', 'CursorPaginator']
 
 #ExistDBException = db.ExistDBException
 
@@ -106,7 +108,8 @@ class ResultPaginator(Paginator):
 
     def _get_count(self):
         "Returns the total number of hits, across all pages."
-        self._count = self._qry_result.hits
+        if self._count is None:
+            self._count = self._qry_result.hits
         return self._count
     count = property(_get_count)
 
@@ -127,3 +130,68 @@ class ResultPaginator(Paginator):
         #paginator assumes all data was returned however eXist returns data in chunks
         #so we always want all results 
         return Page(self.object_list, page, self)
+
+
+class CursorPaginator(object):
+
+    """Paginate a sorted :class:`eulcore.existdb.query.QuerySet` using
+    cursor pagination (see :meth:`~eulcore.existdb.query.QuerySet.after`).
+
+    Unlike :class:`ResultPaginator`, pages are identified by an opaque
+    cursor string rather than a page number, so deep pages are as fast to
+    retrieve as the first one; only "next page" navigation is supported.
+
+    :param queryset: sorted :class:`~eulcore.existdb.query.QuerySet`
+    :param per_page: number of results per page
+
+    """
+
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+
+    def page(self, cursor=None):
+        """Returns a :class:`CursorPage` for the results after the specified
+        cursor string, as found in :attr:`CursorPage.next_cursor`.  If the
+        cursor is empty or invalid, returns the first page."""
+        after = self.decode_cursor(cursor)
+        items, next_cursor = self.queryset.cursor_page(after, self.per_page)
+        return CursorPage(items, cursor, self.encode_cursor(next_cursor), self)
+
+    def encode_cursor(self, cursor):
+        "Convert a cursor tuple into a string suitable for use in a URL."
+        if cursor is None:
+            return None
+        return urlsafe_b64encode(json.dumps(cursor))
+
+    def decode_cursor(self, cursor):
+        "Convert a cursor string back into a cursor tuple."
+        if not cursor:
+            return None
+        try:
+            value, cursor_id = json.loads(urlsafe_b64decode(str(cursor)))
+        except (TypeError, ValueError):
+            return None
+        return (value, cursor_id)
+
+
+class CursorPage(object):
+
+    "A single page of results returned by :class:`CursorPaginator`."
+
+    def __init__(self, object_list, cursor, next_cursor, paginator):
+        self.object_list = object_list
+        self.cursor = cursor
+        "cursor string for this page; None for the first page"
+        self.next_cursor = next_cursor
+        "cursor string for the next page; None for the last page"
+        self.paginator = paginator
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
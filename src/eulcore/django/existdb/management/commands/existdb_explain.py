@@ -0,0 +1,59 @@
+# file django/existdb/management/commands/existdb_explain.py
+# 
+#   Copyright 2010 Emory University General Library
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import get_apps
+from eulcore.django.existdb.management.commands.existdb_index import _xmlmodel_classes
+from eulcore.existdb.exceptions import ExistDBException
+
+class Command(BaseCommand):
+    help = """Report which eXist indexes are used by common queries.
+
+Runs the queries listed in each XmlModel's explain_queries attribute (a list
+of filter arguments, e.g., [{'title__fulltext_terms': 'term'},
+{'date__gte': '2001'}]) with every manager on the model, and reports which
+filters eXist answered using an index and which required a scan.  Models
+may be limited by name (e.g., existdb_explain Article Author).
+
+Query tracing requires an eXist user in the DBA group.
+            """
+    args = '[model name ...]'
+
+    def handle(self, *args, **options):
+        # make sure all application models have been loaded
+        get_apps()
+        models = [model for model in _xmlmodel_classes()
+                  if getattr(model, 'explain_queries', None)
+                  and (not args or model.__name__ in args)]
+        if not models:
+            print "No XmlModels with explain_queries found"
+            return
+
+        scanned = 0
+        try:
+            for model in models:
+                for name, manager in model._managers.iteritems():
+                    for filters in model.explain_queries:
+                        plan = manager.filter(**filters).explain()
+                        print '%s.%s.filter(%s)' % (model.__name__, name,
+                            ', '.join(['%s=%r' % (k, v) for k, v in filters.iteritems()]))
+                        print plan.report()
+                        print
+                        scanned += len(plan.scanned_filters())
+        except ExistDBException, err:
+            raise CommandError(err)
+
+        print '%d filter(s) evaluated without an index' % scanned
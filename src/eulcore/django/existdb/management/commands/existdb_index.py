@@ -16,7 +16,18 @@
 
 from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
+from django.db.models import get_apps
 from eulcore.django.existdb import ExistDB
+from eulcore.django.existdb.models import XmlModel
+from eulcore.existdb.indexconfig import IndexConfig
+
+def _xmlmodel_classes(cls=XmlModel):
+    # all loaded subclasses of XmlModel
+    classes = []
+    for subclass in cls.__subclasses__():
+        classes.append(subclass)
+        classes.extend(_xmlmodel_classes(subclass))
+    return classes
 
 class Command(BaseCommand):    
     help = """Tasks for managing eXist-db index configuration file.
@@ -26,8 +37,14 @@ Available subcommands:
   show      - show the contents of index configuration file currently in eXist
   show-info - show information about index configuration file in eXist (owner, date modified, etc.)
   remove    - remove index configuration from eXist
+  generate  - generate an index configuration for the fields of all XmlModels
+  diff      - compare the generated index configuration with the one in eXist
+
+Index generation uses the lookups listed in each XmlModel's index_lookups
+attribute (e.g., ['title__fulltext_terms', 'date__gte']), or range indexes
+for all fields of models that do not list any.
             """
-    args = 'load | show | show-info | remove'
+    args = 'load | show | show-info | remove | generate | diff'
     
     def handle(self, *args, **options):
         if not len(args) or args[0] == 'help':
@@ -35,21 +52,26 @@ Available subcommands:
             return
 
         cmd = args[0]
-        if cmd not in ['load', 'show', 'show-info', 'remove']:
+        if cmd not in ['load', 'show', 'show-info', 'remove', 'generate', 'diff']:
             print "Command '%s' not recognized" % cmd
             print self.help
             return
 
-        # check for required settings (used in all modes)
+        if cmd == 'generate':
+            print self.generate_config().to_xml()
+            return
+
+        # check for required settings (used in all remaining modes)
         if not hasattr(settings, 'EXISTDB_ROOT_COLLECTION') or not settings.EXISTDB_ROOT_COLLECTION:
             raise CommandError("EXISTDB_ROOT_COLLECTION setting is missing")
             return
-        if not hasattr(settings, 'EXISTDB_INDEX_CONFIGFILE') or not settings.EXISTDB_INDEX_CONFIGFILE:
+        if cmd != 'diff' and (not hasattr(settings, 'EXISTDB_INDEX_CONFIGFILE') \
+                              or not settings.EXISTDB_INDEX_CONFIGFILE):
             raise CommandError("EXISTDB_INDEX_CONFIGFILE setting is missing")
             return
 
         collection = settings.EXISTDB_ROOT_COLLECTION
-        index = settings.EXISTDB_INDEX_CONFIGFILE
+        index = getattr(settings, 'EXISTDB_INDEX_CONFIGFILE', None)
 
         try:
             self.db = ExistDB()
@@ -57,8 +79,8 @@ Available subcommands:
             # check there is already an index config
             hasindex = self.db.hasCollectionIndex(collection)
 
-            # for all commands but load, nothing to do if config collection does not exist
-            if not hasindex and cmd != 'load':
+            # for all commands but load and diff, nothing to do if config collection does not exist
+            if not hasindex and cmd not in ['load', 'diff']:
                 print "Collection %s has no index configuration" % collection
                 return
 
@@ -94,6 +116,20 @@ is new or has changed, you should reindex the collection.
                 for field, val in index_desc.items():
                     print "%s:\t%s" % (field, val)
 
+            elif cmd == 'diff':
+                # compare generated index configuration with the one in eXist
+                if hasindex:
+                    current = self.db.getDoc(self.db._collectionIndexPath(collection))
+                else:
+                    current = IndexConfig()
+                missing, extra = self.generate_config().diff(current)
+                if not missing and not extra:
+                    print "Index configuration in eXist has all generated indexes"
+                for definition in missing:
+                    print "+ %s" % ' '.join(definition)
+                for definition in extra:
+                    print "- %s" % ' '.join(definition)
+
             elif cmd == 'remove':
                 # remove any collection index in eXist
                 if self.db.removeCollectionIndex(collection):
@@ -105,3 +141,11 @@ is new or has changed, you should reindex the collection.
             # better error messages would be nice...
             raise CommandError(err)
 
+    def generate_config(self):
+        "Generate an :class:`IndexConfig` for all XmlModel classes."
+        # make sure all application models have been loaded
+        get_apps()
+        config = IndexConfig()
+        for model in _xmlmodel_classes():
+            config.add_model(model)
+        return config
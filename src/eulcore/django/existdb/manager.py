@@ -15,6 +15,7 @@
 #   limitations under the License.
 
 from django.conf import settings
+from eulcore.django.existdb.cache import default_backend
 from eulcore.django.existdb.db import ExistDB
 from eulcore.existdb.query import QuerySet
 
@@ -67,10 +68,14 @@ class Manager(object):
         else:
             fulltext_opts = {}
 
+        cache_backend = None
+        if getattr(settings, 'EXISTDB_CACHE_RESULTS', False):
+            cache_backend = default_backend()
 
         return QuerySet(model=self.model, xpath=self.xpath, using=ExistDB(),
                         collection=settings.EXISTDB_ROOT_COLLECTION,
-                        fulltext_options=fulltext_opts)
+                        fulltext_options=fulltext_opts,
+                        cache_backend=cache_backend)
 
     #######################
     # PROXIES TO QUERYSET #
@@ -103,3 +108,6 @@ class Manager(object):
     def get(self, *args, **kwargs):
         return self.get_query_set().get(*args, **kwargs)
 
+    def explain(self):
+        return self.get_query_set().explain()
+
@@ -0,0 +1,92 @@
+# file django/existdb/middleware.py
+#
+#   Copyright 2010 Emory University General Library
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Attribute eXist requests to Django views.
+
+Add :class:`ExistQueryMiddleware` to ``MIDDLEWARE_CLASSES`` to collect the
+:class:`~eulcore.existdb.instrumentation.QueryEvent` objects generated
+while handling each request.  Events are tagged with the name of the view
+that handled the request, and any request slower than
+``EXISTDB_SLOW_QUERY_TIME`` seconds (default 1) is logged as a warning.
+
+To display eXist requests on debug pages, add
+:func:`existdb_queries` to ``TEMPLATE_CONTEXT_PROCESSORS``.
+
+"""
+
+import logging
+import threading
+
+from django.conf import settings
+
+from eulcore.existdb import instrumentation
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+def _collect(event):
+    # instrumentation listener: add events to the current request, if any
+    events = getattr(_local, 'events', None)
+    if events is not None:
+        event.view = _local.view
+        events.append(event)
+
+
+class ExistQueryMiddleware(object):
+    """Collect eXist request events for each Django request, log slow
+    eXist requests with the view that made them, and, when ``DEBUG`` is
+    enabled, report the number and total time of eXist requests in an
+    ``X-Existdb-Queries`` response header.
+
+    Events are available during the request as ``request.existdb_queries``.
+    """
+
+    def __init__(self):
+        self.slow_query_time = getattr(settings, 'EXISTDB_SLOW_QUERY_TIME', 1.0)
+        instrumentation.connect(_collect)
+
+    def process_request(self, request):
+        _local.events = request.existdb_queries = []
+        _local.view = None
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _local.view = '%s.%s' % (view_func.__module__, view_func.__name__)
+
+    def process_response(self, request, response):
+        events = getattr(_local, 'events', None)
+        _local.events = None
+        if not events:
+            return response
+
+        for event in events:
+            if event.elapsed >= self.slow_query_time:
+                logger.warning('slow eXist %s (%.3f sec) in view %s for %s\n%s' % \
+                               (event.method, event.elapsed, event.view,
+                                request.path, event.xquery or ''))
+        if settings.DEBUG:
+            response['X-Existdb-Queries'] = '%d requests, %.1f ms' % \
+                (len(events), sum([e.elapsed for e in events]) * 1000)
+        return response
+
+
+def existdb_queries(request):
+    """Template context processor that adds the eXist requests made while
+    handling the current request as ``existdb_queries``, when ``DEBUG`` is
+    enabled and :class:`ExistQueryMiddleware` is installed."""
+    if not settings.DEBUG:
+        return {}
+    return {'existdb_queries': getattr(request, 'existdb_queries', [])}
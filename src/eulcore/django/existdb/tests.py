@@ -20,13 +20,16 @@ import unittest
 from urlparse import urlsplit, urlunsplit
 
 from django.conf import settings
+from django.http import HttpRequest, HttpResponse
 
 from eulcore import xmlmap
 from eulcore.django.existdb.db import ExistDB
 from eulcore.django.existdb.manager import Manager
+from eulcore.django.existdb.middleware import ExistQueryMiddleware
 from eulcore.django.existdb.models import XmlModel
 from eulcore.django.existdb.templatetags.existdb import exist_matches
 import eulcore.existdb as nondjangoexistdb
+from eulcore.existdb import instrumentation
 from eulcore.existdb.db import EXISTDB_NAMESPACE
 from eulcore.xmlmap  import XmlObject
 
@@ -164,3 +167,33 @@ case files</title>""" % {'ex': EXISTDB_NAMESPACE}
             in format, 'second and third exist:match tags converted')
 
 
+class ExistQueryMiddlewareTest(unittest.TestCase):
+
+    def setUp(self):
+        self._DEBUG = settings.DEBUG
+        settings.DEBUG = True
+        self.middleware = ExistQueryMiddleware()
+
+    def tearDown(self):
+        settings.DEBUG = self._DEBUG
+
+    def test_request_events(self):
+        def view(request):
+            pass
+        request = HttpRequest()
+        self.middleware.process_request(request)
+        self.middleware.process_view(request, view, [], {})
+        with instrumentation.record('query', None, xquery='//a'):
+            pass
+        response = self.middleware.process_response(request, HttpResponse())
+
+        self.assertEqual(1, len(request.existdb_queries))
+        event = request.existdb_queries[0]
+        self.assertEqual('//a', event.xquery)
+        self.assertEqual('%s.view' % __name__, event.view)
+        self.assert_(response['X-Existdb-Queries'].startswith('1 requests'))
+
+        # events outside of a request are not collected
+        with instrumentation.record('query', None):
+            pass
+        self.assertEqual(1, len(request.existdb_queries))
@@ -55,6 +55,21 @@ the configured Fedora credentials should use the following settings::
     FEDORA_TEST_USER = 'testuser'
     FEDORA_TEST_PASSWORD = 'testpassword'
 
+To cache datastream content (see :mod:`eulcore.fedora.cache`) for
+objects retrieved with :class:`~eulcore.django.fedora.server.Repository`,
+enable the content cache, optionally with a directory for content cached
+on disk::
+
+    FEDORA_CONTENT_CACHE = True
+    FEDORA_CONTENT_CACHE_DIR = '/var/cache/myapp/fedora'
+
+Connections to Fedora are pooled and shared by all threads; to limit the
+number of connections or set how long unused connections are kept open
+(in seconds), use::
+
+    FEDORA_CONNECTION_POOL_SIZE = 10
+    FEDORA_CONNECTION_IDLE_TIMEOUT = 30
+
 """
 
 
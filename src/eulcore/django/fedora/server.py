@@ -18,23 +18,43 @@ import warnings
 
 from django.conf import settings
 from eulcore.fedora import server, util
+from eulcore.fedora.cache import DatastreamCache
 from eulcore.django.fedora import cryptutil
 
 _connection = None
+_content_cache = None
 
 def init_pooled_connection(fedora_root=None):
     '''Initialize pooled connection for use with :class:`Repository`.
 
+    Connections to the Fedora server are shared by all threads, up to
+    ``FEDORA_CONNECTION_POOL_SIZE`` connections (if set in Django settings;
+    see :class:`eulcore.fedora.util.HttpServerConnection`).  Unused
+    connections are closed after ``FEDORA_CONNECTION_IDLE_TIMEOUT``
+    seconds, if set.
+
     :param fedora_root: base fedora url to use for connection.  If not specified,
         uses FEDORA_ROOT from django settings
     '''
     global _connection
     if fedora_root is None:
         fedora_root = settings.FEDORA_ROOT
-    _connection = util.RelativeServerConnection(fedora_root)
+    _connection = util.RelativeServerConnection(fedora_root,
+        max_size=getattr(settings, 'FEDORA_CONNECTION_POOL_SIZE', None),
+        idle_timeout=getattr(settings, 'FEDORA_CONNECTION_IDLE_TIMEOUT', None))
 
 init_pooled_connection()
 
+def content_cache():
+    '''Get the shared :class:`~eulcore.fedora.cache.DatastreamCache` configured
+    by Django settings, or None if ``FEDORA_CONTENT_CACHE`` is not enabled.
+    Content is cached on disk in ``FEDORA_CONTENT_CACHE_DIR``, if set.'''
+    global _content_cache
+    if _content_cache is None and getattr(settings, 'FEDORA_CONTENT_CACHE', False):
+        _content_cache = DatastreamCache(
+            directory=getattr(settings, 'FEDORA_CONTENT_CACHE_DIR', None))
+    return _content_cache
+
 class Repository(server.Repository):
     """Connect to a Fedora Repository based on configuration in ``settings.py``.
 
@@ -82,6 +102,8 @@ class Repository(server.Repository):
         if hasattr(settings, 'FEDORA_PIDSPACE'):
             self.default_pidspace = settings.FEDORA_PIDSPACE
 
+        self.content_cache = content_cache()
+
 
 # session key for storing a user password that will be used for Fedora access
 # - used here and in eulcore.django.fedora.views
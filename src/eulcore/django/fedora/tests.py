@@ -3,9 +3,10 @@ from StringIO import StringIO
 import unittest
 
 from django.conf import settings
-from django.http import Http404
+from django.http import Http404, HttpRequest
 from django.template import Context, Template
 
+from eulcore.fedora.cache import DatastreamCache
 from eulcore.fedora.util import RequestFailed, PermissionDenied
 from eulcore.fedora.models import DigitalObject, Datastream, FileDatastream
 from eulcore.django.fedora.server import Repository
@@ -102,8 +103,9 @@ class FedoraViewsTest(unittest.TestCase):
         self.obj.api.purgeObject(self.obj.pid)
 
     def test_raw_datastream(self):        
+        rqst = HttpRequest()
         # DC
-        response = raw_datastream('rqst', self.obj.pid, 'DC')
+        response = raw_datastream(rqst, self.obj.pid, 'DC')
         expected, got = 200, response.status_code
         self.assertEqual(expected, got,
             'Expected %s but returned %s for raw_datastream view of DC' \
@@ -118,7 +120,7 @@ class FedoraViewsTest(unittest.TestCase):
         self.assert_('<dc:title>%s</dc:title>' % self.obj.dc.content.title in response.content)
 
         # RELS-EXT
-        response = raw_datastream('rqst', self.obj.pid, 'RELS-EXT')
+        response = raw_datastream(rqst, self.obj.pid, 'RELS-EXT')
         expected, got = 200, response.status_code
         self.assertEqual(expected, got,
             'Expected %s but returned %s for raw_datastream view of RELS-EXT' \
@@ -129,7 +131,7 @@ class FedoraViewsTest(unittest.TestCase):
                 % (expected, got))
 
         # TEXT  (non-xml content)
-        response = raw_datastream('rqst', self.obj.pid, 'TEXT')
+        response = raw_datastream(rqst, self.obj.pid, 'TEXT')
         expected, got = 200, response.status_code
         self.assertEqual(expected, got,
             'Expected %s but returned %s for raw_datastream view of TEXT' \
@@ -144,7 +146,7 @@ class FedoraViewsTest(unittest.TestCase):
         self.assertEqual(len(self.obj.text.content), int(response['Content-Length']))
 
         # IMAGE (binary content)
-        response = raw_datastream('rqst', self.obj.pid, 'IMAGE')
+        response = raw_datastream(rqst, self.obj.pid, 'IMAGE')
         expected, got = 200, response.status_code
         self.assertEqual(expected, got,
             'Expected %s but returned %s for raw_datastream view of IMAGE' \
@@ -160,20 +162,86 @@ class FedoraViewsTest(unittest.TestCase):
             'content-length header should be set in the response for binary datastreams')
 
         # non-existent datastream should 404
-        self.assertRaises(Http404, raw_datastream, 'rqst', self.obj.pid, 'BOGUS-DSID')        
+        self.assertRaises(Http404, raw_datastream, rqst, self.obj.pid, 'BOGUS-DSID')        
 
         # non-existent record should 404
-        self.assertRaises(Http404, raw_datastream, 'rqst', 'bogus-pid:1', 'DC')
+        self.assertRaises(Http404, raw_datastream, rqst, 'bogus-pid:1', 'DC')
 
         # check type handling?
 
         # set extra headers in the response
         extra_headers = {'Content-Disposition': 'attachment; filename=foo.txt'}
-        response = raw_datastream('rqst', self.obj.pid, 'TEXT',
+        response = raw_datastream(rqst, self.obj.pid, 'TEXT',
             headers=extra_headers)
         self.assertTrue(response.has_header('Content-Disposition'))
         self.assertEqual(response['Content-Disposition'], extra_headers['Content-Disposition'])
 
+    def test_raw_datastream_range(self):
+        text = self.obj.text.content
+        rqst = HttpRequest()
+        rqst.META['HTTP_RANGE'] = 'bytes=0-5'
+        response = raw_datastream(rqst, self.obj.pid, 'TEXT')
+        self.assertEqual(206, response.status_code)
+        self.assertEqual(text[:6], response.content)
+        self.assertEqual('bytes 0-5/%d' % len(text), response['Content-Range'])
+        self.assertEqual(6, int(response['Content-Length']))
+        self.assertEqual('bytes', response['Accept-Ranges'])
+        self.assertFalse(response.has_header('Content-MD5'),
+            'checksum for the whole datastream should not be sent with partial content')
+
+        # open-ended and suffix ranges
+        rqst.META['HTTP_RANGE'] = 'bytes=7-'
+        response = raw_datastream(rqst, self.obj.pid, 'TEXT')
+        self.assertEqual(text[7:], response.content)
+        rqst.META['HTTP_RANGE'] = 'bytes=-7'
+        response = raw_datastream(rqst, self.obj.pid, 'TEXT')
+        self.assertEqual(text[-7:], response.content)
+
+        # unsatisfiable range
+        rqst.META['HTTP_RANGE'] = 'bytes=%d-' % (len(text) + 10)
+        response = raw_datastream(rqst, self.obj.pid, 'TEXT')
+        self.assertEqual(416, response.status_code)
+        self.assertEqual('bytes */%d' % len(text), response['Content-Range'])
+
+        # multiple ranges are not supported; full content is returned
+        rqst.META['HTTP_RANGE'] = 'bytes=0-1,4-5'
+        response = raw_datastream(rqst, self.obj.pid, 'TEXT')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(text, response.content)
+
+        # ranges don't apply to xml datastreams
+        rqst.META['HTTP_RANGE'] = 'bytes=0-5'
+        response = raw_datastream(rqst, self.obj.pid, 'DC')
+        self.assertEqual(200, response.status_code)
+
+    def test_raw_datastream_not_modified(self):
+        rqst = HttpRequest()
+        rqst.META['HTTP_IF_NONE_MATCH'] = '"%s"' % self.obj.text.checksum
+        response = raw_datastream(rqst, self.obj.pid, 'TEXT')
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(self.obj.text.checksum, response['ETag'])
+        self.assertEqual('', response.content)
+
+        rqst.META['HTTP_IF_NONE_MATCH'] = '"other", W/"%s"' % self.obj.text.checksum
+        response = raw_datastream(rqst, self.obj.pid, 'TEXT')
+        self.assertEqual(304, response.status_code)
+
+        rqst.META['HTTP_IF_NONE_MATCH'] = '"other"'
+        response = raw_datastream(rqst, self.obj.pid, 'TEXT')
+        self.assertEqual(200, response.status_code)
+
+    def test_raw_datastream_cache(self):
+        repo = Repository()
+        repo.content_cache = DatastreamCache()
+        rqst = HttpRequest()
+        response = raw_datastream(rqst, self.obj.pid, 'TEXT', repo=repo)
+        self.assertEqual(self.obj.text.content, response.content)
+        self.assertEqual(1, len(repo.content_cache.memory))
+        rqst.META['HTTP_RANGE'] = 'bytes=0-5'
+        response = raw_datastream(rqst, self.obj.pid, 'TEXT', repo=repo)
+        self.assertEqual(206, response.status_code)
+        self.assertEqual(self.obj.text.content[:6], response.content)
+
     def test_login_and_store_credentials_in_session(self):
         # only testing custom logic, which happens on POST
         # everything else is handled by django.contrib.auth
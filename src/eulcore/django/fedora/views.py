@@ -29,30 +29,110 @@ Using these views (in the simpler cases) should be as easy as::
 
 '''
 
+import re
 
 from django.conf import settings
 from django.contrib.auth import views as authviews
-from django.http import HttpResponse, Http404
+from django.http import HttpResponse, HttpResponseNotModified, Http404
 
+from eulcore.fedora.cache import DatastreamCache
+from eulcore.fedora.models import XmlDatastreamObject, RdfDatastreamObject
 from eulcore.fedora.util import RequestFailed
 from eulcore.django.fedora.server import Repository, FEDORA_PASSWORD_SESSION_KEY
 from eulcore.django.fedora.cryptutil import encrypt
 
+# single byte range; multiple ranges are not supported
+_range_re = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+def _parse_range(header, size):
+    # convert a Range header into inclusive start and end offsets; returns
+    # None if the header should be ignored, and raises ValueError if the
+    # range can't be satisfied
+    match = _range_re.match(header.strip())
+    if match is None or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if not start:
+        # suffix range: last N bytes
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError('Range %s not satisfiable for %d bytes' % (header, size))
+    return start, end
+
+def _stream_range(stream, start, end):
+    # iterate over the content of a ResponseStream from offset start to end,
+    # inclusive, without holding more than one chunk in memory
+    remaining = end - start + 1
+    try:
+        while start > 0:
+            skipped = stream.read(min(start, stream.chunk_size))
+            if not skipped:
+                return
+            start -= len(skipped)
+        while remaining > 0:
+            chunk = stream.read(min(remaining, stream.chunk_size))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        stream.close()
+
+def _etag(ds):
+    # datastream checksum, or else an identifier for the current version
+    if ds.checksum_type != 'DISABLED':
+        return ds.checksum
+    return DatastreamCache.version(ds.info)
+
+def _etag_matches(request, etag):
+    # check a conditional request If-None-Match header against an etag
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header or not etag:
+        return False
+    for tag in header.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag == '*' or tag.strip('"') == etag:
+            return True
+    return False
+
 def raw_datastream(request, pid, dsid, type=None, repo=None, headers={}):
     '''View to display a raw datastream that belongs to a Fedora Object.
     Returns an :class:`~django.http.HttpResponse` with the response content
-    populated with the content of the datastream.  The following HTTP headers
-    may be included in all the responses:
+    populated with the content of the datastream.  Content of datastreams
+    other than XML and RDF is streamed from Fedora in chunks as it is sent
+    to the client, so large datastreams are never held in memory.  Requests
+    for a single byte range (using the HTTP ``Range`` header) of a streamed
+    datastream get a ``206 Partial Content`` response with only the
+    requested bytes.
+
+    Conditional requests with an ``If-None-Match`` header matching the
+    current ETag get a ``304 Not Modified`` response, without retrieving
+    the datastream content.  If the repository has a
+    :attr:`~eulcore.fedora.server.Repository.content_cache`, content of
+    datastreams of known size small enough to be cached is served from the
+    cache instead of being streamed.
+
+    The following HTTP headers may be included in all the responses:
 
     - Content-Type: mimetype of the datastream in Fedora
-    - ETag: datastream checksum, as long as the checksum type is not 'DISABLED'
+    - ETag: datastream checksum, as long as the checksum type is not
+      'DISABLED'; otherwise, an identifier for the current version of the
+      datastream
 
     The following HTTP headers may be included `only` for non-xml and non-RDF
     datastreams (excluded there since they may be inaccurate depending on the
     serialization of the content):
 
     - Content-MD5: MD5 checksum of the datastream in Fedora, if available
-    - Content-Length: size of the datastream in Fedora
+      (not included for partial content)
+    - Content-Length: size of the datastream in Fedora, or of the requested range
+    - Accept-Ranges: ``bytes``
+    - Content-Range: the range of the content returned, for partial content
 
     If either the datastream or object are not found, raises an
     :class:`~django.http.Http404` .  For any other errors (e.g., permission
@@ -84,17 +164,58 @@ def raw_datastream(request, pid, dsid, type=None, repo=None, headers={}):
         ds = obj.getDatastreamObject(dsid)
         
         if ds and ds.exists:
+            # if the client already has the current version, don't send it again
+            etag = _etag(ds)
+            if _etag_matches(request, etag):
+                response = HttpResponseNotModified()
+                response['ETag'] = etag
+                return response
+
+            stream = None
+            content_range = None
+            size = ds.info.size
+            cache = obj.content_cache
             # if the datastream content has a serialize option, use that
-            if hasattr(ds.content, 'serialize'):
+            if isinstance(ds, (XmlDatastreamObject, RdfDatastreamObject)):
                 content = ds.content.serialize(pretty=True)
-            # otherwise, use content directly
-            else:
+                ranges = False
+            # use content from the cache if it is small enough to be cached
+            elif cache is not None and size and cache.cacheable(size):
                 content = ds.content
-            # NOTE: this will probably need some work to be able to handle large datastreams
-            response = HttpResponse(content, mimetype=ds.mimetype)
-            # if we have a checksum, use it as an ETag
-            if ds.checksum_type != 'DISABLED':
-                response['ETag'] = ds.checksum
+                ranges = True
+            # otherwise, pass content through from Fedora as it is read
+            # instead of loading it into memory
+            else:
+                stream, url = obj.api.getDatastreamDissemination(pid, dsid, stream=True)
+                content = stream
+                size = size or stream.size
+                ranges = True
+
+            if ranges and size and 'HTTP_RANGE' in request.META:
+                try:
+                    content_range = _parse_range(request.META['HTTP_RANGE'], size)
+                except ValueError:
+                    if stream is not None:
+                        stream.close()
+                    response = HttpResponse(status=416)
+                    response['Content-Range'] = 'bytes */%d' % size
+                    return response
+                if content_range is not None:
+                    start, end = content_range
+                    if stream is not None:
+                        content = _stream_range(stream, start, end)
+                    else:
+                        content = content[start:end + 1]
+
+            if content_range is not None:
+                response = HttpResponse(content, mimetype=ds.mimetype, status=206)
+                response['Content-Range'] = 'bytes %d-%d/%d' % (content_range + (size,))
+            else:
+                response = HttpResponse(content, mimetype=ds.mimetype)
+            if ranges and size:
+                response['Accept-Ranges'] = 'bytes'
+            if etag:
+                response['ETag'] = etag
             # TODO: set last-modified header also ? may require an extra API call
             
             # Where available & appropriate, pass along content length & MD5
@@ -102,10 +223,14 @@ def raw_datastream(request, pid, dsid, type=None, repo=None, headers={}):
             # MD5 and size may not be accurate for XML & RDF depending on
             # serialization, so leaving off in those cases.            
             if ds.mimetype not in ['text/xml', 'application/rdf+xml']:
-                if ds.checksum_type == 'MD5':
-                    response['Content-MD5'] = ds.checksum
-                if ds.info.size:
-                    response['Content-Length'] = ds.info.size
+                if content_range is not None:
+                    start, end = content_range
+                    response['Content-Length'] = end - start + 1
+                else:
+                    if ds.checksum_type == 'MD5':
+                        response['Content-MD5'] = ds.checksum
+                    if size:
+                        response['Content-Length'] = size
 
             # set any user-specified headers that were passed in
             for header, val in headers.iteritems():
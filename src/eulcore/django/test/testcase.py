@@ -36,6 +36,12 @@ class TestCase(DjangoTestCase):
       will be loaded to eXist
     * *files* - list of files to be loaded (filenames should include path)
 
+    Fixture files are loaded in parallel with
+    :meth:`~eulcore.existdb.db.ExistDB.load_many`, so a file that cannot be
+    loaded does not stop the others; once all files have been tried, an
+    :class:`~eulcore.existdb.exceptions.ExistDBException` naming every file
+    that failed to load is raised.
+
     """
 
     def assertPattern(self, regex, text, msg_prefix=''):
@@ -54,12 +60,19 @@ class TestCase(DjangoTestCase):
             if 'index' in self.exist_fixtures:
                 db.loadCollectionIndex(settings.EXISTDB_ROOT_COLLECTION,
                         open(self.exist_fixtures['index']))
+            files = []
             if 'directory' in self.exist_fixtures:
-                for file in glob(path.join(self.exist_fixtures['directory'], '*.xml')):
-                    self._load_file_to_exist(file)
+                files.extend(glob(path.join(self.exist_fixtures['directory'], '*.xml')))
             if 'files' in self.exist_fixtures:
-                for file in self.exist_fixtures['files']:
-                    self._load_file_to_exist(file)
+                files.extend(self.exist_fixtures['files'])
+            if files:
+                summary = db.load_many(files, settings.EXISTDB_ROOT_COLLECTION)
+                if summary.failed:
+                    # a load can fail without an exception (eXist returned
+                    # false), so report the files rather than re-raising
+                    raise ExistDBException('Failed to load eXist fixtures: %s' % \
+                        ', '.join(['%s (%s)' % (r.source, r.error or 'not loaded')
+                                   for r in summary.failed]))
 
         return super(TestCase, self)._fixture_setup()
 
@@ -77,12 +90,6 @@ class TestCase(DjangoTestCase):
 
         return super(TestCase, self)._fixture_teardown()
 
-    def _load_file_to_exist(self, file):
-        db = ExistDB()
-        fname = path.split(file)[-1]
-        exist_path= path.join(settings.EXISTDB_ROOT_COLLECTION, fname)
-        db.load(open(file), exist_path, True)
-
     def _remove_file_from_exist(self, file):
         db = ExistDB()
         fname = path.split(file)[-1]
@@ -0,0 +1,225 @@
+# file existdb/cache.py
+#
+#   Copyright 2010 Emory University General Library
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Caching utilities for :mod:`eulcore.existdb`.
+
+This module provides backends for caching
+:class:`~eulcore.existdb.query.QuerySet` results (see
+:attr:`~eulcore.existdb.query.QuerySet.cache_backend`), so that repeated
+queries can be answered without contacting eXist:
+
+ * :class:`LRUCacheBackend` -- in memory, for a single process
+ * :class:`DiskCacheBackend` -- files in a local directory, shared by all
+   processes on a machine
+ * :class:`eulcore.django.existdb.cache.DjangoCacheBackend` -- the Django
+   cache framework
+
+Cached results are invalidated when documents or collections are changed
+through :class:`~eulcore.existdb.db.ExistDB`, which calls
+:func:`invalidate`.
+
+"""
+
+from hashlib import sha1
+import logging
+import threading
+from uuid import uuid4
+import weakref
+
+from eulcore.util.cache import LRUCache, DiskCache
+
+__all__ = ['LRUCache', 'CacheBackend', 'LRUCacheBackend', 'DiskCacheBackend',
+           'invalidate']
+
+logger = logging.getLogger(__name__)
+
+
+def _collection_path(path):
+    # normalize an eXist path to a list of collection names, without /db
+    parts = [p for p in path.split('/') if p]
+    if parts and parts[0] == 'db':
+        parts = parts[1:]
+    return parts
+
+_backends = []
+_backends_lock = threading.Lock()
+
+def invalidate(path, collection=False):
+    """Invalidate cached results affected by a change to a document or
+    collection, in all :class:`CacheBackend` instances in this process.
+
+    :param path: full path of the document or collection that changed
+    :param collection: True if ``path`` is a collection that was removed
+        or otherwise changed as a whole
+    """
+    _backends_lock.acquire()
+    try:
+        _backends[:] = [ref for ref in _backends if ref() is not None]
+        backends = [ref() for ref in _backends]
+    finally:
+        _backends_lock.release()
+    for backend in backends:
+        if backend is None:
+            continue
+        try:
+            backend.invalidate(path, collection)
+        except Exception:
+            # a cache failure should not cause the change itself to fail
+            logger.exception('error invalidating %s in cache backend %r' % (path, backend))
+
+
+class CacheBackend(object):
+    """Base class for :class:`~eulcore.existdb.query.QuerySet` result
+    cache backends.  Subclasses must implement :meth:`get`, :meth:`set`,
+    :meth:`delete`, and :meth:`clear`, with string keys and picklable
+    values.
+
+    Invalidation is handled with generation tokens stored in the backend
+    itself, so that it applies to all processes sharing the backend's
+    storage: each collection has a token that changes whenever content in
+    the collection (or in one of its subcollections) changes, and cache
+    keys include the token for the queried collection.  Backends register
+    themselves on creation to be notified of changes by :func:`invalidate`.
+    """
+
+    key_prefix = 'existdb-'
+    "prefix for all keys stored by this backend"
+
+    def __init__(self):
+        _backends_lock.acquire()
+        try:
+            _backends.append(weakref.ref(self))
+        finally:
+            _backends_lock.release()
+
+    def get(self, key):
+        "Get a cached value, or None if it is not cached."
+        raise NotImplementedError
+
+    def set(self, key, value):
+        "Store a value in the cache."
+        raise NotImplementedError
+
+    def delete(self, key):
+        "Remove a value from the cache, if present."
+        raise NotImplementedError
+
+    def clear(self):
+        "Remove all values from the cache."
+        raise NotImplementedError
+
+    def make_key(self, *parts):
+        """Generate a cache key from any number of values with stable
+        ``repr`` output (for instance, server url, query, and position)."""
+        return self.key_prefix + sha1(repr(parts)).hexdigest()
+
+    def get_generation(self, key):
+        "Get a generation token; by default, stored like any other value."
+        return self.get(key)
+
+    def set_generation(self, key, token):
+        "Store a generation token; by default, stored like any other value."
+        self.set(key, token)
+
+    def _token(self, kind, parts):
+        key = self.make_key('generation', kind, '/'.join(parts))
+        token = self.get_generation(key)
+        if token is None:
+            # a missing token (never set, or evicted) must not match
+            # any token that may have been used for existing entries
+            token = uuid4().hex
+            self.set_generation(key, token)
+        return token
+
+    def generation(self, collection):
+        """Get the generation tokens for a collection, for use in cache
+        keys.  Tokens change whenever content in the collection or any of
+        its subcollections changes, or when any of its parent collections
+        is changed as a whole.
+
+        :param collection: collection name, or None for the whole database
+        """
+        parts = _collection_path(collection or '')
+        tokens = [self._token('content', parts)]
+        # removing a parent collection also affects this collection
+        for i in range(len(parts)):
+            tokens.append(self._token('tree', parts[:i]))
+        return tuple(tokens)
+
+    def invalidate(self, path, collection=False):
+        """Invalidate cached results for queries affected by a change to a
+        document or collection; see :func:`invalidate`."""
+        parts = _collection_path(path)
+        if not collection:
+            # document changed; its collection is everything but the last part
+            parts = parts[:-1]
+        for i in range(len(parts) + 1):
+            self.set_generation(self.make_key('generation', 'content', '/'.join(parts[:i])),
+                                uuid4().hex)
+        if collection:
+            self.set_generation(self.make_key('generation', 'tree', '/'.join(parts)),
+                                uuid4().hex)
+
+
+class LRUCacheBackend(CacheBackend):
+    """In-memory cache backend for a single process, using an
+    :class:`~eulcore.util.cache.LRUCache`.
+
+    :param max_size: maximum number of values to keep
+    """
+
+    def __init__(self, max_size=1000):
+        super(LRUCacheBackend, self).__init__()
+        self.cache = LRUCache(max_size=max_size)
+        # generation tokens are kept separately, so they are never discarded
+        # to make room for results
+        self._generations = {}
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value):
+        self.cache.set(key, value)
+
+    def delete(self, key):
+        self.cache.delete(key)
+
+    def get_generation(self, key):
+        return self._generations.get(key, None)
+
+    def set_generation(self, key, token):
+        self._generations[key] = token
+
+    def clear(self):
+        self._generations.clear()
+        self.cache.clear()
+
+
+class DiskCacheBackend(DiskCache, CacheBackend):
+    """Cache backend that stores each value in a file in a local directory,
+    shared by all processes with access to the directory; see
+    :class:`~eulcore.util.cache.DiskCache`.
+
+    :param directory: directory for cache files; created if it does not
+        exist
+    :param timeout: optional number of seconds values are kept
+    """
+
+    key_prefix = CacheBackend.key_prefix
+
+    def __init__(self, directory, timeout=None):
+        CacheBackend.__init__(self)
+        DiskCache.__init__(self, directory, timeout)
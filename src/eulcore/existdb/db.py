@@ -24,17 +24,31 @@ an eXist-db_ database and executing XQuery_ queries against it.
 
 """
 
+import copy
+import errno
 from functools import wraps
 import httplib
+from io import BytesIO
 import logging
+import os
+from Queue import Queue
 import socket
+import threading
+import time
 from urllib import unquote_plus, splittype
 import xmlrpclib
 
+from lxml import etree
+
 from eulcore import xmlmap
 from eulcore.existdb.exceptions import ExistDBException, ExistDBTimeout
+from eulcore.existdb import instrumentation
+from eulcore.existdb.cache import invalidate as invalidate_cache, _collection_path
+from eulcore.util.connection import ConnectionPool, get_connection_pool
 
-__all__ = ['ExistDB', 'QueryResult', 'ExistDBException', 'EXISTDB_NAMESPACE']
+__all__ = ['ExistDB', 'QueryResult', 'ExistDBException', 'EXISTDB_NAMESPACE',
+           'ResultHandleRegistry', 'result_handles', 'LoadResult', 'LoadSummary',
+           'QuerySummary', 'CollectionGenerations', 'collection_generations']
 
 logger = logging.getLogger(__name__)
 
@@ -55,6 +69,103 @@ def _wrap_xmlrpc_fault(f):
         # error: [Errno 104] Connection reset by peer
     return wrapper
 
+def _set_highlight_options(options):
+    # eXist highlight modes: attributes, elements, or both
+    # using elements because it seems most reasonable default
+    options['highlight-matches'] = 'elements'
+    # pretty-printing with eXist matches can introduce unwanted whitespace
+    if 'indent' not in options:
+        options['indent'] = 'no'
+
+
+class CollectionGenerations(object):
+    """Track changes to eXist collections with generation counters.
+
+    :class:`ExistDB` calls :meth:`changed` whenever it loads, moves, or
+    removes a document, or removes or reindexes a collection.  The
+    :meth:`generation` of a collection increases whenever a document in
+    the collection or any of its subcollections changes, or when the
+    collection or one of its parents is changed as a whole, so caches of
+    data derived from a collection (query results, rendered template
+    fragments, etc.) can include it in their keys, or compare it with the
+    generation when the data was cached, instead of relying on short
+    timeouts::
+
+        key = 'browse-%s' % db.generation('/mycoll')
+
+    Counters are kept in memory, and so only reflect changes made in the
+    current process, unless a shared ``store`` is specified.
+
+    :param store: optional shared storage for counters, such as a
+        :class:`~eulcore.existdb.cache.CacheBackend` or Django cache; any
+        object with ``get(key)`` and ``set(key, value)`` methods.  Values
+        must not expire or be evicted.
+    """
+
+    key_prefix = 'existdb-generation:'
+    "prefix for counter keys in the shared store"
+
+    def __init__(self, store=None):
+        self.store = store
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def _counter(self, kind, parts):
+        key = '%s%s:%s' % (self.key_prefix, kind, '/'.join(parts))
+        value = self._counters.get(key, 0)
+        if self.store is not None:
+            # counters only increase; keep the highest value seen
+            value = max(value, self.store.get(key) or 0)
+            self._counters[key] = value
+        return key, value
+
+    def _increment(self, kind, parts):
+        key, value = self._counter(kind, parts)
+        self._counters[key] = value + 1
+        if self.store is not None:
+            self.store.set(key, value + 1)
+
+    def generation(self, collection=None):
+        """Get the current generation of a collection.
+
+        :param collection: collection name; None for the whole database
+        :rtype: integer
+        """
+        parts = _collection_path(collection or '')
+        self._lock.acquire()
+        try:
+            generation = self._counter('content', parts)[1]
+            # changes to a parent collection as a whole also affect this one
+            for i in range(len(parts)):
+                generation += self._counter('tree', parts[:i])[1]
+            return generation
+        finally:
+            self._lock.release()
+
+    def changed(self, path, collection=False):
+        """Record a change to a document or collection.
+
+        :param path: full path of the document or collection that changed
+        :param collection: True if ``path`` is a collection that changed as
+            a whole (e.g., was removed or reindexed)
+        """
+        parts = _collection_path(path)
+        if not collection:
+            # a document changed; its collection is everything but the last part
+            parts = parts[:-1]
+        self._lock.acquire()
+        try:
+            for i in range(len(parts) + 1):
+                self._increment('content', parts[:i])
+            if collection:
+                self._increment('tree', parts)
+        finally:
+            self._lock.release()
+
+collection_generations = CollectionGenerations()
+"""Default :class:`CollectionGenerations` used by :class:`ExistDB`,
+shared by all instances."""
+
 
 class ExistDB:
     """Connect to an eXist database, and manipulate and query it.
@@ -76,12 +187,17 @@ class ExistDB:
 
     """
 
+    generations = collection_generations
+    """:class:`CollectionGenerations` updated when documents or collections
+    are changed"""
+
     def __init__(self, server_url, resultType=None, encoding='UTF-8', verbose=False,
                  timeout=None):
         # FIXME: Will encoding ever be anything but UTF-8? Does this really
         #   need to be part of our public interface?
 
         self.resultType = resultType or QueryResult
+        self.server_url = server_url
         datetime_opt = {'use_datetime': True}
 
         # determine if we need http or https transport
@@ -144,7 +260,9 @@ class ExistDB:
             raise ExistDBException(collection_name + " does not exist")
 
         logger.debug('removeCollection %s' % collection_name)
-        return self.server.removeCollection(collection_name)
+        result = self.server.removeCollection(collection_name)
+        self._changed(collection_name, collection=True)
+        return result
 
     def hasCollection(self, collection_name):
         """Check if a collection exists.
@@ -181,8 +299,26 @@ class ExistDB:
             collection_name = '/db/' + collection_name.strip('/')
 
         result = self.query("xmldb:reindex('%s')" % collection_name)
+        self._changed(collection_name, collection=True)
         return result.values[0] == 'true'
 
+    def generation(self, collection=None):
+        """Get the current generation of a collection, which increases
+        whenever content in the collection is changed.  See
+        :class:`CollectionGenerations`.
+
+        :param collection: collection name; None for the whole database
+        :rtype: integer
+        """
+        return self.generations.generation(collection)
+
+    def _changed(self, path, collection=False):
+        # record a change to a document or collection, and invalidate
+        # anything cached that may depend on it
+        self.generations.changed(path, collection)
+        result_handles.invalidate(self)
+        invalidate_cache(path, collection)
+
     @_wrap_xmlrpc_fault
     def hasDocument(self, document_path):
         """Check if a document is present in eXist.
@@ -235,7 +371,133 @@ class ExistDB:
             xml = xml.read()
 
         logger.debug('parse %s overwrite=%s' % (path, overwrite))
-        return self.server.parse(xml, path, int(overwrite))
+        result = self.server.parse(xml, path, int(overwrite))
+        self._changed(path)
+        return result
+
+    load_workers = 4
+    "default number of worker threads used by :meth:`load_many`"
+
+    def load_many(self, documents, collection, overwrite=True, workers=None,
+                  retries=2, retry_delay=1.0, progress=None):
+        """Load a set of documents into a collection, using several worker
+        threads to upload documents at the same time.
+
+        Documents may be specified as file paths, which are read from disk
+        only when a worker is ready to upload them and are loaded into the
+        collection under the file's base name, or as ``(name, xml)`` tuples,
+        where ``xml`` is a string or file object.  ``documents`` may be any
+        iterable (including a generator), and is consumed a few items ahead
+        of the workers, so large sets of documents are never held in memory
+        at once.
+
+        Uploads that fail because of a connection error or timeout are
+        retried, waiting ``retry_delay`` seconds before the first retry and
+        twice as long before each retry after that.  Errors reported by
+        eXist (e.g., invalid XML) are not retried.  Failures do not stop
+        the remaining documents from loading; check
+        :attr:`LoadSummary.failed` for documents that could not be loaded.
+
+        :param documents: iterable of file paths or ``(name, xml)`` tuples
+        :param collection: collection to load the documents into
+        :param overwrite: True to allow overwriting existing documents
+        :param workers: number of worker threads; defaults to
+            :attr:`load_workers`
+        :param retries: number of times to retry a failed upload
+        :param retry_delay: number of seconds to wait before the first retry
+        :param progress: optional function called with each
+            :class:`LoadResult` and the :class:`LoadSummary` as each
+            document finishes loading
+        :rtype: :class:`LoadSummary`
+        """
+        if workers is None:
+            workers = self.load_workers
+        summary = LoadSummary()
+        # bounded queue so documents are only read from the iterable as
+        # workers become available
+        queue = Queue(workers * 2)
+        lock = threading.Lock()
+
+        def work():
+            while True:
+                doc = queue.get()
+                if doc is None:
+                    break
+                result = self._load_one(doc, collection, overwrite,
+                                        retries, retry_delay)
+                lock.acquire()
+                try:
+                    summary._add(result)
+                    if progress is not None:
+                        progress(result, summary)
+                except Exception:
+                    # keep the worker running so the queue is emptied
+                    logger.exception('error in load_many progress function')
+                finally:
+                    lock.release()
+
+        threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=work)
+            thread.setDaemon(True)
+            thread.start()
+            threads.append(thread)
+        try:
+            for doc in documents:
+                queue.put(doc)
+        finally:
+            for thread in threads:
+                queue.put(None)
+            for thread in threads:
+                thread.join()
+        summary._finish()
+        logger.info('loaded %d of %d documents into %s in %.2f sec' % \
+                    (len(summary.loaded), len(summary.results), collection,
+                     summary.elapsed))
+        return summary
+
+    def _load_one(self, doc, collection, overwrite, retries, retry_delay):
+        # load a single document for load_many, retrying connection errors
+        if isinstance(doc, basestring):
+            name, xml = os.path.basename(doc), None
+        else:
+            name, xml = doc
+        result = LoadResult(doc, collection.rstrip('/') + '/' + name)
+        try:
+            if xml is None:
+                f = open(doc)
+                try:
+                    xml = f.read()
+                finally:
+                    f.close()
+            elif hasattr(xml, 'read'):
+                xml = xml.read()
+        except IOError, e:
+            result.error = e
+            return result
+        result.size = len(xml)
+
+        while True:
+            result.attempts += 1
+            try:
+                result.success = bool(self.load(xml, result.path, overwrite))
+                result.error = None
+                return result
+            except ExistDBException, e:
+                result.error = e
+                # only retry connection problems; eXist errors will not
+                # go away by trying again
+                if result.attempts > retries or not e.args or \
+                        not isinstance(e.args[0], (socket.error, xmlrpclib.ProtocolError)):
+                    return result
+            except Exception, e:
+                # any other error is reported for this document; it must
+                # not stop the worker thread
+                result.error = e
+                return result
+            logger.warn('error loading %s (attempt %d): %s' % \
+                        (result.path, result.attempts, result.error))
+            time.sleep(retry_delay * 2 ** (result.attempts - 1))
 
     @_wrap_xmlrpc_fault
     def removeDocument(self, name):
@@ -246,7 +508,9 @@ class ExistDB:
 
         """
         logger.debug('remove %s' % name)
-        return self.server.remove(name)
+        result = self.server.remove(name)
+        self._changed(name)
+        return result
 
     @_wrap_xmlrpc_fault
     def moveDocument(self, from_collection, to_collection, document):
@@ -259,50 +523,144 @@ class ExistDB:
         """
         self.query("xmldb:move('%s', '%s', '%s')" % \
                             (from_collection, to_collection, document))
+        self._changed('/'.join([from_collection, document]))
+        self._changed('/'.join([to_collection, document]))
         # query result does not return any meaningful content,
         # but any failure (missing collection, document, etc) should result in
         # an exception, so return true if the query completed successfully
         return True
 
     @_wrap_xmlrpc_fault
-    def query(self, xquery, start=1, how_many=10, **kwargs):
+    def query(self, xquery, start=1, how_many=10, highlight=False,
+              variables=None, **kwargs):
         """Execute an XQuery query, returning the results directly.
 
         :param xquery: a string XQuery query
         :param start: first index to return (1-based)
         :param how_many: maximum number of items to return
+        :param highlight: enable search term highlighting in results; optional,
+            defaults to False
+        :param variables: optional dictionary of values for external
+            variables declared by the query (``declare variable $name
+            external;``), keyed on variable name
         :rtype: the resultType specified at the creation of this ExistDB;
                 defaults to :class:`QueryResult`.
 
         """
-        logger.debug('query how_many=%d start=%d args=%s\n%s' % (how_many, start, kwargs, xquery))
-        xml_s = self.server.query(xquery, how_many, start, kwargs)
+        if highlight:
+            _set_highlight_options(kwargs)
+        if variables:
+            kwargs['variables'] = variables
+        xml_s = self._query(xquery, start, how_many, kwargs)
+        return xmlmap.load_xmlobject_from_string(xml_s, self.resultType)
 
-        # xmlrpclib tries to guess whether the result is a string or
-        # unicode, returning whichever it deems most appropriate.
-        # Unfortunately, :meth:`~eulcore.xmlmap.load_xmlobject_from_string`
-        # requires a byte string. This means that if xmlrpclib gave us a
-        # unicode, we need to encode it:
-        if isinstance(xml_s, unicode):
-            xml_s = xml_s.encode("UTF-8")
+    @_wrap_xmlrpc_fault
+    def _query(self, xquery, start, how_many, options):
+        # run an xquery and return the raw xml result as a byte string
+        logger.debug('query how_many=%d start=%d args=%s\n%s' % (how_many, start, options, xquery))
+        with instrumentation.record('query', self, xquery=xquery) as event:
+            xml_s = self.server.query(xquery, how_many, start, options)
+
+            # xmlrpclib tries to guess whether the result is a string or
+            # unicode, returning whichever it deems most appropriate.
+            # Unfortunately, :meth:`~eulcore.xmlmap.load_xmlobject_from_string`
+            # requires a byte string. This means that if xmlrpclib gave us a
+            # unicode, we need to encode it:
+            if isinstance(xml_s, unicode):
+                xml_s = xml_s.encode("UTF-8")
+            event.bytes = len(xml_s)
+            event.hits = instrumentation._parse_hits(xml_s)
+        return xml_s
+
+    def iterquery(self, xquery, start=1, how_many=None, chunk_size=100,
+                  xmlclass=None, highlight=False, variables=None, **kwargs):
+        """Execute an XQuery query, yielding result items one at a time.
+
+        Intended for large result sets, such as bulk exports.  Results are
+        requested from eXist ``chunk_size`` items at a time, and each chunk
+        is parsed incrementally, discarding parsed content as it goes, so
+        memory use depends on the chunk size rather than on the total
+        number of results.
 
-        return xmlmap.load_xmlobject_from_string(xml_s, self.resultType)
+        :param xquery: a string XQuery query
+        :param start: first index to return (1-based)
+        :param how_many: maximum number of items to return; by default,
+            all results are returned
+        :param chunk_size: number of items to request from eXist at once
+        :param xmlclass: optional :class:`~eulcore.xmlmap.XmlObject` subclass;
+            if specified, each item is returned as an instance of this class
+        :param highlight: enable search term highlighting in results; optional,
+            defaults to False
+        :param variables: optional dictionary of values for external
+            variables declared by the query; see :meth:`query`
+        :rtype: generator of :class:`lxml.etree._Element` (or of ``xmlclass``
+            instances); each item is a separate document
+        """
+        if highlight:
+            _set_highlight_options(kwargs)
+        if variables:
+            kwargs['variables'] = variables
+
+        returned = 0
+        while how_many is None or returned < how_many:
+            if how_many is None:
+                count = chunk_size
+            else:
+                count = min(chunk_size, how_many - returned)
+            xml_s = self._query(xquery, start + returned, count, kwargs)
+
+            hits = 0
+            depth = 0
+            chunk_returned = 0
+            for event, element in etree.iterparse(BytesIO(xml_s), events=('start', 'end')):
+                if event == 'start':
+                    if depth == 0:
+                        hits = int(element.get('hits', 0))
+                    depth += 1
+                    continue
+
+                depth -= 1
+                if depth == 1:
+                    # complete result item; copy it into its own document and
+                    # discard the parsed version before continuing
+                    item = copy.deepcopy(element)
+                    item.tail = None
+                    element.clear()
+                    while element.getprevious() is not None:
+                        del element.getparent()[0]
+
+                    chunk_returned += 1
+                    if xmlclass is not None:
+                        item = xmlclass(item)
+                    yield item
+
+            returned += chunk_returned
+            del xml_s
+            if chunk_returned < count or start + returned > hits:
+                break
 
     @_wrap_xmlrpc_fault
-    def executeQuery(self, xquery):
+    def executeQuery(self, xquery, variables=None):
         """Execute an XQuery query, returning a server-provided result
         handle.
 
         :param xquery: a string XQuery query 
+        :param variables: optional dictionary of values for external
+            variables declared by the query; see :meth:`query`
         :rtype: an integer handle identifying the query result for future calls
 
         """
         # NOTE: eXist's xmlrpc interface requires a dictionary parameter.
         #   This parameter is not documented in the eXist docs at
         #   http://demo.exist-db.org/exist/devguide_xmlrpc.xml
-        #   so it's not clear what we can pass there.
+        #   but eXist reads external variable values from 'variables'.
+        parameters = {}
+        if variables:
+            parameters['variables'] = variables
         logger.debug('executeQuery\n%s' % xquery)
-        result_id = self.server.executeQuery(xquery, {})
+        with instrumentation.record('executeQuery', self, xquery=xquery) as event:
+            result_id = self.server.executeQuery(xquery, parameters)
+            event.result_id = result_id
         logger.debug('result id is %s' % result_id)
         return result_id
 
@@ -334,7 +692,10 @@ class ExistDB:
         # FIXME: This just exposes the existdb xmlrpc querySummary function.
         #   Frankly, this return is just plain ugly. We should come up with
         #   something more meaningful.
-        summary = self.server.querySummary(result_id)
+        with instrumentation.record('querySummary', self, result_id=result_id) as event:
+            summary = self.server.querySummary(result_id)
+            event.query_time = summary.get('queryTime', None)
+            event.hits = summary.get('hits', None)
         logger.debug('querySummary result id %d : ' % result_id + \
                      '%(hits)s hits, query took %(queryTime)s ms' % summary)
         return summary
@@ -348,7 +709,9 @@ class ExistDB:
 
         """
 
-        hits = self.server.getHits(result_id)
+        with instrumentation.record('getHits', self, result_id=result_id) as event:
+            hits = self.server.getHits(result_id)
+            event.hits = hits
         logger.debug('getHits result id %d : %s' % (result_id, hits))
         return hits
 
@@ -364,14 +727,13 @@ class ExistDB:
 
         """        
         if highlight:
-            # eXist highlight modes: attributes, elements, or both
-            # using elements because it seems most reasonable default
-            options['highlight-matches'] = 'elements'
-            # pretty-printing with eXist matches can introduce unwanted whitespace
-            if 'indent' not in options:
-                options['indent'] = 'no'
+            _set_highlight_options(options)
         logger.debug('retrieve result id %d position=%d options=%s' % (result_id, position, options))
-        return self.server.retrieve(result_id, position, options)
+        with instrumentation.record('retrieve', self, result_id=result_id) as event:
+            data = self.server.retrieve(result_id, position, options)
+            # content is returned as xmlrpclib.Binary
+            event.bytes = len(getattr(data, 'data', data))
+        return data
 
     @_wrap_xmlrpc_fault
     def releaseQueryResult(self, result_id):
@@ -477,6 +839,251 @@ class ExistDB:
         # collection indexes information must be stored under system/config/db/collection_name
         return self._configCollectionName(collection_name) + "/collection.xconf"
 
+class LoadResult(object):
+    "The result of loading a single document with :meth:`ExistDB.load_many`."
+    def __init__(self, source, path):
+        self.source = source
+        "file path or ``(name, xml)`` tuple the document was loaded from"
+        self.path = path
+        "full path of the document in eXist"
+        self.success = False
+        "True if the document was loaded"
+        self.error = None
+        "the last exception raised while loading the document, if any"
+        self.attempts = 0
+        "number of upload attempts"
+        self.size = 0
+        "size of the document in bytes"
+
+    def __repr__(self):
+        return '<LoadResult %s %s>' % (self.path,
+                                       self.success and 'loaded' or 'failed')
+
+class LoadSummary(object):
+    """Per-document results and throughput statistics returned by
+    :meth:`ExistDB.load_many`."""
+    def __init__(self):
+        self.results = []
+        "list of :class:`LoadResult`, in the order documents finished loading"
+        self.start = time.time()
+        self.elapsed = 0
+        "number of seconds spent loading documents"
+
+    def _add(self, result):
+        self.results.append(result)
+        self.elapsed = time.time() - self.start
+
+    def _finish(self):
+        self.elapsed = time.time() - self.start
+
+    @property
+    def loaded(self):
+        "list of :class:`LoadResult` for documents that were loaded"
+        return [r for r in self.results if r.success]
+
+    @property
+    def failed(self):
+        "list of :class:`LoadResult` for documents that could not be loaded"
+        return [r for r in self.results if not r.success]
+
+    @property
+    def bytes(self):
+        "total size of the documents that were loaded"
+        return sum([r.size for r in self.loaded])
+
+    @property
+    def docs_per_second(self):
+        "number of documents loaded per second"
+        if not self.elapsed:
+            return 0.0
+        return len(self.loaded) / self.elapsed
+
+    @property
+    def bytes_per_second(self):
+        "number of bytes loaded per second"
+        if not self.elapsed:
+            return 0.0
+        return self.bytes / self.elapsed
+
+class _ResultHandle(object):
+    "A server-side query result handle managed by :class:`ResultHandleRegistry`."
+    def __init__(self, key, db, result_id):
+        self.key = key
+        self.db = db
+        self.result_id = result_id
+        self.refs = 0
+        self.last_used = time.time()
+        self.current = True     # False once superseded or invalidated
+        # hit count, QuerySummary and facet counts, cached by QuerySet
+        self.hits = None
+        self.summary = None
+        self.facets = {}
+
+class ResultHandleRegistry(object):
+    """Share server-side query result handles between identical queries.
+
+    Handles returned by :meth:`ExistDB.executeQuery` are registered by
+    server and XQuery string, so that identical queries (for instance, the
+    same search re-run to display each page of results) use a single
+    server result instead of executing the query again.  Handles are
+    reference counted; once a handle is no longer in use it is kept for
+    reuse until it has been idle for :attr:`ttl` seconds or until more than
+    :attr:`max_size` unused handles are cached, and is then released on
+    the server (least recently used first).
+
+    Handles for a server are invalidated when documents are loaded, moved,
+    or removed through an :class:`ExistDB` for that server.
+
+    :param max_size: maximum number of unused handles to keep; defaults to
+        :attr:`max_size`
+    :param ttl: number of seconds an unused handle may be reused; defaults
+        to :attr:`ttl`.  This should be shorter than the time eXist keeps
+        unused result sets.
+    """
+
+    max_size = 25
+    "default maximum number of unused handles to keep"
+    ttl = 60
+    "default number of seconds an unused handle is kept for reuse"
+
+    def __init__(self, max_size=None, ttl=None):
+        if max_size is not None:
+            self.max_size = max_size
+        if ttl is not None:
+            self.ttl = ttl
+        self._handles = {}
+        self._lock = threading.Lock()
+
+    def _server_key(self, db):
+        # handles are shared by all ExistDB instances for the same server & user
+        return getattr(db, 'server_url', db)
+
+    def acquire(self, db, xquery, variables=None):
+        """Get a result handle for a query, executing the query only if there
+        is no current handle for the same query on the same server.  Every
+        handle acquired should be returned with :meth:`release`.
+
+        :param db: :class:`ExistDB` to run the query against
+        :param xquery: string XQuery query
+        :param variables: optional dictionary of values for external
+            variables declared by the query
+        :returns: a handle object with a ``result_id`` attribute
+        """
+        key = (self._server_key(db), xquery)
+        if variables:
+            key += (tuple(sorted(variables.items())), )
+        self._lock.acquire()
+        try:
+            handle = self._handles.get(key, None)
+            if handle is not None and handle.refs == 0 and \
+                    handle.last_used < time.time() - self.ttl:
+                handle = None
+            if handle is not None:
+                handle.refs += 1
+                handle.last_used = time.time()
+                return handle
+        finally:
+            self._lock.release()
+
+        # don't hold the lock while eXist is executing the query
+        if variables:
+            result_id = db.executeQuery(xquery, variables=variables)
+        else:
+            result_id = db.executeQuery(xquery)
+        handle = _ResultHandle(key, db, result_id)
+        handle.refs += 1
+        self._lock.acquire()
+        try:
+            previous = self._handles.get(key, None)
+            if previous is not None:
+                previous.current = False
+            self._handles[key] = handle
+            expired = self._expire()
+            if previous is not None and previous.refs == 0:
+                expired.append(previous)
+        finally:
+            self._lock.release()
+        self._release_on_server(expired)
+        return handle
+
+    def release(self, handle):
+        """Release a handle obtained from :meth:`acquire`.  The server-side
+        result is kept for reuse if the handle is still current."""
+        self._lock.acquire()
+        try:
+            handle.refs -= 1
+            handle.last_used = time.time()
+            if handle.refs == 0 and not handle.current:
+                expired = [handle]
+            else:
+                expired = self._expire()
+        finally:
+            self._lock.release()
+        self._release_on_server(expired)
+
+    def invalidate(self, db):
+        """Stop reusing any handles for the server that ``db`` connects to,
+        e.g. because the contents of the database have changed.  Unused
+        handles are released immediately; handles still in use are
+        released when they are no longer needed."""
+        server = self._server_key(db)
+        expired = []
+        self._lock.acquire()
+        try:
+            for key, handle in self._handles.items():
+                if key[0] == server:
+                    del self._handles[key]
+                    handle.current = False
+                    if handle.refs == 0:
+                        expired.append(handle)
+        finally:
+            self._lock.release()
+        self._release_on_server(expired)
+
+    def clear(self):
+        "Release all unused handles and stop reusing any handles."
+        expired = []
+        self._lock.acquire()
+        try:
+            for handle in self._handles.values():
+                handle.current = False
+                if handle.refs == 0:
+                    expired.append(handle)
+            self._handles = {}
+        finally:
+            self._lock.release()
+        self._release_on_server(expired)
+
+    def _expire(self):
+        # remove unused handles that are too old or beyond the maximum number
+        # to keep; must be called with the lock held.  Returns the removed
+        # handles, to be released on the server once the lock is released.
+        unused = [h for h in self._handles.itervalues() if h.refs == 0]
+        unused.sort(key=lambda h: h.last_used)
+        cutoff = time.time() - self.ttl
+        expired = [h for h in unused if h.last_used < cutoff]
+        extra = len(unused) - len(expired) - self.max_size
+        if extra > 0:
+            expired.extend(unused[len(expired):len(expired) + extra])
+        for handle in expired:
+            del self._handles[handle.key]
+            handle.current = False
+        return expired
+
+    def _release_on_server(self, handles):
+        for handle in handles:
+            try:
+                handle.db.releaseQueryResult(handle.result_id)
+            except ExistDBException, e:
+                # eXist may already have timed out the result set
+                logger.debug('error releasing result id %s: %s' % (handle.result_id, e))
+
+
+result_handles = ResultHandleRegistry()
+"""Process-wide :class:`ResultHandleRegistry` used by
+:class:`~eulcore.existdb.query.QuerySet`."""
+
+
 class ExistPermissions:
     "Permissions for an eXist resource - owner, group, and active permissions."
     def __init__(self, data):
@@ -491,6 +1098,28 @@ class ExistPermissions:
         return '<%s %s>' % (self.__class__.__name__, str(self))
 
 
+class QuerySummary(object):
+    """Summary information about a server-side query result, built from
+    the dictionary returned by :meth:`ExistDB.querySummary`."""
+    def __init__(self, data):
+        self.hits = data.get('hits', 0)
+        "number of hits in the result set"
+        self.query_time = data.get('queryTime', None)
+        "query processing time in milliseconds"
+        self.documents = [tuple(doc) for doc in data.get('documents', [])]
+        "list of ``(doc_id, doc_name, hits)`` tuples for documents with hits"
+        self.doctypes = [tuple(dt) for dt in data.get('doctypes', [])]
+        "list of ``(doctype, hits)`` tuples"
+
+    def document_hits(self):
+        "Dictionary of document name and number of hits in that document."
+        return dict([(name, hits) for doc_id, name, hits in self.documents])
+
+    def __repr__(self):
+        return '<%s %s hits, %s ms>' % (self.__class__.__name__, self.hits,
+                                        self.query_time)
+
+
 class QueryResult(xmlmap.XmlObject):
     """The results of an eXist XQuery query"""
     
@@ -562,37 +1191,72 @@ class QueryResult(xmlmap.XmlObject):
 # Adapted from code found here:
 # http://stackoverflow.com/questions/372365/set-timeout-for-xmlrpclib-serverproxy
 
-class TimeoutHTTP(httplib.HTTP):
-    def __init__(self, host='', port=None, strict=None, timeout=None):
-         if port == 0:
-             port = None
-         self._setup(self._connection_class(host, port, strict, timeout))
+# socket errors indicating that a kept-alive connection was closed by the server
+_STALE_CONNECTION_ERRORS = (errno.ECONNRESET, errno.ECONNABORTED, errno.EPIPE)
 
-class TimeoutHTTPS(httplib.HTTPS):
-    def __init__(self, host='', port=None, strict=None, timeout=None):
-         if port == 0:
-             port = None
-         self._setup(self._connection_class(host, port, strict, timeout))
 
 class TimeoutTransport(xmlrpclib.Transport):
     '''Extend the default :class:`xmlrpclib.Transport` to expose a
-    connection timeout parameter.  Uses :class:`TimeoutHTTP` for http
-    connections.'''
-    _http_connection = TimeoutHTTP
+    connection timeout parameter and to reuse persistent HTTP/1.1
+    connections from a shared
+    :class:`~eulcore.util.connection.ConnectionPool`.  Uses
+    :class:`httplib.HTTPConnection` for http connections.'''
+    _http_connection = httplib.HTTPConnection
     def __init__(self, timeout=None, *args, **kwargs):
         if timeout is None:
             timeout = socket._GLOBAL_DEFAULT_TIMEOUT
         xmlrpclib.Transport.__init__(self, *args, **kwargs)
         self.timeout = timeout
 
-    def make_connection(self, host):
-        host, extra_headers, x509 = self.get_host_info(host)
-        conn = self._http_connection(host, timeout=self.timeout)
-        return conn
+    def request(self, host, handler, request_body, verbose=0):
+        chost, self._extra_headers, x509 = self.get_host_info(host)
+        pool = get_connection_pool(self._http_connection, chost, self.timeout)
+        connection, reused = pool.get()
+        try:
+            return self._pooled_request(pool, connection, host, handler,
+                                        request_body, verbose)
+        except (socket.error, httplib.BadStatusLine), e:
+            # the server may have closed a kept-alive connection while it was
+            # idle; if so, retry once on a new connection
+            stale = isinstance(e, httplib.BadStatusLine) or \
+                    getattr(e, 'errno', None) in _STALE_CONNECTION_ERRORS
+            if not (reused and stale):
+                raise
+            logger.debug('connection to %s was closed; retrying' % chost)
+            connection, reused = pool.get(reuse=False)
+            return self._pooled_request(pool, connection, host, handler,
+                                        request_body, verbose)
+
+    def _pooled_request(self, pool, connection, host, handler, request_body, verbose):
+        # issue an XML-RPC request on a connection checked out from the pool,
+        # and check the connection back in when the request is complete
+        response = None
+        try:
+            if verbose:
+                connection.set_debuglevel(1)
+            self.send_request(connection, handler, request_body)
+            self.send_host(connection, host)
+            self.send_user_agent(connection)
+            self.send_content(connection, request_body)
+
+            response = connection.getresponse()
+            if response.status != 200:
+                # read the response body so the connection can be reused
+                response.read()
+                raise xmlrpclib.ProtocolError(host + handler, response.status,
+                                              response.reason, response.msg)
+            self.verbose = verbose
+            return self.parse_response(response)
+        finally:
+            # a connection can only be reused once the entire response has been
+            # read (including when the response is an XML-RPC fault)
+            if response is not None and response.isclosed() and not response.will_close:
+                pool.release(connection)
+            else:
+                pool.discard(connection)
 
 class TimeoutSafeTransport(TimeoutTransport):
-    '''Extend class:`TimeoutTransport` but use :class:`TimeoutHTTPS`
+    '''Extend class:`TimeoutTransport` but use :class:`httplib.HTTPSConnection`
     for the http connections; timeout-enabled equivalent to
     :class:`xmlrpclib.SafeTransport`.'''
-    _http_connection = TimeoutHTTPS
-
+    _http_connection = httplib.HTTPSConnection
@@ -0,0 +1,160 @@
+# file existdb/explain.py
+#
+#   Copyright 2010 Emory University General Library
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Report on how eXist evaluates a query.
+
+:meth:`eulcore.existdb.query.QuerySet.explain` runs a query with eXist's
+query tracing enabled (see :meth:`eulcore.existdb.query.Xquery.getExplainQuery`),
+along with each of its filters separately, and returns a
+:class:`QueryPlan` describing which indexes eXist used::
+
+    plan = MyModel.objects.filter(title__fulltext_terms='foo', year__gt=1900).explain()
+    for filter in plan.scanned_filters():
+        print 'no index for', filter.xquery
+
+Query tracing requires an eXist user in the DBA group.  Tracing is enabled
+for the entire eXist instance while the query runs, so other queries
+running at the same time may appear in the trace.
+
+"""
+
+__all__ = ['IndexUse', 'FilterPlan', 'QueryPlan']
+
+PROFILING_NS = 'http://exist-db.org/xquery/profiling'
+
+def _int(value, default=0):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class IndexUse(object):
+    """A single index lookup recorded in an eXist query trace.
+
+    :param node: ``prof:index`` element from the trace
+    """
+
+    NO_INDEX = 0
+    "optimization level when no index was available and nodes were scanned"
+    BASIC_INDEX = 1
+    "optimization level when an index was used for part of the lookup"
+    OPTIMIZED_INDEX = 2
+    "optimization level when the lookup was fully answered by an index"
+
+    def __init__(self, node):
+        self.type = node.get('type')
+        "index type, e.g. ``range`` or ``lucene``"
+        self.source = node.get('source')
+        "the expression that used the index, as reported by eXist"
+        self.optimization = _int(node.get('optimization'))
+        "optimization level; see :attr:`NO_INDEX`"
+        self.calls = _int(node.get('calls'))
+        "number of times the index was used"
+        self.elapsed = _int(node.get('elapsed'))
+        "time spent in index lookups, in milliseconds"
+
+    @property
+    def indexed(self):
+        "True if eXist used an index rather than scanning nodes."
+        return self.optimization > self.NO_INDEX
+
+    def __repr__(self):
+        return '<IndexUse %s %s optimization=%d>' % (self.type, self.source,
+                                                     self.optimization)
+
+
+def _index_uses(node):
+    return [IndexUse(index) for index in
+            node.iterfind('.//{%s}index' % PROFILING_NS)]
+
+
+class FilterPlan(object):
+    """How eXist evaluated a single filter of a query.
+
+    :param xquery: the filter expression
+    :param node: ``filter`` element from the explain query result
+    """
+
+    def __init__(self, xquery, node):
+        self.xquery = xquery
+        "the filter expression, as used in the generated query"
+        self.hits = _int(node.get('hits'))
+        "number of results matching this filter alone"
+        self.indexes = _index_uses(node)
+        "list of :class:`IndexUse` for this filter"
+
+    @property
+    def indexed(self):
+        "True if eXist used an index for this filter."
+        return any([index.indexed for index in self.indexes])
+
+    @property
+    def index_types(self):
+        "Sorted list of the types of indexes used for this filter."
+        return sorted(set([index.type for index in self.indexes if index.indexed]))
+
+    def __repr__(self):
+        return '<FilterPlan %s %s>' % (self.xquery,
+                                       self.indexed and 'indexed' or 'scanned')
+
+
+class QueryPlan(object):
+    """Report on how eXist evaluated a query, as returned by
+    :meth:`eulcore.existdb.query.QuerySet.explain`.
+
+    :param node: root element of the explain query result
+    :param filters: list of the filter expressions explained, in the
+        order they were included in the explain query
+    :param xquery: the query being explained
+    """
+
+    def __init__(self, node, filters, xquery=None):
+        self.xquery = xquery
+        "the query being explained"
+        self.hits = _int(node.get('hits'))
+        "number of results for the full query"
+        self.elapsed = _int(node.get('elapsed'))
+        "time eXist took to evaluate the full query, in milliseconds"
+        query_trace = node.find('query')
+        self.indexes = _index_uses(query_trace if query_trace is not None else node)
+        "list of :class:`IndexUse` for the full query"
+        self.filters = [FilterPlan(xquery, filter_node) for xquery, filter_node
+                        in zip(filters, node.findall('filter'))]
+        "list of :class:`FilterPlan`, one per filter"
+
+    def indexed_filters(self):
+        "List of :class:`FilterPlan` for filters answered using an index."
+        return [f for f in self.filters if f.indexed]
+
+    def scanned_filters(self):
+        "List of :class:`FilterPlan` for filters evaluated without an index."
+        return [f for f in self.filters if not f.indexed]
+
+    def report(self):
+        "Summary of the query plan as a string, one line per filter."
+        lines = ['%d hits in %d ms' % (self.hits, self.elapsed)]
+        for f in self.filters:
+            if f.indexed:
+                status = 'index (%s)' % ', '.join(f.index_types)
+            else:
+                status = 'scan'
+            lines.append('  %-16s %6d hits  %s' % (status, f.hits, f.xquery))
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return '<QueryPlan %d hits, %d/%d filters indexed>' % \
+            (self.hits, len(self.indexed_filters()), len(self.filters))
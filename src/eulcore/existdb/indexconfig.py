@@ -0,0 +1,264 @@
+# file existdb/indexconfig.py
+#
+#   Copyright 2010 Emory University General Library
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Generate eXist index configuration from model field definitions.
+
+eXist only uses an index for a query if the collection index configuration
+(``collection.xconf``) defines one for the nodes being queried; otherwise
+it scans every document.  :class:`IndexConfig` determines the indexes
+needed for the lookups used with a model -- range indexes for exact,
+comparison and sort lookups, and Lucene indexes for full-text lookups --
+and generates the index configuration::
+
+    from eulcore.existdb.indexconfig import IndexConfig
+
+    config = IndexConfig()
+    config.add_model(MyModel, ['title__fulltext_terms', 'date__gte', 'id'])
+    db.loadCollectionIndex('/mycoll', config.to_xml())
+
+When recording is enabled (see
+:attr:`eulcore.existdb.query.LookupUsage.enabled`), lookups used by
+:class:`~eulcore.existdb.query.QuerySet` filtering and sorting are
+recorded in :data:`eulcore.existdb.query.lookup_usage`;
+:meth:`IndexConfig.add_model` includes these by default.  Use
+:meth:`IndexConfig.diff` to compare with the index configuration
+currently loaded in eXist.
+
+"""
+
+import logging
+from lxml import etree
+from lxml.builder import ElementMaker
+
+from eulcore.xpath import ast, parse
+from eulcore.xmlmap.fields import NodeField, NodeListField
+from eulcore.existdb.query import lookup_usage, _field_xsd_type, _split_fielddef, \
+    _join_field_xpath, _extract_fieldpart, Xquery
+
+__all__ = ['IndexConfig']
+
+logger = logging.getLogger(__name__)
+
+XCONF_NS = 'http://exist-db.org/collection-config/1.0'
+
+# lookups answered by a range index and by a lucene index; contains and
+# in are generated as fn:contains calls, which a typed range index can't answer
+RANGE_LOOKUPS = ['exact', 'startswith', 'gt', 'gte', 'lt', 'lte', 'range', 'sort']
+FULLTEXT_LOOKUPS = ['fulltext_terms', 'highlight']
+
+
+def _xpath_qnames(xpath):
+    # names of the nodes selected by an xpath, as used in xconf qname
+    # attributes; nodes selected by functions or wildcards are skipped
+    try:
+        return _node_qnames(parse(xpath))
+    except RuntimeError:
+        # not a parseable xpath
+        return []
+
+def _node_qnames(node):
+    if isinstance(node, ast.BinaryExpression):
+        if node.op == '|':
+            return _node_qnames(node.left) + _node_qnames(node.right)
+        if node.op in ('/', '//'):
+            if isinstance(node.right, ast.Step) and \
+                    isinstance(node.right.node_test, ast.NodeType):
+                # e.g. name/text(); index the parent element
+                return _node_qnames(node.left)
+            return _node_qnames(node.right)
+        return []
+    if isinstance(node, ast.AbsolutePath):
+        return _node_qnames(node.relative) if node.relative else []
+    if isinstance(node, ast.PredicatedExpression):
+        return _node_qnames(node.base)
+    if isinstance(node, ast.Step) and isinstance(node.node_test, ast.NameTest):
+        name = node.node_test.name
+        if name == '*':
+            return []
+        if node.node_test.prefix:
+            name = '%s:%s' % (node.node_test.prefix, name)
+        if node.axis in ('@', 'attribute'):
+            name = '@' + name
+        return [name]
+    return []
+
+
+class IndexConfig(object):
+    """A set of range and Lucene index definitions for an eXist collection.
+
+    Index definitions are tuples of ``('range', qname, xsd type)`` or
+    ``('lucene', qname)``; see :meth:`definitions`.  eXist allows a single
+    range index per qname, so when lookups on the same qname need
+    different types, a specific type is preferred over ``xs:string``.
+
+    :param analyzer: Lucene analyzer class; defaults to :attr:`analyzer`
+    """
+
+    analyzer = 'org.apache.lucene.analysis.standard.StandardAnalyzer'
+    "default Lucene analyzer class"
+
+    def __init__(self, analyzer=None):
+        if analyzer is not None:
+            self.analyzer = analyzer
+        self.range = {}
+        "dictionary of qname to xsd type for range indexes"
+        self.lucene = set()
+        "set of qnames for Lucene indexes"
+        self.namespaces = {}
+        "namespace prefixes used in index qnames"
+
+    def add_lookup(self, xpath, lookup, xsd_type=None, root_name=None):
+        """Add the index needed for a single lookup.
+
+        :param xpath: xpath of the field, relative to the query result
+        :param lookup: filter type (as used with
+            :meth:`~eulcore.existdb.query.QuerySet.filter`) or ``sort``
+        :param xsd_type: XML Schema type for range indexes; defaults to
+            ``xs:string``
+        :param root_name: name of the result element, for lookups on the
+            result itself (xpath ``.``)
+        """
+        if xpath in Xquery.special_fields:
+            # calculated by eXist; can't be indexed
+            return
+        if xpath == '.':
+            qnames = [root_name] if root_name else []
+        else:
+            qnames = _xpath_qnames(xpath)
+
+        for qname in qnames:
+            if lookup in FULLTEXT_LOOKUPS:
+                self.lucene.add(qname)
+            elif lookup in RANGE_LOOKUPS:
+                self._add_range(qname, xsd_type or 'xs:string')
+
+    def _add_range(self, qname, xsd_type):
+        current = self.range.get(qname)
+        if current is None or current == 'xs:string':
+            self.range[qname] = xsd_type
+        elif xsd_type not in (current, 'xs:string'):
+            logger.warn('conflicting range index types for %s: %s and %s; using %s' % \
+                        (qname, current, xsd_type, current))
+
+    def add_model(self, model, lookups=None, all_fields=False):
+        """Add the indexes needed for lookups on a model.
+
+        :param model: :class:`~eulcore.xmlmap.XmlObject` subclass
+        :param lookups: list of lookups in the format used for
+            :meth:`~eulcore.existdb.query.QuerySet.filter` arguments (e.g.,
+            ``title__fulltext_terms`` or ``date__gte``; a field name alone is
+            an exact lookup).  By default, uses the model's ``index_lookups``
+            attribute, if any, and the lookups recorded for the model in
+            :data:`~eulcore.existdb.query.lookup_usage`.
+        :param all_fields: add range indexes for every field of the model;
+            also used when there are no lookups for the model
+        """
+        self.namespaces.update(getattr(model, 'ROOT_NAMESPACES', None) or {})
+        root_name = getattr(model, 'ROOT_NAME', None)
+
+        recorded = {}
+        if lookups is None:
+            lookups = getattr(model, 'index_lookups', [])
+            recorded = lookup_usage.lookups(model)
+
+        # sorted, so conflicting types are resolved the same way every time
+        for xpath, lookup, xsd_type in sorted(recorded):
+            self.add_lookup(xpath, lookup, xsd_type, root_name)
+        for arg in lookups:
+            xpath, lookup, xsd_type = self._resolve_lookup(model, arg)
+            self.add_lookup(xpath, lookup, xsd_type, root_name)
+
+        if all_fields or not (lookups or recorded):
+            for name, field in model._fields.iteritems():
+                if isinstance(field, (NodeField, NodeListField)):
+                    continue
+                self.add_lookup(field.xpath, 'exact', _field_xsd_type(field))
+
+    def _resolve_lookup(self, model, arg):
+        # convert a filter argument into xpath, lookup type and xsd type,
+        # the same way QuerySet.filter does
+        fields, rest = _split_fielddef(arg, model)
+        if rest and rest not in Xquery.available_filters:
+            parts = _extract_fieldpart(arg)
+            if parts[0] in Xquery.special_fields and parts[1] in Xquery.available_filters:
+                return parts[0], parts[1], None
+            return arg, 'exact', None
+        xsd_type = _field_xsd_type(fields[-1]) if fields else None
+        return _join_field_xpath(fields) or '.', rest or 'exact', xsd_type
+
+    def definitions(self):
+        """Sorted list of all index definitions, as ``('range', qname, xsd
+        type)`` and ``('lucene', qname)`` tuples."""
+        return sorted([('range', qname, xsd_type) for qname, xsd_type in self.range.iteritems()]
+                      + [('lucene', qname) for qname in self.lucene])
+
+    def to_xml(self, pretty_print=True):
+        "Generate the ``collection.xconf`` document for the index definitions."
+        E = ElementMaker(namespace=XCONF_NS, nsmap={None: XCONF_NS})
+        # namespace prefixes used in qnames must be declared on the index element
+        index = etree.SubElement(E.collection(), '{%s}index' % XCONF_NS,
+                                 nsmap=self.namespaces)
+        # disable the legacy fulltext index, superseded by lucene
+        index.append(E.fulltext(default='none', attributes='false'))
+        if self.lucene:
+            lucene = E.lucene(E.analyzer({'class': self.analyzer}))
+            for qname in sorted(self.lucene):
+                lucene.append(E.text(qname=qname))
+            index.append(lucene)
+        for qname, xsd_type in sorted(self.range.iteritems()):
+            create = etree.SubElement(index, '{%s}create' % XCONF_NS)
+            create.set('qname', qname)
+            create.set('type', xsd_type)
+        return etree.tostring(index.getparent(), pretty_print=pretty_print)
+
+    @classmethod
+    def from_xml(cls, xml):
+        """Read the range and Lucene index definitions from an existing
+        ``collection.xconf`` document.  Path-based indexes are included
+        with the path in place of the qname.
+
+        :param xml: xconf document as a string
+        :rtype: :class:`IndexConfig`
+        """
+        config = cls()
+        doc = etree.fromstring(xml)
+        ns = {'x': XCONF_NS}
+        for create in doc.xpath('x:index/x:create', namespaces=ns):
+            config.range[create.get('qname') or create.get('path')] = \
+                create.get('type', 'xs:string')
+        for text in doc.xpath('x:index/x:lucene/x:text', namespaces=ns):
+            config.lucene.add(text.get('qname') or text.get('match'))
+        analyzer = doc.xpath('x:index/x:lucene/x:analyzer/@class', namespaces=ns)
+        if analyzer:
+            config.analyzer = analyzer[0]
+        for index in doc.xpath('x:index', namespaces=ns):
+            config.namespaces.update(dict([(prefix, uri) for prefix, uri in
+                                           index.nsmap.iteritems() if prefix]))
+        return config
+
+    def diff(self, current):
+        """Compare with another index configuration, such as the one
+        currently loaded in eXist.
+
+        :param current: :class:`IndexConfig`, or an xconf document as a
+            string
+        :returns: tuple of the list of index definitions missing from
+            ``current`` and the list of definitions only in ``current``
+        """
+        if isinstance(current, basestring):
+            current = self.from_xml(current)
+        new, old = set(self.definitions()), set(current.definitions())
+        return sorted(new - old), sorted(old - new)
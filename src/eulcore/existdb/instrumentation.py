@@ -0,0 +1,173 @@
+# file existdb/instrumentation.py
+#
+#   Copyright 2010 Emory University General Library
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Record timing information for eXist requests.
+
+Each query-related :class:`~eulcore.existdb.db.ExistDB` request (``query``,
+``executeQuery``, ``querySummary``, ``getHits`` and ``retrieve``) produces a
+:class:`QueryEvent`, which is passed to every function registered with
+:func:`connect`.  Events record how long the request took, how much data
+was returned, and, where available, the XQuery, hit count and the query
+time reported by eXist.
+
+:class:`RingBufferCollector` keeps the most recent events in memory::
+
+    from eulcore.existdb import instrumentation
+
+    collector = instrumentation.RingBufferCollector(max_size=500)
+    instrumentation.connect(collector)
+    ...
+    for event in collector.slowest(5):
+        print event.elapsed, event.xquery
+
+See :mod:`eulcore.django.existdb.middleware` for attributing requests to
+Django views.
+
+"""
+
+from collections import deque
+from contextlib import contextmanager
+import logging
+import re
+import threading
+import time
+
+__all__ = ['QueryEvent', 'RingBufferCollector', 'connect', 'disconnect', 'record']
+
+logger = logging.getLogger(__name__)
+
+listeners = []
+"functions currently registered to receive :class:`QueryEvent` objects"
+_listeners_lock = threading.Lock()
+
+
+def connect(listener):
+    """Register a function to be called with a :class:`QueryEvent` after
+    each instrumented eXist request.  Listeners are called on the thread
+    that made the request, so they should return quickly."""
+    global listeners
+    _listeners_lock.acquire()
+    try:
+        if listener not in listeners:
+            # replace rather than modify, so record can iterate without locking
+            listeners = listeners + [listener]
+    finally:
+        _listeners_lock.release()
+
+def disconnect(listener):
+    "Stop sending events to a function registered with :func:`connect`."
+    global listeners
+    _listeners_lock.acquire()
+    try:
+        listeners = [l for l in listeners if l is not listener]
+    finally:
+        _listeners_lock.release()
+
+
+class QueryEvent(object):
+    "Information about a single eXist request."
+
+    def __init__(self, method, server_url=None, xquery=None, result_id=None):
+        self.method = method
+        "name of the :class:`~eulcore.existdb.db.ExistDB` method"
+        self.server_url = server_url
+        "eXist server the request was sent to"
+        self.xquery = xquery
+        "XQuery string, for ``query`` and ``executeQuery`` requests"
+        self.result_id = result_id
+        "server result id, if any"
+        self.start = time.time()
+        "time the request started, in seconds since the epoch"
+        self.elapsed = None
+        "wall clock time the request took, in seconds"
+        self.bytes = 0
+        "size of the response data, for requests that return content"
+        self.query_time = None
+        "query time in milliseconds as reported by eXist, if available"
+        self.hits = None
+        "number of query hits, if available"
+        self.error = None
+        "exception raised by the request, if it failed"
+        self.view = None
+        "name of the Django view that made the request, if known"
+
+    def __repr__(self):
+        return '<QueryEvent %s %.1fms>' % (self.method, (self.elapsed or 0) * 1000)
+
+
+# hits attribute on the exist:result element at the start of query results
+_hits_re = re.compile(r'\bhits="(\d+)"')
+
+def _parse_hits(xml_s):
+    # find the hit count without parsing the whole query result
+    match = _hits_re.search(xml_s[:500])
+    if match:
+        return int(match.group(1))
+
+
+@contextmanager
+def record(method, db, xquery=None, result_id=None):
+    """Context manager used by :class:`~eulcore.existdb.db.ExistDB` to time
+    a request.  Yields a :class:`QueryEvent`, which may be updated with
+    details from the response, and sends it to all registered listeners
+    when the request finishes."""
+    event = QueryEvent(method, getattr(db, 'server_url', None), xquery, result_id)
+    try:
+        yield event
+    except Exception, e:
+        event.error = e
+        raise
+    finally:
+        event.elapsed = time.time() - event.start
+        for listener in listeners:
+            try:
+                listener(event)
+            except Exception:
+                # never let instrumentation break a request
+                logger.exception('error in existdb instrumentation listener %r' % listener)
+
+
+class RingBufferCollector(object):
+    """Listener that keeps the most recent :class:`QueryEvent` objects in
+    memory, discarding the oldest when full.
+
+    :param max_size: number of events to keep; defaults to :attr:`max_size`
+    """
+
+    max_size = 100
+    "default number of events to keep"
+
+    def __init__(self, max_size=None):
+        if max_size is not None:
+            self.max_size = max_size
+        self._events = deque(maxlen=self.max_size)
+
+    def __call__(self, event):
+        self._events.append(event)
+
+    def events(self):
+        "List of collected events, oldest first."
+        return list(self._events)
+
+    def slowest(self, n=10):
+        "List of the ``n`` slowest collected events, slowest first."
+        events = self.events()
+        events.sort(key=lambda e: e.elapsed, reverse=True)
+        return events[:n]
+
+    def clear(self):
+        "Discard all collected events."
+        self._events.clear()
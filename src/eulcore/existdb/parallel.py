@@ -0,0 +1,401 @@
+# file existdb/parallel.py
+#
+#   Copyright 2010 Emory University General Library
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Run eXist requests concurrently.
+
+:class:`~eulcore.existdb.db.ExistDB` calls block until eXist responds, so a
+page that needs several independent results (a hit list and a facet count,
+or searches across several collections) normally waits for each in turn.
+This module provides :class:`AsyncExistDB` and :class:`AsyncQuerySet`,
+which run requests on a pool of worker threads and return
+:class:`AsyncResult` objects that can be collected with :func:`gather`::
+
+    qs = AsyncQuerySet(model=MyModel, using=db, collection='/mycoll')
+    results = qs.filter(title__contains='foo')
+    hits, page = gather(results.count_async(), results.fetch_async(0, 20))
+
+:class:`MultiQuerySet` runs the same query against several collections,
+on one or more eXist servers, and merges the results::
+
+    qs = MultiQuerySet([(db1, '/findingaids/a-m'), (db2, '/findingaids/n-z')],
+                       model=MyModel)
+    results = qs.filter(fulltext_terms='foo').order_by('-fulltext_score')
+    results.count()
+    page = results[0:20]
+
+Worker threads share the persistent connections managed by
+:class:`~eulcore.util.connection.ConnectionPool`.
+
+"""
+
+import heapq
+import logging
+import threading
+
+from eulcore.existdb.db import ExistDB
+from eulcore.existdb.query import QuerySet
+from eulcore.util.workers import AsyncResult, WorkerPool, gather
+
+__all__ = ['AsyncResult', 'WorkerPool', 'AsyncExistDB', 'AsyncQuerySet',
+    'MultiQuerySet', 'gather']
+
+logger = logging.getLogger(__name__)
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+def default_pool():
+    "Get the shared :class:`WorkerPool` used when no pool is specified."
+    global _default_pool
+    _default_pool_lock.acquire()
+    try:
+        if _default_pool is None:
+            _default_pool = WorkerPool()
+        return _default_pool
+    finally:
+        _default_pool_lock.release()
+
+
+def _async_method(name):
+    def method(self, *args, **kwargs):
+        return self.pool.submit(getattr(self.db, name), *args, **kwargs)
+    method.__name__ = name
+    method.__doc__ = '''Run :meth:`eulcore.existdb.db.ExistDB.%s` on a worker thread.
+
+        :rtype: :class:`AsyncResult`
+        ''' % name
+    return method
+
+class AsyncExistDB(object):
+    """Wrap an :class:`~eulcore.existdb.db.ExistDB` so that requests run on a
+    :class:`WorkerPool` and return an :class:`AsyncResult` immediately,
+    instead of blocking until eXist responds.
+
+    :param db: :class:`~eulcore.existdb.db.ExistDB` to use; if not
+        specified, one is created with any additional keyword arguments
+    :param pool: :class:`WorkerPool` to use; defaults to a shared pool
+    """
+
+    def __init__(self, db=None, pool=None, **kwargs):
+        if db is None:
+            db = ExistDB(**kwargs)
+        self.db = db
+        self.pool = pool or default_pool()
+
+    query = _async_method('query')
+    executeQuery = _async_method('executeQuery')
+    querySummary = _async_method('querySummary')
+    getHits = _async_method('getHits')
+    retrieve = _async_method('retrieve')
+    releaseQueryResult = _async_method('releaseQueryResult')
+    getDocument = _async_method('getDocument')
+    load = _async_method('load')
+    removeDocument = _async_method('removeDocument')
+
+
+class AsyncQuerySet(QuerySet):
+    """A :class:`~eulcore.existdb.query.QuerySet` that can also count and
+    fetch results on a :class:`WorkerPool`, so that several queries, or the
+    count and a page of results for one query, can run at the same time.
+
+    Takes the same arguments as :class:`~eulcore.existdb.query.QuerySet`,
+    plus:
+
+    :param pool: :class:`WorkerPool` to use; defaults to a shared pool
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.pool = kwargs.pop('pool', None) or default_pool()
+        self._query_lock = threading.Lock()
+        super(AsyncQuerySet, self).__init__(*args, **kwargs)
+
+    def _getCopy(self):
+        copy = super(AsyncQuerySet, self)._getCopy()
+        copy.pool = self.pool
+        return copy
+
+    def _runQuery(self):
+        # count and fetch may run at the same time; only execute once
+        self._query_lock.acquire()
+        try:
+            if self._result_id is None:
+                super(AsyncQuerySet, self)._runQuery()
+        finally:
+            self._query_lock.release()
+
+    def count_async(self):
+        """Run :meth:`count` on a worker thread.
+
+        :rtype: :class:`AsyncResult`
+        """
+        return self.pool.submit(self.count)
+
+    def fetch_async(self, start=0, stop=None):
+        """Retrieve a range of results on a worker thread.  Uses chunked
+        retrieval when :attr:`chunk_size` is set.
+
+        :param start: index of the first result
+        :param stop: index after the last result; by default, all results
+            from ``start`` on are returned
+        :rtype: :class:`AsyncResult` with a list of results
+        """
+        return self.pool.submit(self._fetch_range, start, stop)
+
+    def _fetch_range(self, start, stop):
+        if stop is None:
+            stop = self.count()
+        return list(self[start:stop])
+
+
+def _fetch(qs, start, how_many):
+    # retrieve a range of results for a QuerySet with a single request;
+    # returns the total hit count and the list of results
+    result = qs._db.query(qs.query.getQuery(), start=start + 1, how_many=how_many,
+                          variables=qs.query.getVariables(),
+                          highlight=qs._highlight_matches)
+    items = []
+    for i, node in enumerate(result.results):
+        qs._cache_item(start + i, qs._node_data(node))
+        items.append(qs._result_cache[start + i])
+    return result.hits, items
+
+
+class _Descending(object):
+    # wrapper to reverse the sort order of a value in the merge heap
+    __slots__ = ['value']
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+def _multi_method(name):
+    def method(self, *args, **kwargs):
+        return self._getCopy([getattr(qs, name)(*args, **kwargs)
+                              for qs in self.querysets])
+    method.__name__ = name
+    method.__doc__ = '''Apply :meth:`eulcore.existdb.query.QuerySet.%s` to the
+        query for every source.
+
+        This method returns an updated copy of the MultiQuerySet. It does not
+        modify the original.
+        ''' % name
+    return method
+
+class MultiQuerySet(object):
+    """Run the same query against several eXist collections, possibly on
+    different servers, and present the combined results with the
+    :meth:`count`, slice and iteration interface of a
+    :class:`~eulcore.existdb.query.QuerySet`.
+
+    Requests to each source run at the same time on a :class:`WorkerPool`.
+    If the query is sorted with :meth:`order_by`, results from all sources
+    are merged in sort order (e.g., by ``-fulltext_score`` for a fulltext
+    search); otherwise, results are returned one source after another, in
+    the order the sources were specified.  Sort values are compared as
+    strings, except for ``fulltext_score`` and ``match_count``, which are
+    compared as numbers.
+
+    Slicing returns a list of results rather than a copy of the QuerySet.
+    Results are merged from the start, so retrieving results ``[i:j]``
+    requires retrieving all of the first ``j`` results; deep pages are
+    expensive.
+
+    :param sources: list of (:class:`~eulcore.existdb.db.ExistDB`,
+        collection) tuples to query
+    :param model: the type of object to return; required for sorted
+        queries
+    :param xpath: optional xpath where the query for each source will begin
+    :param pool: :class:`WorkerPool` to use; defaults to a shared pool
+    :param chunk_size: minimum number of results to request from a source
+        at once; defaults to :attr:`chunk_size`
+
+    Any other keyword arguments are passed to the
+    :class:`~eulcore.existdb.query.QuerySet` for each source.
+    """
+
+    chunk_size = 20
+    "default minimum number of results to request from a source at once"
+
+    def __init__(self, sources, model=None, xpath=None, pool=None,
+                 chunk_size=None, **kwargs):
+        self.model = model
+        self.pool = pool or default_pool()
+        if chunk_size is not None:
+            self.chunk_size = chunk_size
+        self.querysets = [QuerySet(model=model, xpath=xpath, using=db,
+                                   collection=collection, **kwargs)
+                          for db, collection in sources]
+        # merge state; initialized when results are first requested
+        self._shards = None
+        self._counts = None
+
+    def _getCopy(self, querysets):
+        copy = self.__class__([], model=self.model, pool=self.pool,
+                              chunk_size=self.chunk_size)
+        copy.querysets = querysets
+        return copy
+
+    filter = _multi_method('filter')
+    or_filter = _multi_method('or_filter')
+    order_by = _multi_method('order_by')
+    only = _multi_method('only')
+    also = _multi_method('also')
+    only_raw = _multi_method('only_raw')
+    also_raw = _multi_method('also_raw')
+    prefetch = _multi_method('prefetch')
+    all = _multi_method('all')
+
+    def _prepare(self):
+        # run the query against every source, retrieving the hit count and
+        # the first chunk of results from each
+        if self._counts is not None:
+            return
+        query = self.querysets[0].query if self.querysets else None
+        self._ordered = bool(query and query.order_by)
+        if self._ordered:
+            if self.model is None:
+                raise ValueError('Merging sorted results requires a model')
+            # return the sort value with each result so results can be merged
+            sort_xpath = 'string(%s)' % query.order_field().replace('%', '%%')
+            self._shards = [qs._raw_field(only=bool(qs.partial_fields),
+                                          also=not qs.partial_fields,
+                                          sort_value=sort_xpath)
+                            for qs in self.querysets]
+            self._descending = query.order_mode == 'descending'
+            self._numeric = query._cursor_types.get(query.order_by) == 'xs:double'
+        else:
+            self._shards = list(self.querysets)
+
+        results = gather(*[self.pool.submit(_fetch, qs, 0, self.chunk_size)
+                           for qs in self._shards])
+        self._counts = [hits for hits, items in results]
+        self._fetched = [items for hits, items in results]
+        self._consumed = [0] * len(self._shards)
+        self._waiting = set()
+        self._heap = []
+        self._merged = []
+        for s in range(len(self._shards)):
+            self._push(s)
+
+    def _heap_entry(self, shard, pos):
+        # heap entry for the result at position pos of a source; ties are
+        # broken by source order, which is the only order for unsorted results
+        key = None
+        if self._ordered:
+            key = self._fetched[shard][pos].sort_value or ''
+            if self._numeric:
+                try:
+                    key = float(key)
+                except ValueError:
+                    # empty values sort first, as in eXist
+                    key = float('-inf')
+            if self._descending:
+                key = _Descending(key)
+        return (key, shard, pos)
+
+    def _fill(self, n):
+        # merge results until at least n are available (or all are merged)
+        self._prepare()
+        n = min(n, sum(self._counts))
+        while len(self._merged) < n:
+            if self._waiting:
+                # the next result could come from a source with no more
+                # retrieved results; get more before merging further
+                self._fetch_waiting(n - len(self._merged))
+            if not self._heap:
+                # sources returned fewer results than their hit counts
+                break
+            key, s, pos = heapq.heappop(self._heap)
+            self._merged.append(self._fetched[s][pos])
+            self._consumed[s] = pos + 1
+            self._push(s)
+
+    def _push(self, s):
+        # add the next result from a source to the merge heap, or mark the
+        # source as waiting if it has not been retrieved yet
+        pos = self._consumed[s]
+        if pos < len(self._fetched[s]):
+            heapq.heappush(self._heap, self._heap_entry(s, pos))
+        elif pos < self._counts[s]:
+            self._waiting.add(s)
+
+    def _fetch_waiting(self, need):
+        # retrieve more results from all waiting sources, in parallel
+        fetches = []
+        for s in self._waiting:
+            have = len(self._fetched[s])
+            want = min(have + max(need, self.chunk_size), self._counts[s])
+            fetches.append((s, self.pool.submit(_fetch, self._shards[s], have, want - have)))
+        self._waiting = set()
+        for s, result in fetches:
+            items = result.get()[1]
+            if not items:
+                # each chunk re-runs the query, so documents removed since
+                # the first request leave a source short of its hit count;
+                # count only the results it actually returned
+                self._counts[s] = len(self._fetched[s])
+            self._fetched[s].extend(items)
+            self._push(s)
+
+    def count(self):
+        """Return the total number of results from all sources, running the
+        query first if it has not yet executed."""
+        self._prepare()
+        return sum(self._counts)
+
+    def counts(self):
+        "Return a list of the number of results from each source."
+        self._prepare()
+        return list(self._counts)
+
+    def __getitem__(self, k):
+        """Return a single result, or a list of results for a slice."""
+        if isinstance(k, slice):
+            stop = self.count() if k.stop is None else min(k.stop, self.count())
+            self._fill(stop)
+            return self._merged[k.start or 0:stop:k.step]
+
+        if not isinstance(k, (int, long)):
+            raise TypeError
+        if k < 0 or k >= self.count():
+            raise IndexError
+        self._fill(k + 1)
+        if k >= len(self._merged):
+            raise IndexError
+        return self._merged[k]
+
+    def __iter__(self):
+        """Iterate through the merged results."""
+        # the count is checked on each step, since it is reduced if a
+        # source returns fewer results than expected
+        i = 0
+        while i < self.count():
+            if i >= len(self._merged):
+                self._fill(i + self.chunk_size)
+                if i >= len(self._merged):
+                    break
+            yield self._merged[i]
+            i += 1
+
+    def __len__(self):
+        return self.count()
@@ -30,20 +30,28 @@ stand-in replacement in any context that expects one.
 
 """
 
+from datetime import date, datetime
+from decimal import Decimal
 from lxml import etree
 from lxml.builder import ElementMaker
 import re
+import threading
 from types import BooleanType
+from xml.sax.saxutils import escape
 
 from eulcore.xmlmap import load_xmlobject_from_string
-from eulcore.xmlmap.fields import IntegerField, StringField, DateField, NodeField, NodeListField
+from eulcore.xmlmap.fields import IntegerField, StringField, DateField, NodeField, NodeListField, \
+    IntegerListField, DateListField
 from eulcore.xmlmap.core import XmlObjectType
 from eulcore.xpath import ast, parse, serialize
+from eulcore.existdb.cache import LRUCache
+from eulcore.existdb.db import QuerySummary, result_handles
 from eulcore.existdb.exceptions import DoesNotExist, ReturnedMultiple
+from eulcore.existdb.explain import QueryPlan
 import logging
 logger = logging.getLogger(__name__)
 
-__all__ = ['QuerySet', 'Xquery']
+__all__ = ['QuerySet', 'Xquery', 'LookupUsage', 'lookup_usage']
 
 # TODO: update field info (currently only name/xpath?) passed to Query
 # object to include field type (e.g., StringField, NodeField) so that we
@@ -76,6 +84,17 @@ class QuerySet(object):
                     as settings for any full-text queries.  See
                     http://demo.exist-db.org/lucene.xml#N1047C for available options.
                     Requires a version of eXist that supports this feature.
+    :param chunk_size: optional; when iterating over results, retrieve this
+                    many results from eXist in a single request instead of
+                    retrieving results one at a time.  Defaults to
+                    :attr:`chunk_size`.
+    :param cache_backend: optional; a
+                    :class:`~eulcore.existdb.cache.CacheBackend` for caching
+                    hit counts and results across QuerySets and processes.
+                    Defaults to :attr:`cache_backend`.
+    :param parameterize: optional; if True, pass filter values to eXist as
+                    external variables instead of including them in the
+                    query text.  See :attr:`Xquery.parameterize`.
 
     .. _XPath: http://www.w3.org/TR/xpath/
 
@@ -83,11 +102,26 @@ class QuerySet(object):
 
     # pre-compile regular expression for pulling sort flags off beginning of sort field
     _sort_field_re = re.compile(r'^(?P<flags>[~-]*)(?P<field>.*)$')
+
+    chunk_size = None
+    """Number of results to retrieve per request when iterating over the
+    QuerySet.  When ``None``, results are retrieved one at a time."""
+
+    cache_backend = None
+    """:class:`~eulcore.existdb.cache.CacheBackend` used to cache hit counts
+    and results, so that identical queries (in any QuerySet or process
+    sharing the backend) can be answered without contacting eXist.  When
+    ``None``, results are only cached within a single QuerySet."""
     
     def __init__(self, model=None, xpath=None, using=None, collection=None,
-                xquery=None, fulltext_options={}):
+                xquery=None, fulltext_options={}, chunk_size=None,
+                cache_backend=None, parameterize=None):
         self.model = model     
         self._db = using
+        if chunk_size is not None:
+            self.chunk_size = chunk_size
+        if cache_backend is not None:
+            self.cache_backend = cache_backend
 
         # remove leading / from collection name if present
         collection = collection.lstrip('/') if collection is not None else None
@@ -95,13 +129,17 @@ class QuerySet(object):
             self.query = xquery
         else:
             xq_opts = {'xpath': xpath, 'collection': collection,
-                       'fulltext_options': fulltext_options}
+                       'fulltext_options': fulltext_options,
+                       'parameterize': parameterize}
             if model and hasattr(model, 'ROOT_NAMESPACES'):
                 xq_opts['namespaces'] = model.ROOT_NAMESPACES
             self.query = Xquery(**xq_opts)
 
         self._result_id = None
+        self._result_handle = None
+        self._facets = {}
         self.partial_fields = {}
+        self.prefetch_fields = []
         self.additional_fields = {}
         self._count = None
         self._result_cache = {}
@@ -116,8 +154,12 @@ class QuerySet(object):
             self._release_query_result()
 
     def _release_query_result(self):
-        # tell eXist we are done with this result set
-        self._db.releaseQueryResult(self._result_id)
+        # tell the result handle registry we are done with this result set;
+        # it will be released in eXist when no longer needed
+        if self._result_handle is not None:
+            result_handles.release(self._result_handle)
+            self._result_handle = None
+            self._result_id = None
 
     @property
     def result_id(self):
@@ -135,26 +177,70 @@ class QuerySet(object):
         if self._stop is not None:
             return self._stop - self._start
         
+        if self._count is None and self.cache_backend is not None:
+            self._count = self.cache_backend.get(self._backend_key('hits'))
+
         if self._count is None:
-            self._count = self._db.getHits(self.result_id)
+            result_id = self.result_id
+            # hit count is cached with the result handle, so querysets
+            # sharing a server result only request it once
+            handle = self._result_handle
+            if handle.hits is None:
+                handle.hits = self._db.getHits(result_id)
+            self._count = handle.hits
+            if self.cache_backend is not None:
+                self.cache_backend.set(self._backend_key('hits'), self._count)
             
         return self._count - self._start
 
+    def _backend_key(self, *parts):
+        # key for caching data about the current query in cache_backend;
+        # includes generation tokens so results are invalidated when
+        # content in the queried collection changes
+        return self.cache_backend.make_key(getattr(self._db, 'server_url', None),
+            self.query.getQuery(), sorted(self.query.getVariables().items()),
+            self.cache_backend.generation(self.query.collection),
+            *parts)
+
+    def _load_from_backend(self, i):
+        # get result i from cache_backend into the result cache, if available
+        if self.cache_backend is None:
+            return False
+        data = self.cache_backend.get(self._backend_key(i, self._highlight_matches))
+        if data is None:
+            return False
+        self._cache_item(i, data, store=False)
+        return True
+
+    @property
+    def summary(self):
+        """Summary of the query results as a
+        :class:`~eulcore.existdb.db.QuerySummary`, executing the query first
+        if it has not yet executed.  The summary is only requested from eXist
+        once for each server result."""
+        result_id = self.result_id
+        handle = self._result_handle
+        if handle.summary is None:
+            handle.summary = QuerySummary(self._db.querySummary(result_id))
+            handle.hits = handle.summary.hits
+        return handle.summary
+
     def queryTime(self):
         """Return the time (in milliseconds) it took for eXist to run the
         query, running the query first if it has not yet executed."""
-        # FIXME: should summary be cached ?
-        summary = self._db.querySummary(self.result_id)
-        return summary['queryTime']
+        return self.summary.query_time
 
     def _getCopy(self):
         """Get a clone of the current QuerySet for modification via
         :meth:`filter`, :meth:`order`, etc."""
         # copy current queryset - for modification via filter/order/etc
-        copy = QuerySet(model=self.model, xquery=self.query.getCopy(), using=self._db)        
+        copy = self.__class__(model=self.model, xquery=self.query.getCopy(), using=self._db)
         copy.partial_fields = self.partial_fields.copy()
+        copy.prefetch_fields = list(self.prefetch_fields)
         copy.additional_fields = self.additional_fields.copy()
         copy._highlight_matches = self._highlight_matches
+        copy.chunk_size = self.chunk_size
+        copy.cache_backend = self.cache_backend
         # reset result cache, if any, because any filters will change it
         copy._result_cache = {}   
         return copy
@@ -181,6 +267,20 @@ class QuerySet(object):
            content will be returned even if it does not include the search terms.
            Requires a properly configured lucene index.
          * ``in`` - field or object is present in a list of values
+         * ``gt``, ``gte``, ``lt``, ``lte`` - field is greater than, greater
+           than or equal to, less than, or less than or equal to the argument
+           value
+         * ``range`` - field is between the values of a (low, high) tuple,
+           inclusive
+
+        Range lookups (``gt``, ``gte``, ``lt``, ``lte`` and ``range``) compare
+        typed values, so that eXist can use a range index of the same type
+        on the field.  The type is determined by the argument value
+        (``int``, ``float``, ``Decimal``, ``datetime.date`` or
+        ``datetime.datetime``) or, for string values, by the field type
+        (:class:`~eulcore.xmlmap.fields.IntegerField` or
+        :class:`~eulcore.xmlmap.fields.DateField`); other string values
+        are compared as strings.
 
         Field may be in the format of field__subfield when field is an NodeField
         or NodeListField and subfield is a configured element on that object.
@@ -196,7 +296,7 @@ class QuerySet(object):
             Defaults to ``AND``; also supports ``OR``.
         """
         # possible future lookup types:
-        #   gt/gte,lt/lte, endswith, range, date, isnull (?), regex (?)
+        #   endswith, date, isnull (?), regex (?)
         #   search (full-text search with full-text indexing - like contains but faster)
 
         qscopy = self._getCopy()
@@ -220,10 +320,17 @@ class QuerySet(object):
                 xpath = _join_field_xpath(fields) or '.'
                 lookuptype = rest or 'exact'
 
+            filter_opts = {}
+            xsd_type = _field_xsd_type(fields[-1]) if fields else None
+            if lookuptype in qscopy.query.range_filters:
+                # compare as the type of the model field, if known
+                filter_opts['xsd_type'] = xsd_type
+            lookup_usage.record(self.model, xpath, lookuptype, xsd_type)
+
             # highlighting is only an xquery filter when passed as a string
             if lookuptype != 'highlight' or \
                 lookuptype == 'highlight' and not isinstance(value, BooleanType):
-                qscopy.query.add_filter(xpath, lookuptype, value, combine)
+                qscopy.query.add_filter(xpath, lookuptype, value, combine, **filter_opts)
 
             # enable highlighting when a full-text query is used
             if lookuptype == 'fulltext_terms':
@@ -286,10 +393,76 @@ class QuerySet(object):
             
         # TODO: allow multiple fields
         xpath = _simple_fielddef_to_xpath(field, self.model) or field
+        fields, rest = _split_fielddef(field, self.model)
+        lookup_usage.record(self.model, xpath, 'sort',
+                            _field_xsd_type(fields[-1]) if fields and not rest else None)
         qscopy = self._getCopy()
         qscopy.query.sort(xpath, **sort_opts)
         return qscopy
 
+    def after(self, cursor=None):
+        """Use cursor (keyset) pagination: return results that sort after
+        the specified cursor position.  Deep pages of a large sorted result
+        are much faster to retrieve this way than by slicing, since eXist
+        does not need to sort and skip all of the preceding results.
+
+        Must be used on a QuerySet with a :attr:`model` after
+        :meth:`order_by`.  Results include the values needed to continue
+        pagination from any result; see :meth:`cursor_for`.
+
+        :param cursor: cursor for the last result of the previous page, as
+            returned by :meth:`cursor_for` or :meth:`cursor_page`; None for
+            the first page
+
+        This method returns an updated copy of the QuerySet. It does not
+        modify the original.
+        """
+        if not self.query.order_by:
+            raise ValueError('Cursor pagination requires a sorted QuerySet')
+        # return the sort value and unique id so the next cursor can be
+        # determined from any result
+        raw_fields = {
+            'cursor_value': 'string(%s)' % self.query.order_field().replace('%', '%%'),
+            'cursor_id': self.query.cursor_id_xpath,
+        }
+        qscopy = self._raw_field(only=bool(self.partial_fields),
+                                 also=not self.partial_fields, **raw_fields)
+        qscopy.query.set_cursor(cursor)
+        return qscopy
+
+    def cursor_for(self, item):
+        """Get the cursor for a result returned by a QuerySet using
+        :meth:`after`, for use in retrieving the results after it.
+
+        :rtype: tuple of sort value and unique result id
+        """
+        return (item.cursor_value or '', item.cursor_id)
+
+    def cursor_page(self, cursor=None, size=20):
+        """Retrieve a page of results using cursor pagination (see
+        :meth:`after`) with a single request to eXist.
+
+        :param cursor: cursor for the last result of the previous page;
+            None for the first page
+        :param size: number of results per page
+        :returns: tuple of list of results and the cursor for the next
+            page, which is None if this is the last page
+        """
+        qs = self.after(cursor)
+        # request one extra result to find out if there is a next page
+        result = qs._db.query(qs.query.getQuery(), start=1, how_many=size + 1,
+                              variables=qs.query.getVariables(),
+                              highlight=qs._highlight_matches)
+        qs._count = result.hits
+        nodes = result.results
+        for i, node in enumerate(nodes[:size]):
+            qs._cache_item(i, qs._node_data(node))
+        items = [qs._result_cache[i] for i in range(min(size, len(nodes)))]
+        next_cursor = None
+        if len(nodes) > size:
+            next_cursor = self.cursor_for(items[-1])
+        return items, next_cursor
+
     def only(self, *fields):
         """Limit results to include only specified fields.        
 
@@ -312,6 +485,14 @@ class QuerySet(object):
         For large queries, this may have a significant impact on performance.
         For more details, see http://exist.sourceforge.net/tuning.html#N103A2 .
         """
+        qscopy = self._getCopy()
+        qscopy._add_partial_fields(fields)
+        # include any previously requested sub-objects in the partial return
+        qscopy._add_partial_fields(qscopy.prefetch_fields)
+        return qscopy
+
+    def _add_partial_fields(self, fields):
+        # add fields to the partial return used by only
         field_objs = {}
         field_xpath = {}
 
@@ -324,9 +505,38 @@ class QuerySet(object):
                 field_objs[f] = f
                 field_xpath[f] = f
 
+        self.partial_fields.update(field_objs)
+        self.query.return_only(field_xpath)
+
+    def prefetch(self, *fields):
+        """Include complete sub-objects in results that are limited by
+        :meth:`only`, so they can be used without another request to eXist.
+
+        :param fields: names of :class:`~eulcore.xmlmap.fields.NodeField` or
+            :class:`~eulcore.xmlmap.fields.NodeListField` fields in the
+            QuerySet's :attr:`model`; nested fields may be specified as
+            ``field__subfield``
+
+        Results that are not limited by :meth:`only` already include the
+        full content of the result node, so this only changes the query
+        when :meth:`only` is used (either before or after this method).
+
+        Example use::
+
+            qs.only('title', 'id').prefetch('dsc__c01')
+
+        This method returns an updated copy of the QuerySet: It does not
+        modify the original.
+        """
+        for f in fields:
+            fieldlist, rest = _split_fielddef(f, self.model)
+            if rest or not fieldlist or \
+                    not isinstance(fieldlist[-1], (NodeField, NodeListField)):
+                raise TypeError(repr(f) + ' is not a NodeField or NodeListField')
         qscopy = self._getCopy()
-        qscopy.partial_fields.update(field_objs)
-        qscopy.query.return_only(field_xpath)
+        qscopy.prefetch_fields = qscopy.prefetch_fields + list(fields)
+        if qscopy.partial_fields:
+            qscopy._add_partial_fields(fields)
         return qscopy
 
     def also(self, *fields):
@@ -404,6 +614,7 @@ class QuerySet(object):
         if only:
             qscopy.partial_fields.update(field_objs)
             qscopy.query.return_only(field_xpath, raw=True)
+            qscopy._add_partial_fields(qscopy.prefetch_fields)
         elif also:
             qscopy.additional_fields.update(field_objs)
             qscopy.query.return_also(field_xpath, raw=True)
@@ -421,6 +632,60 @@ class QuerySet(object):
         qscopy.query.distinct()
         return qscopy
 
+    def facet(self, *fields, **kwargs):
+        """Count the distinct values of one or more fields across all
+        results, for displaying browse facets.  Counts for all fields are
+        retrieved from eXist with a single query, and are cached with the
+        server result (see :class:`~eulcore.existdb.db.ResultHandleRegistry`).
+
+        :param fields: names of fields in the QuerySet's :attr:`model`, or
+            xpaths relative to the result nodes
+        :param limit: optional keyword argument; maximum number of values to
+            return for each field
+        :returns: dictionary keyed on field name; each value is a list of
+            ``(value, count)`` tuples, most common first
+
+        Example use::
+
+            facets = qs.facet('subject', 'repository', limit=10)
+            for value, count in facets['subject']:
+                ...
+        """
+        limit = kwargs.get('limit', None)
+        key = (fields, limit)
+        handle = self._result_handle
+        if handle is not None and key in handle.facets:
+            return handle.facets[key]
+        if key not in self._facets:
+            field_xpath = {}
+            for f in fields:
+                field_xpath[f] = _simple_fielddef_to_xpath(f, self.model) or f
+            result = self._db.query(self.query.getFacetQuery(field_xpath, limit),
+                                    how_many=len(fields),
+                                    variables=self.query.getVariables())
+            facets = {}
+            for node in result.results:
+                facets[node.get('name')] = [(value.text or '', int(value.get('count')))
+                                            for value in node]
+            self._facets[key] = facets
+        if handle is not None:
+            handle.facets[key] = self._facets[key]
+        return self._facets[key]
+
+    def explain(self):
+        """Run the query with eXist query tracing enabled and report which
+        indexes eXist used, for the full query and for each filter on its
+        own.  See :meth:`Xquery.getExplainQuery`.
+
+        Requires an eXist user in the DBA group.
+
+        :rtype: :class:`~eulcore.existdb.explain.QueryPlan`
+        """
+        result = self._db.query(self.query.getExplainQuery(), how_many=1,
+                                variables=self.query.getVariables())
+        return QueryPlan(result.results[0], self.query.explain_filters(),
+                         self.query.getQuery())
+
     def all(self):
         """Return all results.
 
@@ -452,6 +717,7 @@ class QuerySet(object):
             self._release_query_result()
             self._result_id = None
             self._count = None          # clear any count based on this result set
+        self._facets = {}
 
     def get(self, **kwargs):
         """Get a single result identified by filter arguments.
@@ -464,20 +730,27 @@ class QuerySet(object):
         Raises a :class:`eulcore.existdb.exceptions.DoesNotExist` exception if
         no matches are found; raises a :class:`eulcore.existdb.exceptions.ReturnedMultiple`
         exception if more than one match is found.
+
+        Makes a single request to eXist, which returns the number of matches
+        along with the first two of them.
         """
 
         fqs = self.filter(**kwargs)
-        if fqs.count() == 1:
-            obj = fqs[0]
-            if self.model is not None and not self.query._distinct:
-                # when single object object is deleted, release this query set
-                setattr(obj, '__del__', self._release_query_result)
-            return obj
+        # two results are enough to tell if the query matched exactly one;
+        # query returns the hit count along with them, so no server-side
+        # result set is needed
+        result = fqs._db.query(fqs.query.getQuery(), start=1, how_many=2,
+                               variables=fqs.query.getVariables(),
+                               highlight=fqs._highlight_matches)
+        fqs._count = result.hits
+        if fqs._count == 1:
+            fqs._cache_item(0, fqs._node_data(result.results[0]))
+            return fqs._result_cache[0]
         # NOTE: behaves like django - throws a DoesNotExist or a MultipleObjectsReturned
-        elif fqs.count() == 0:
+        elif fqs._count == 0:
             raise DoesNotExist("no match found with params %s" % kwargs)
         else:
-            raise ReturnedMultiple("returned %s with params %s" % (fqs.count(), kwargs))
+            raise ReturnedMultiple("returned %s with params %s" % (fqs._count, kwargs))
 
     def __getitem__(self, k):
         """Return a single result or slice of results from the query."""
@@ -507,19 +780,50 @@ class QuerySet(object):
         # cache based on the start of the current slice
         i = k + self._start
 
-        if i not in self._result_cache:
+        if i not in self._result_cache and not self._load_from_backend(i):
             # if the requested item has not yet been retrieved, get it from eXist
             item = self._db.retrieve(self.result_id, i, highlight=self._highlight_matches)
-            if self.model is None or self.query._distinct:
-                self._result_cache[i] = item.data
-            else:
-                obj = self._init_item(item.data)
-                # make queryTime method available when retrieving a single item
-                setattr(obj, 'queryTime', self.queryTime)
-                self._result_cache[i] = obj
+            self._cache_item(i, item.data)
 
         return self._result_cache[i]
 
+    def _cache_item(self, i, data, store=True):
+        """Initialize a single result as returned by eXist and store it in the
+        result cache at index ``i`` (and in :attr:`cache_backend`, unless
+        ``store`` is False)."""
+        if store and self.cache_backend is not None:
+            self.cache_backend.set(self._backend_key(i, self._highlight_matches), data)
+        if self.model is None or self.query._distinct:
+            self._result_cache[i] = data
+        else:
+            obj = self._init_item(data)
+            # make queryTime method available when retrieving a single item
+            setattr(obj, 'queryTime', self.queryTime)
+            self._result_cache[i] = obj
+
+    def _fetch_chunk(self, i):
+        """Retrieve up to :attr:`chunk_size` results starting at result index
+        ``i`` with a single eXist query and store them in the result cache.
+
+        :param i: index in the full result set (i.e., including any slice start)
+        """
+        end = self._start + self.count()
+        how_many = min(self.chunk_size, end - i)
+        # query start is 1-based; retrieve positions and cache keys are 0-based
+        result = self._db.query(self.query.getQuery(), start=i + 1,
+                                variables=self.query.getVariables(),
+                                how_many=how_many, highlight=self._highlight_matches)
+        for offset, node in enumerate(result.results):
+            self._cache_item(i + offset, self._node_data(node))
+
+    def _node_data(self, node):
+        # convert a result node returned by query into the form returned
+        # by retrieve, for use with _cache_item
+        if self.query._distinct:
+            # distinct values are returned wrapped in exist:value elements
+            return node.text
+        return etree.tostring(node, encoding='UTF-8', with_tail=False)
+
     @property
     def return_type(self):
         """Return type that will be used for initializing results returned from
@@ -555,6 +859,11 @@ class QuerySet(object):
         """Iterate through available results."""
         # rudimentary iterator (django queryset one much more complicated...)
         for i in range(self.count()):
+            # when chunking is enabled, retrieve uncached results in batches
+            # instead of making one request to eXist per result
+            if self.chunk_size and (i + self._start) not in self._result_cache \
+                    and not self._load_from_backend(i + self._start):
+                self._fetch_chunk(i + self._start)
             yield self[i]
 
     def __len__(self):
@@ -563,10 +872,13 @@ class QuerySet(object):
         return self.count()
 
     def _runQuery(self):
-        """Execute the currently configured query."""
+        """Execute the currently configured query, or reuse the server result
+        of an identical query (see :class:`~eulcore.existdb.db.ResultHandleRegistry`)."""
         if self._result_id is not None:
-            self._db.releaseQueryResult(self._result_id)
-        self._result_id = self._db.executeQuery(self.query.getQuery())
+            self._release_query_result()
+        self._result_handle = result_handles.acquire(self._db, self.query.getQuery(),
+                                                     self.query.getVariables())
+        self._result_id = self._result_handle.result_id
 
     def getDocument(self, docname):
         """Get a single document from the server by filename."""
@@ -656,6 +968,108 @@ def _create_return_class(baseclass, override_fields, xpath_prefix=None,
     # create the new class and set it as the return type to be initialized
     return XmlObjectType(classname, (baseclass,), class_fields)
 
+xquery_cache = LRUCache(max_size=200)
+"""Process-wide :class:`~eulcore.util.cache.LRUCache` of queries
+generated by :meth:`Xquery.getQuery`.  Check ``xquery_cache.hits`` and
+``xquery_cache.misses`` to gauge its effectiveness."""
+
+class LookupUsage(object):
+    """Record of the lookups used in :meth:`QuerySet.filter` and
+    :meth:`QuerySet.order_by`, by model, for determining which fields
+    need indexes in eXist (see :mod:`eulcore.existdb.indexconfig`).
+
+    Lookups are recorded as ``(xpath, lookup type, xsd type)`` tuples,
+    where lookup type is a filter type or ``sort``, and xsd type is the
+    XML Schema type of the model field, if known.
+
+    Recording is off by default, so QuerySets do not contend for the lock
+    in production; set :attr:`enabled` to True (e.g., while running tests)
+    to record lookups.
+    """
+
+    enabled = False
+    "True to record lookups; when False, :meth:`record` does nothing"
+
+    def __init__(self, enabled=None):
+        if enabled is not None:
+            self.enabled = enabled
+        self._usage = {}
+        self._lock = threading.Lock()
+
+    def record(self, model, xpath, lookup, xsd_type=None):
+        "Record a single lookup, if recording is :attr:`enabled`."
+        if not self.enabled:
+            return
+        key = (xpath, lookup, xsd_type)
+        self._lock.acquire()
+        try:
+            lookups = self._usage.setdefault(model, {})
+            lookups[key] = lookups.get(key, 0) + 1
+        finally:
+            self._lock.release()
+
+    def lookups(self, model):
+        """Lookups recorded for a model.
+
+        :rtype: dictionary of ``(xpath, lookup type, xsd type)`` to the
+            number of times the lookup was used
+        """
+        self._lock.acquire()
+        try:
+            return self._usage.get(model, {}).copy()
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        "Discard all recorded lookups."
+        self._lock.acquire()
+        try:
+            self._usage = {}
+        finally:
+            self._lock.release()
+
+lookup_usage = LookupUsage()
+"""Process-wide :class:`LookupUsage` updated by all QuerySets."""
+
+def _field_xsd_type(field):
+    # XML Schema type for range comparisons on an xmlmap field, if known
+    if isinstance(field, (IntegerField, IntegerListField)):
+        return 'xs:integer'
+    if isinstance(field, (DateField, DateListField)):
+        return 'xs:dateTime'
+
+# an xs:date lexical value, with optional timezone
+_date_only = re.compile(r'^(-?\d{4,}-\d{2}-\d{2})(Z|[+-]\d{2}:\d{2})?$')
+
+def _typed_value(value, xsd_type=None):
+    # XML Schema type and lexical representation of a python value
+    if isinstance(value, datetime):
+        return 'xs:dateTime', value.isoformat()
+    if isinstance(value, date):
+        if xsd_type == 'xs:dateTime':
+            # compare a date with a dateTime field as of the start of the day
+            return xsd_type, '%sT00:00:00' % value.isoformat()
+        return 'xs:date', value.isoformat()
+    if xsd_type == 'xs:dateTime' and isinstance(value, basestring):
+        # date-only strings (e.g., from request parameters) are not valid
+        # xs:dateTime values; compare as of the start of the day
+        match = _date_only.match(value.strip())
+        if match:
+            return xsd_type, '%sT00:00:00%s' % match.groups('')
+    if isinstance(value, (int, long)) and not isinstance(value, bool):
+        return 'xs:integer', str(value)
+    if isinstance(value, float):
+        return 'xs:double', repr(value)
+    if isinstance(value, Decimal):
+        return 'xs:decimal', str(value)
+    return xsd_type, value
+
+def _freeze_dict(d):
+    # convert a dictionary to a hashable value for use in a cache key;
+    # preserves iteration order, since generated queries depend on it
+    if d:
+        return tuple(d.items())
+
 def escape_string(s):
     'Escape a string as a literal value for use in an Xquery expression.'
     return s.replace('"', '""').replace('&', '&amp;')
@@ -663,6 +1077,9 @@ def escape_string(s):
 def _quote_as_string_literal(s):
     return '"' + escape_string(s)  + '"'
 
+# references to the external variables generated by Xquery._literal
+_variable_ref = re.compile(r'\$(p\d+)\b')
+
 class Xquery(object):
     """
     Xpath/Xquery object.
@@ -674,22 +1091,47 @@ class Xquery(object):
     :param fulltext_options: optional dictionary of fulltext options that should
         be used for any full-text queries.  See http://demo.exist-db.org/lucene.xml#N1047C
         for available options.
+    :param parameterize: optional; if True, filter values are bound to external
+        variables instead of being included in the query.  Defaults to
+        :attr:`parameterize`.
     """
 
     xpath = '/node()'       # default generic xpath
     xq_var = '$n'           # xquery variable to use when constructing flowr query
     ft_option_xqvar = '$ft_options'  # xquery variable for fulltext options, if needed
     available_filters = ['contains', 'startswith', 'exact', 'fulltext_terms',
-        'highlight', 'in']
+        'highlight', 'in', 'gt', 'gte', 'lt', 'lte', 'range']
+    # filters that compare typed values, and their comparison operators
+    range_filters = {'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<=', 'range': None}
     special_fields =  ['fulltext_score', 'last_modified', 'hash',
         'document_name', 'collection_name', 'match_count']
 
     _raw_prefix = 'r_'  # field-name prefix to distinguish raw field returns
+
+    # unique, consistently ordered identifier for a result node; used to
+    # break ties between results with the same sort value for cursor pagination
+    cursor_id_xpath = "concat(document-uri(root(%(xq_var)s)), '#', util:node-id(%(xq_var)s))"
+    # special fields that must be compared as something other than strings
+    _cursor_types = {'fulltext_score': 'xs:double', 'match_count': 'xs:double',
+                     'last_modified': 'xs:dateTime'}
+
+    query_cache = xquery_cache
+    '''cache used by :meth:`getQuery`; set to None to disable caching'''
+
+    parameterize = False
+    '''When True, filter values are not included in the generated query;
+    instead, the query declares an external variable for each value (e.g.,
+    ``declare variable $p1 external;``), and the values are returned by
+    :meth:`getVariables`, to be passed to eXist with the query.  Queries
+    that differ only in their filter values then have the same text, so
+    they can share cached and compiled versions of the query.'''
     
     def __init__(self, xpath=None, collection=None, namespaces=None,
-                 fulltext_options={}):
+                 fulltext_options={}, parameterize=None):
         if xpath is not None:
             self.xpath = xpath
+        if parameterize is not None:
+            self.parameterize = parameterize
 
         # remove leading / from collection name (if any)
         self.set_collection(collection)
@@ -702,6 +1144,9 @@ class Xquery(object):
         # sort information - field to sort on, ascending/descending
         self.order_by = None
         self.order_mode = None
+        # cursor pagination: enabled flag and (sort value, cursor id) to start after
+        self.cursor = False
+        self.cursor_after = None
         # also/only fields
         self.return_fields = {}
         self.additional_return_fields = {}
@@ -718,6 +1163,11 @@ class Xquery(object):
         self.fulltext_options = fulltext_options
         self.ft_query = False   # flag for if the current xquery includes a fulltext query
         self.highlight = None
+        self._highlight_expr = None     # highlight value as used in the query
+        # values for external variables, when parameterized
+        self.variables = {}
+        # number of variables named so far; names are never reused
+        self._variable_count = 0
         
     def __str__(self):
         return self.getQuery()
@@ -730,13 +1180,16 @@ class Xquery(object):
         self.collection = collection
 
     def getCopy(self):
-        xq = Xquery(xpath=self.xpath, collection=self.collection, namespaces=self.namespaces)
+        xq = Xquery(xpath=self.xpath, collection=self.collection, namespaces=self.namespaces,
+                    parameterize=self.parameterize)
         xq.filters += self.filters
         xq.where_filters += self.where_filters
         xq.or_filters += self.or_filters
         xq.where_fields = self.where_fields
         xq.order_by = self.order_by
         xq.order_mode = self.order_mode
+        xq.cursor = self.cursor
+        xq.cursor_after = self.cursor_after
         xq._distinct = self._distinct
         # return *copies* of dictionaries, not references to the ones in this object!
         xq.return_fields = self.return_fields.copy()
@@ -747,18 +1200,109 @@ class Xquery(object):
         xq.fulltext_options = self.fulltext_options.copy()
         xq.ft_query = self.ft_query
         xq.highlight = self.highlight
+        xq._highlight_expr = self._highlight_expr
+        xq.variables = self.variables.copy()
+        xq._variable_count = self._variable_count
         return xq
 
     def getQuery(self):
         """
         Generate and return xquery based on configured filters, sorting, return fields.
         Returns xpath or FLOWR XQuery if required based on sorting and return
+
+        Generated queries are cached in :attr:`query_cache`, keyed on the
+        full query configuration, so identically configured queries are
+        only generated once.
         """
-        declarations = None
-        if self.namespaces:
-            declarations = '\n'.join('''declare namespace %s='%s';''' % (prefix, urn)
-                                for prefix,urn in self.namespaces.iteritems() )
+        if self.query_cache is None:
+            return self._buildQuery()
+
+        key = self._cache_key()
+        try:
+            hash(key)
+        except TypeError:
+            # unhashable configuration (e.g., a non-string filter value)
+            return self._buildQuery()
+        cached = self.query_cache.get(key)
+        if cached is None:
+            query = self._buildQuery()
+            # return field xpaths are calculated as a side effect of building
+            # the query, and must be restored along with it
+            self.query_cache.set(key, (query, list(self.return_xpaths),
+                                       self._return_field_count))
+        else:
+            query, return_xpaths, self._return_field_count = cached
+            self.return_xpaths = list(return_xpaths)
+        return query
+
+    def _cache_key(self):
+        "Hashable representation of everything that determines the generated query."
+        return (self.__class__, self.xpath, self.collection,
+                _freeze_dict(self.namespaces), tuple(self.filters),
+                tuple(self.or_filters), tuple(self.where_filters),
+                tuple(self.where_fields), self.order_by, self.order_mode,
+                # when parameterized, cursor values are bound to variables
+                self.cursor, self.cursor_after is not None if self.parameterize \
+                    else self.cursor_after, self.parameterize,
+                tuple(sorted(self.variables)),
+                _freeze_dict(self.return_fields),
+                _freeze_dict(self.additional_return_fields),
+                tuple(self.raw_fields), self.start, self.end, self._distinct,
+                _freeze_dict(self.fulltext_options), self.ft_query,
+                self._highlight_expr, self.xq_var, self.ft_option_xqvar,
+                self._raw_prefix)
+
+    def getVariables(self):
+        """Values for the external variables declared by a parameterized
+        query (see :attr:`parameterize`), to be passed to eXist along with
+        the query returned by :meth:`getQuery`.
+
+        :rtype: dictionary of variable name to value; empty if the query is
+            not parameterized
+        """
+        variables = self.variables.copy()
+        if self.parameterize and self.order_by and self.cursor \
+                and self.cursor_after is not None:
+            variables['cursor_value'], variables['cursor_id'] = self.cursor_after
+        return variables
+
+    def _literal(self, value):
+        # xquery expression for a string value: a string literal or, when
+        # parameterized, a reference to an external variable set to the value
+        if not self.parameterize:
+            return _quote_as_string_literal(value)
+        self._variable_count += 1
+        name = 'p%d' % self._variable_count
+        self.variables[name] = value
+        return '$%s' % name
+
+    def _typed_literal(self, value, xsd_type=None):
+        # xquery expression for a value as an instance of its XML Schema type
+        xsd_type, value = _typed_value(value, xsd_type)
+        if xsd_type is None:
+            return self._literal(value)
+        return '%s(%s)' % (xsd_type, self._literal(value))
+
+    def _declarations(self):
+        # namespace and external variable declarations for the query prolog
+        declarations = ['declare namespace %s=\'%s\';' % (prefix, urn)
+                        for prefix, urn in (self.namespaces or {}).iteritems()]
+        declarations.extend(['declare variable $%s external;' % name
+                             for name in sorted(self.getVariables())])
+        return '\n'.join(declarations)
+
+    def _buildQuery(self):
+        "Generate the xquery returned by :meth:`getQuery`."
+        query = self._buildExpression()
+        declarations = self._declarations()
+        if declarations:
+            query = '\n'.join([declarations, query])
+        return query
 
+    def _buildExpression(self):
+        # generate the query without its prolog, so that it can also be
+        # nested in a larger query; the larger query must include the
+        # namespace and variable declarations from _declarations
         xpath_parts = []
         if self.collection is not None:
             # if a collection is specified, add it it to the top-level query xpath
@@ -782,7 +1326,7 @@ class Xquery(object):
             # constructed xpath, either one that contains the fulltext search terms (if it exists),
             # or (as a fallback) the one without them.
             xpath = '(%(xp)s[ft:query(., %(val)s)]|%(xp)s)' % {'xp': xpath,
-                                                                 'val': _quote_as_string_literal(self.highlight)}
+                                                                 'val': self._highlight_expr}
             
         # requires FLOWR instead of just XQuery  (sort, customized return, etc.)
         if self.order_by or self.return_fields or self.additional_return_fields \
@@ -831,15 +1375,17 @@ class Xquery(object):
             flowr_let = '\n'.join(let)
 
             where = ['where %s' % filter for filter in self.where_filters]
+            if self.order_by and self.cursor and self.cursor_after is not None:
+                where.append('where %s' % self._cursor_filter())
             flowr_where = '\n'.join(where)
 
             # for now, assume sort relative to root element
             if self.order_by:
-                if self.order_by in self.special_fields:
-                    order_field = '$%s' % self.order_by
-                else:
-                    order_field = self.prep_xpath(self.order_by)
-                flowr_order = 'order by %s %s' % (order_field, self.order_mode)
+                flowr_order = 'order by %s %s' % (self.order_field(), self.order_mode)
+                if self.cursor:
+                    # cursor pagination requires a unique, stable order
+                    flowr_order += ', %s %s' % (self.cursor_id_xpath % {'xq_var': self.xq_var},
+                                                self.order_mode)
             else:
                 flowr_order = ''
             flowr_return = self._constructReturn()
@@ -851,8 +1397,6 @@ class Xquery(object):
 
         if self._distinct:
             query = "distinct-values(%s)" % (query,)
-        if declarations:
-            query = '\n'.join([declarations, query])
 
         # if either start or end is specified, only retrieve the specified set of results
         # limits need to be done after any sorting or filtering, so subsequencing entire query
@@ -885,10 +1429,145 @@ class Xquery(object):
         self.order_by = field
         self.order_mode = 'ascending' if ascending else 'descending'
 
+    def order_field(self):
+        "XQuery expression for the current sort field, as used in ``order by``."
+        # for now, assume sort relative to root element
+        if self.order_by in self.special_fields:
+            return '$%s' % self.order_by
+        return self.prep_xpath(self.order_by)
+
+    def set_cursor(self, after=None):
+        '''Enable cursor (keyset) pagination on a sorted query.  Results are
+        ordered by the sort field and then by :attr:`cursor_id_xpath`, and,
+        if ``after`` is specified, limited to results that sort after it.
+        Unlike :meth:`set_limits`, this allows eXist to skip earlier results
+        instead of sorting and discarding them.
+
+        Sort values are compared as strings, except for special fields like
+        ``fulltext_score``.
+
+        :param after: ``(sort value, cursor id)`` tuple for the last result
+            of the previous page, or None for the first page
+        '''
+        self.cursor = True
+        self.cursor_after = after
+
+    def _cursor_filter(self):
+        # where clause selecting results that sort after cursor_after
+        if self.parameterize:
+            value, cursor_id = '$cursor_value', '$cursor_id'
+        else:
+            value, cursor_id = [_quote_as_string_literal(v) for v in self.cursor_after]
+        op = '>' if self.order_mode == 'ascending' else '<'
+        if self.order_by in self._cursor_types:
+            key = self.order_field()
+            value = '%s(%s)' % (self._cursor_types[self.order_by], value)
+        else:
+            key = 'string(%s)' % self.order_field()
+        id_xpath = self.cursor_id_xpath % {'xq_var': self.xq_var}
+        return '(%(key)s %(op)s %(val)s or (%(key)s = %(val)s and %(id)s %(op)s %(id_val)s))' % \
+            {'key': key, 'op': op, 'val': value, 'id': id_xpath,
+             'id_val': cursor_id}
+
     def distinct(self):
         self._distinct = True
 
-    def add_filter(self, xpath, type, value, mode=None):
+    def explain_filters(self):
+        """Filters evaluated separately by :meth:`getExplainQuery`, in order.
+        Filters on special fields are not included."""
+        return self.filters + self.or_filters
+
+    def getExplainQuery(self):
+        '''Generate an xquery that runs the current query with eXist query
+        tracing enabled and returns the trace, along with a separate trace
+        for each of the filters listed by :meth:`explain_filters` applied on
+        its own, to show which filters eXist could answer with an index.
+
+        The query returns an ``explain`` element with ``hits`` and
+        ``elapsed`` (milliseconds) attributes, containing a ``query``
+        element with the trace for the full query and one ``filter``
+        element (with a ``hits`` attribute and trace) per filter.  Requires
+        an eXist user in the DBA group.
+        '''
+        # nested queries are built without declarations; the declarations
+        # for this query (including any cursor variables) cover them all
+        lets = ['let $tracing := system:enable-tracing(true())',
+                'let $clear := system:clear-trace()',
+                'let $start := util:system-time()',
+                'let $hits := count(%s)' % self.getCopy()._buildExpression(),
+                'let $elapsed := (util:system-time() - $start) div xs:dayTimeDuration("PT0.001S")',
+                'let $trace := system:trace()']
+        filters = []
+        for i, filter in enumerate(self.explain_filters()):
+            # the base xpath with only this filter, without sorting or returns
+            xq = self.getCopy()
+            xq.filters = [filter]
+            xq.or_filters = []
+            xq.where_filters = []
+            xq.return_fields = {}
+            xq.additional_return_fields = {}
+            xq.order_by = xq.order_mode = None
+            xq.cursor = False
+            xq.cursor_after = None
+            xq.highlight = xq._highlight_expr = None
+            xq._distinct = False
+            xq.clear_limits()
+            lets.extend(['let $clear%d := system:clear-trace()' % i,
+                         'let $hits%d := count(%s)' % (i, xq._buildExpression()),
+                         'let $trace%d := system:trace()' % i])
+            filters.append('<filter hits="{$hits%d}">{$trace%d}</filter>' % (i, i))
+        lets.append('let $done := system:enable-tracing(false())')
+
+        query = '%s\nreturn <explain hits="{$hits}" elapsed="{xs:integer(round($elapsed))}">' % \
+                '\n'.join(lets) + '<query>{$trace}</query>%s</explain>' % ''.join(filters)
+        declarations = self._declarations()
+        if declarations:
+            query = '\n'.join([declarations, query])
+        return query
+
+    def getFacetQuery(self, fields, limit=None):
+        '''Generate an xquery that counts the distinct values of the specified
+        fields over all results of the current query, in a single request.
+
+        The query returns one ``facet`` element per field, with a ``name``
+        attribute and ``value`` elements in descending order by ``count``
+        attribute (the number of results with that value).
+
+        :param fields: dictionary of {'field name': 'xpath'}; xpaths are
+            relative to the result nodes
+        :param limit: optional maximum number of values to return per field
+        '''
+        # facets are calculated over the full, unsorted result nodes
+        xq = self.getCopy()
+        xq.return_fields = {}
+        xq.additional_return_fields = {}
+        xq.order_by = xq.order_mode = None
+        xq.cursor = False
+        xq.cursor_after = None
+        xq._distinct = False
+        xq.clear_limits()
+
+        # NOTE: eXist does not support XQuery 3.0 group by, so values are
+        # counted with distinct-values
+        facets = []
+        for name, xpath in fields.iteritems():
+            values = '''for $v in distinct-values($results/(%(xpath)s))
+    let $c := count($results[(%(xpath)s) = $v])
+    order by $c descending, $v ascending
+    return <value count="{$c}">{$v}</value>''' % {'xpath': xpath}
+            if limit is not None:
+                values = 'subsequence(%s, 1, %d)' % (values, limit)
+            # escape the name for use in a constructed attribute value
+            name = escape(name, {'"': '&quot;', '{': '{{', '}': '}}'})
+            facets.append('<facet name="%s">{%s}</facet>' % (name, values))
+
+        query = 'let $results := %s\nreturn (%s)' % (xq._buildExpression(), ',\n'.join(facets))
+        declarations = self._declarations()
+        if declarations:
+            query = '\n'.join([declarations, query])
+        return query
+
+    def add_filter(self, xpath, type, value, mode=None, xsd_type=None):
         """
         Add a filter to the xpath.  Takes xpath, type of filter, and value.
         Filter types currently implemented:
@@ -898,12 +1577,21 @@ class Xquery(object):
          * fulltext_terms - full-text query; requires lucene index configured in exist
          * highlight - run a full-text query, but return even if no matches
          * in - value is present in a list
+         * gt, gte, lt, lte - value comparison
+         * range - value is between a (low, high) tuple of values, inclusive
 
         By default, all filters are ANDed together.  Specifying a ``mode`` of **OR**
         will OR together all filters added with a mode of OR.
+
+        Comparison filters (gt, gte, lt, lte, range) compare the xpath
+        directly with a typed value, e.g. ``year > xs:integer("1900")``, which
+        eXist can answer with a range index of the same type.  The type is
+        determined by the python type of the value (int, float, Decimal,
+        date, datetime); string values are compared as ``xsd_type``, if
+        specified, or else as strings.
         """
         # possibilities to be added:
-        #   gt/gte,lt/lte, endswith, range, date, isnull (?), regex (?)
+        #   endswith, date, isnull (?), regex (?)
         #   search (full-text search with full-text indexing - like contains but faster)
 
         if type not in self.available_filters:
@@ -925,18 +1613,19 @@ class Xquery(object):
             ft_query_template = 'ft:query(%s, %s)'
         
         if type == 'contains':
-            filter = 'contains(%s, %s)' % (_xpath, _quote_as_string_literal(value))
+            filter = 'contains(%s, %s)' % (_xpath, self._literal(value))
         if type == 'startswith':
-            filter = 'starts-with(%s, %s)' % (_xpath, _quote_as_string_literal(value))
+            filter = 'starts-with(%s, %s)' % (_xpath, self._literal(value))
         if type == 'exact':
-            filter = '%s = %s' % (_xpath, _quote_as_string_literal(value))
+            filter = '%s = %s' % (_xpath, self._literal(value))
         if type == 'fulltext_terms':
-            filter = ft_query_template % (_xpath, _quote_as_string_literal(value))            
+            filter = ft_query_template % (_xpath, self._literal(value))            
             self.ft_query = True
         if type == 'highlight':
             # highlight is a special case; it has to be handled after the initial xpath
             # is constructed, in getQuery, so just store the value here
             self.highlight = value
+            self._highlight_expr = self._literal(value)
             # FIXME: should we allow highlight multiple times? should specifying highlight overwrite or append here?
             filter = None
             self.ft_query = True
@@ -947,10 +1636,23 @@ class Xquery(object):
                             xpath + ', but the entire result will be highlighted')
 
         if type == 'in':
-            filter = 'contains((%s), %s)' % (','.join(_quote_as_string_literal(v)
+            filter = 'contains((%s), %s)' % (','.join(self._literal(v)
                                                     for v in value),
                                              _xpath)
 
+        if type in self.range_filters:
+            if xsd_type is None and xpath in self._cursor_types:
+                # special fields with non-string values
+                xsd_type = self._cursor_types[xpath]
+            if type == 'range':
+                low, high = value
+                filter = '%(xp)s >= %(low)s and %(xp)s <= %(high)s' % \
+                    {'xp': _xpath, 'low': self._typed_literal(low, xsd_type),
+                     'high': self._typed_literal(high, xsd_type)}
+            else:
+                filter = '%s %s %s' % (_xpath, self.range_filters[type],
+                                       self._typed_literal(value, xsd_type))
+
         if filter is not None:
             if xpath in self.special_fields:
                 # filters on pre-defined fields must occur in 'where' section, after
@@ -1045,6 +1747,12 @@ class Xquery(object):
 
     def clear_filters(self):
         self.filters = []
+        # keep the variables still used by other filters and by highlighting
+        used = set()
+        for expr in self.or_filters + self.where_filters + [self._highlight_expr or '']:
+            used.update(_variable_ref.findall(expr))
+        self.variables = dict((name, value) for name, value in self.variables.iteritems()
+                              if name in used)
 
     def set_limits(self, low=None, high=None):
         """
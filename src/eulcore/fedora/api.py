@@ -63,6 +63,13 @@ class HTTP_API_Base(object):
                 (rel_url, len(data or ''), time.time() - start))
         return val
 
+    def stream(self, rel_url, chunk_size=None):
+        start = time.time()
+        val = self.opener.stream(rel_url, chunk_size)
+        logger.debug('stream: %s (%f secs to response)' %
+                (rel_url, time.time() - start))
+        return val
+
 
 class REST_API(HTTP_API_Base):
     """
@@ -108,26 +115,38 @@ class REST_API(HTTP_API_Base):
             http_args['maxResults'] = chunksize
         return self.read('objects?' + urlencode(http_args))
 
-    def getDatastreamDissemination(self, pid, dsID, asOfDateTime=None):
+    def getDatastreamDissemination(self, pid, dsID, asOfDateTime=None, stream=False,
+                                   chunk_size=None):
         """Get a single datastream on a Fedora object; optionally, get the version
         as of a particular date time.
 
+        By default, the entire datastream content is loaded into memory as a
+        string.  For large datastreams, use ``stream=True`` to get a
+        file-like :class:`~eulcore.fedora.util.ResponseStream` instead, which
+        reads content from Fedora as it is used::
+
+            content, url = api.getDatastreamDissemination(pid, 'VIDEO', stream=True)
+            with content:
+                for chunk in content:
+                    outfile.write(chunk)
+
         :param pid: object pid
         :param dsID: datastream id
         :param asOfDateTime: optional datetime; ``must`` be a non-naive datetime
         so it can be converted to a date-time format Fedora can understand
+        :param stream: return a :class:`~eulcore.fedora.util.ResponseStream`
+            instead of a string; the stream should be closed when done
+        :param chunk_size: size of chunks returned when iterating over a
+            stream
+        :returns: tuple of datastream content and url
         """
-        # TODO: Note that this loads the entire datastream content into
-        # memory as a Python string. This will suck for very large
-        # datastreams. Eventually we need to either modify this function or
-        # else add another to return self.open(), allowing users to stream
-        # the result in a with block.
-
         # /objects/{pid}/datastreams/{dsID}/content ? [asOfDateTime] [download]
         http_args = {}
         if asOfDateTime:
             http_args['asOfDateTime'] = datetime_to_fedoratime(asOfDateTime)
         url = 'objects/%s/datastreams/%s/content?%s' % (pid, dsID, urlencode(http_args))
+        if stream:
+            return self.stream(url, chunk_size)
         return self.read(url)
 
     # NOTE: getDissemination was not available in REST API until Fedora 3.3
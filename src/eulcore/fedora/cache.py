@@ -0,0 +1,133 @@
+# file fedora/cache.py
+#
+#   Copyright 2010 Emory University General Library
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Cache datastream content locally.
+
+Datastream content is normally downloaded from Fedora every time a
+:class:`~eulcore.fedora.models.DigitalObject` is initialized and its
+content is accessed.  A :class:`DatastreamCache` keeps copies of content
+in memory and, optionally, on disk, keyed by the version of the
+datastream: the datastream checksum where available, otherwise the
+creation date and id of its current version.  Cached content is used only
+after a datastream profile lookup confirms that it is still current,
+which is much cheaper than downloading the content again::
+
+    from eulcore.fedora.cache import DatastreamCache
+
+    repo = Repository(root, user, password)
+    repo.content_cache = DatastreamCache(directory='/var/cache/fedora')
+    obj = repo.get_object(pid)
+    obj.dc.content      # cached by version; later copies use the cache
+
+"""
+
+from hashlib import sha1
+
+from eulcore.fedora.util import datetime_to_fedoratime
+from eulcore.util.cache import LRUCache, DiskCache
+
+__all__ = ['DatastreamCache']
+
+
+class DatastreamCache(object):
+    """Cache of datastream content in memory and, if a directory is
+    specified, on disk.  Content up to :attr:`max_memory_size` bytes is
+    kept in memory; larger content up to :attr:`max_content_size` bytes is
+    only kept on disk, and anything larger is not cached.
+
+    :param max_items: maximum number of datastreams kept in memory
+    :param directory: directory for cached content shared by all
+        processes on a machine; if not specified, content is only cached
+        in memory
+    :param timeout: optional number of seconds content is kept on disk
+    :param max_memory_size: override :attr:`max_memory_size`
+    :param max_content_size: override :attr:`max_content_size`
+    """
+
+    max_memory_size = 256 * 1024
+    "default size in bytes of the largest content kept in memory"
+    max_content_size = 10 * 1024 * 1024
+    "default size in bytes of the largest content cached"
+    key_prefix = 'fedora-ds-'
+    "prefix for cache keys, so that the disk cache directory can be shared"
+
+    def __init__(self, max_items=500, directory=None, timeout=None,
+                 max_memory_size=None, max_content_size=None):
+        if max_memory_size is not None:
+            self.max_memory_size = max_memory_size
+        if max_content_size is not None:
+            self.max_content_size = max_content_size
+        self.memory = LRUCache(max_size=max_items)
+        "in-memory :class:`~eulcore.util.cache.LRUCache`"
+        self.disk = None
+        "on-disk :class:`~eulcore.util.cache.DiskCache`, if a directory was specified"
+        if directory is not None:
+            self.disk = DiskCache(directory, timeout, self.key_prefix)
+
+    @staticmethod
+    def version(info):
+        """Identify the current version of a datastream from its profile: the
+        checksum, if checksums are enabled, or else the version id and
+        creation date of the current version.
+
+        :param info: :class:`~eulcore.fedora.xml.DatastreamProfile`
+        :rtype: string
+        """
+        if info.checksum_type not in (None, 'DISABLED') and \
+                info.checksum and info.checksum != 'none':
+            return '%s:%s' % (info.checksum_type, info.checksum)
+        created = info.created and datetime_to_fedoratime(info.created)
+        return '%s@%s' % (info.version_id, created)
+
+    def cacheable(self, size):
+        """Check if content of the specified size can be cached; content of
+        unknown size (0 or None) is checked when it is added."""
+        return not size or size <= self.max_content_size
+
+    def _key(self, pid, dsid, version):
+        return self.key_prefix + sha1(repr((pid, dsid, version))).hexdigest()
+
+    def get(self, pid, dsid, version):
+        """Get cached content for a datastream version.
+
+        :returns: tuple of content and url, as returned by
+            :meth:`~eulcore.fedora.api.REST_API.getDatastreamDissemination`,
+            or None if not cached
+        """
+        key = self._key(pid, dsid, version)
+        cached = self.memory.get(key)
+        if cached is None and self.disk is not None:
+            cached = self.disk.get(key)
+            if cached is not None and len(cached[0]) <= self.max_memory_size:
+                self.memory.set(key, cached)
+        return cached
+
+    def set(self, pid, dsid, version, content, url):
+        "Cache content for a datastream version, if it is not too large."
+        size = len(content)
+        if size > self.max_content_size:
+            return
+        key = self._key(pid, dsid, version)
+        if size <= self.max_memory_size:
+            self.memory.set(key, (content, url))
+        if self.disk is not None:
+            self.disk.set(key, (content, url))
+
+    def clear(self):
+        "Remove all cached content."
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
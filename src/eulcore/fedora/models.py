@@ -17,6 +17,8 @@
 import cStringIO
 import hashlib
 import logging
+import sys
+import threading
 
 from rdflib import URIRef, Graph as RdfGraph
 
@@ -28,6 +30,7 @@ from eulcore.fedora.rdfns import model as modelns
 from eulcore.fedora.util import parse_xml_object, parse_rdf, RequestFailed, datetime_to_fedoratime
 from eulcore.fedora.xml import ObjectDatastreams, ObjectProfile, DatastreamProfile, \
     NewPids, ObjectHistory, ObjectMethods, DsCompositeModel
+from eulcore.util.workers import WorkerPool
 from eulcore.xmlmap.dc import DublinCore
 
 logger = logging.getLogger(__name__)
@@ -114,17 +117,13 @@ class DatastreamObject(object):
     def _get_content(self):
         # Pull datastream content from Fedora and return it as a string, but
         # only when accessed. Note that this will load the entire datastream
-        # contents into memory as a string. This is probably a bad idea for
-        # large files. Thus:
-        # TODO: Once we have an eulcore.fedora.api call that returns
-        # iterable chunks of datastream content, we need to either update
-        # this property or add another to expose that iterable chunk
-        # functionality at this layer.
+        # contents into memory as a string; see FileDatastreamObject for
+        # streaming access to large datastreams.
         if self._content is None:
             if not self.exists:
                 self._content = self._bootstrap_content()
             else:
-                data, url = self.obj.api.getDatastreamDissemination(self.obj.pid, self.id)
+                data, url = self._fetch_content()
                 self._content = self._convert_content(data, url)
                 # calculate and store a digest of the current datastream text content
                 self.digest = self._content_digest()
@@ -137,6 +136,21 @@ class DatastreamObject(object):
     content = property(_get_content, _set_content, None,
         "contents of the datastream; only pulled from Fedora when accessed, cached after first access")
 
+    def _fetch_content(self):
+        # get datastream content from Fedora, or from the object's content
+        # cache when the cached copy is for the current version according
+        # to the datastream profile
+        cache = self.obj.content_cache
+        if cache is None or self.info_modified or not cache.cacheable(self.info.size):
+            return self.obj.api.getDatastreamDissemination(self.obj.pid, self.id)
+        version = cache.version(self.info)
+        cached = cache.get(self.obj.pid, self.id, version)
+        if cached is not None:
+            return cached
+        data, url = self.obj.api.getDatastreamDissemination(self.obj.pid, self.id)
+        cache.set(self.obj.pid, self.id, version, data, url)
+        return data, url
+
     def _convert_content(self, data, url):
         # convert output of getDatastreamDissemination into the expected content type
         return data
@@ -554,16 +568,29 @@ class FileDatastreamObject(DatastreamObject):
 
         obj.image.content = open('/path/to/my/file')
         obj.save()
+
+    Content pulled from Fedora with :attr:`content` is loaded into memory.
+    To read a large datastream without loading all of it, use
+    :meth:`open_stream`::
+
+        with obj.image.open_stream() as stream:
+            with open('/path/to/copy', 'wb') as copy:
+                for chunk in stream:
+                    copy.write(chunk)
     """
 
     _content_modified = False
 
     def _raw_content(self):  
+        # content that has not been replaced does not need to be sent back
+        # to Fedora (or downloaded to do so) when only datastream info changed
+        if self.exists and not self._content_modified:
+            return None
         return self.content     # return the file itself (handled by upload/save API calls)
 
     def _convert_content(self, data, url):
         # for now, using stringio to return a file-like object
-        # NOTE: will require changes (here and in APIs) to handle large files
+        # NOTE: see open_stream for large files
         return cStringIO.StringIO(data)
 
     # redefine content property to override set_content to set a flag when modified
@@ -571,11 +598,27 @@ class FileDatastreamObject(DatastreamObject):
         super(FileDatastreamObject, self)._get_content()
         return self._content    
     def _set_content(self, val):
-        super(FileDatastreamObject, self)._set_content(val)
+        # no need to pull the current content from Fedora just to replace it
+        self._content = val
         self._content_modified = True        
     content = property(_get_content, _set_content, None,
         "contents of the datastream; only pulled from Fedora when accessed, cached after first access")
 
+    def open_stream(self, chunk_size=None):
+        """Open the datastream content in Fedora for reading without
+        loading it into memory.  The stream reads from a pooled connection;
+        it should be read to the end or closed when no longer needed.
+        Changes to :attr:`content` that have not been saved are not
+        included.
+
+        :param chunk_size: size of chunks returned when iterating over the
+            stream
+        :rtype: :class:`~eulcore.fedora.util.ResponseStream`
+        """
+        stream, url = self.obj.api.getDatastreamDissemination(self.obj.pid, self.id,
+                                                              stream=True, chunk_size=chunk_size)
+        return stream
+
     def _content_digest(self):
         # don't attempt to create a checksum of the file content
         pass
@@ -635,6 +678,22 @@ class DigitalObjectType(type):
         return DigitalObjectType._registry.copy()
 
 
+# worker pools used by DigitalObject.save, by number of workers; kept
+# separate from the eXist default pool so that objects can be saved from
+# code already running on that pool
+_save_pools = {}
+_save_pools_lock = threading.Lock()
+
+def _save_pool(workers):
+    _save_pools_lock.acquire()
+    try:
+        if workers not in _save_pools:
+            _save_pools[workers] = WorkerPool(workers)
+        return _save_pools[workers]
+    finally:
+        _save_pools_lock.release()
+
+
 class DigitalObject(object):
     """
     A single digital object in a Fedora respository, with methods and properties
@@ -650,6 +709,18 @@ class DigitalObject(object):
         which will use Fedora-configured namespace if default_pidspace
         is not set)."""        
 
+    content_cache = None
+    """Optional :class:`~eulcore.fedora.cache.DatastreamCache` used for
+        datastream content (except content read with
+        :meth:`FileDatastreamObject.open_stream`); set by :meth:`eulcore.fedora.server.Repository.get_object`
+        from :attr:`eulcore.fedora.server.Repository.content_cache`."""
+
+    save_workers = 1
+    """Number of threads used by :meth:`save` to save modified datastreams
+        of an existing object.  When greater than 1, datastreams are saved
+        concurrently on a shared worker pool; if any of them fails, the
+        ones that were saved are rolled back as for a sequential save."""
+
     dc = XmlDatastream("DC", "Dublin Core", DublinCore, defaults={
             'control_group': 'X',
             'format': 'http://www.openarchives.org/OAI/2.0/oai_dc/',
@@ -931,17 +1002,20 @@ class DigitalObject(object):
 
         # - list of datastreams that should be saved
         to_save = [ds for ds, dsobj in self.dscache.iteritems() if dsobj.isModified()]
-        # - track successfully saved datastreams, in case roll-back is necessary
-        saved = []        
-        # save modified datastreams
-        for ds in to_save:
-            if self.dscache[ds].save(logMessage):
-                    saved.append(ds)
-            else:
-                # save datastream failed - back out any changes that have been made
-                cleaned = self._undo_save(saved, 
-                                          "failed saving %s, rolling back changes" % ds)
-                raise DigitalObjectSaveFailure(self.pid, ds, to_save, saved, cleaned)
+        if self.save_workers > 1 and len(to_save) > 1:
+            saved = self._save_concurrently(to_save, logMessage)
+        else:
+            # - track successfully saved datastreams, in case roll-back is necessary
+            saved = []
+            # save modified datastreams
+            for ds in to_save:
+                if self.dscache[ds].save(logMessage):
+                        saved.append(ds)
+                else:
+                    # save datastream failed - back out any changes that have been made
+                    cleaned = self._undo_save(saved,
+                                              "failed saving %s, rolling back changes" % ds)
+                    raise DigitalObjectSaveFailure(self.pid, ds, to_save, saved, cleaned)
 
         # NOTE: to_save list in exception will never include profile; should it?
 
@@ -954,6 +1028,45 @@ class DigitalObject(object):
                 raise DigitalObjectSaveFailure(self.pid, "object profile", to_save, saved, cleaned)
             
 
+    def _save_concurrently(self, to_save, logMessage):
+        """Save a list of modified datastreams on the shared save worker
+        pool and return the list of datastreams that were saved.  If any
+        datastream fails to save, waits for the others to finish, backs
+        out the ones that were saved, and raises
+        :class:`DigitalObjectSaveFailure`.
+
+        :param to_save: list of datastream ids (should be in self.dscache)
+        :param logMessage: optional log message
+        """
+        pool = _save_pool(self.save_workers)
+        results = [pool.submit(self.dscache[ds].save, logMessage) for ds in to_save]
+
+        saved = []
+        failed = None
+        exc_info = None
+        # collect results in the original order, so saved lists match
+        # what a sequential save would report
+        for ds, result in zip(to_save, results):
+            try:
+                if result.get():
+                    saved.append(ds)
+                elif failed is None:
+                    failed = ds
+            except Exception:
+                if exc_info is None:
+                    exc_info = sys.exc_info()
+
+        if exc_info is not None:
+            # other datastreams may have been saved while this one was
+            # failing; back them out before passing the error along
+            self._undo_save(saved, "error saving datastreams, rolling back changes")
+            raise exc_info[0], exc_info[1], exc_info[2]
+        if failed is not None:
+            cleaned = self._undo_save(saved,
+                                      "failed saving %s, rolling back changes" % failed)
+            raise DigitalObjectSaveFailure(self.pid, failed, to_save, saved, cleaned)
+        return saved
+
     def _undo_save(self, datastreams, logMessage=None):
         """Takes a list of datastreams and a datetime, run undo save on all of them,
         and returns a list of the datastreams where the undo succeeded.
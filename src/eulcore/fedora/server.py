@@ -45,6 +45,10 @@ class Repository(object):
         'dc_modified' : 'dcmDate'
     }
     "human-readable aliases for oddly-named fedora search fields"
+
+    content_cache = None
+    """Optional :class:`~eulcore.fedora.cache.DatastreamCache` for the
+    datastream content of objects returned by :meth:`get_object`"""
     
     
     def __init__(self, root, username=None, password=None):
@@ -160,7 +164,10 @@ class Repository(object):
             if create is None:
                 create = False
 
-        return type(self.api, pid, create)
+        obj = type(self.api, pid, create)
+        if self.content_cache is not None:
+            obj.content_cache = self.content_cache
+        return obj
 
     def find_objects(self, terms=None, type=None, chunksize=None, **kwargs):
         """
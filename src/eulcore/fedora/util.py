@@ -17,12 +17,14 @@
 from contextlib import contextmanager
 from datetime import datetime
 from dateutil.tz import tzutc
+import errno
 import httplib
+import logging
 import mimetypes
 import random
 import re
+import socket
 import string
-import threading
 from cStringIO import StringIO
 
 from base64 import b64encode
@@ -31,9 +33,12 @@ from urlparse import urljoin, urlsplit
 from rdflib import URIRef, Graph
 
 from eulcore import xmlmap
+from eulcore.util.connection import get_connection_pool
 
 from poster import streaminghttp
 
+logger = logging.getLogger(__name__)
+
 # NOTE: the multipart encoding below should be superceded by use of poster
 # functions for posting multipart form data
 # this code is a combination of:
@@ -140,12 +145,132 @@ class PermissionDenied(RequestFailed):
     Fedora object or datastream.
     '''
 
+class ResponseStream(object):
+    '''File-like access to the body of an HTTP response, for reading large
+    content without loading all of it into memory.  Iterating over a
+    ResponseStream returns the content in chunks of :attr:`chunk_size`
+    bytes, and closes the stream when the content has been read.
+
+    The connection the content is read from is returned to its pool as
+    soon as all of the content has been read.  A stream that is closed
+    before then also closes the connection, since the unread content would
+    otherwise interfere with the next request on that connection; so does
+    a stream that is garbage-collected without being closed.
+
+    :param response: :class:`httplib.HTTPResponse`
+    :param release: function called with the response and a flag
+        indicating whether its connection must be discarded, when all
+        content has been read or the stream is closed; see
+        :meth:`HttpServerConnection.release`
+    :param chunk_size: size of chunks returned when iterating; defaults
+        to :attr:`chunk_size`
+    '''
+
+    chunk_size = 65536
+    "default number of bytes returned for each iteration"
+
+    def __init__(self, response, release=None, chunk_size=None):
+        self.response = response
+        self._release = release
+        if chunk_size is not None:
+            self.chunk_size = chunk_size
+        self.status = response.status
+        "HTTP status code of the response"
+        self.closed = False
+
+    def getheader(self, name, default=None):
+        "Get a response header; see :meth:`httplib.HTTPResponse.getheader`."
+        return self.response.getheader(name, default)
+
+    @property
+    def size(self):
+        "Content length in bytes, as reported by the server, or None"
+        length = self.getheader('Content-Length')
+        if length is not None:
+            return int(length)
+
+    def read(self, size=-1):
+        '''Read up to ``size`` bytes of content, or all remaining content if
+        size is negative or not specified.  Returns an empty string when all
+        content has been read.'''
+        if self.closed:
+            raise ValueError('I/O operation on closed response stream')
+        if size < 0:
+            data = self.response.read()
+        else:
+            data = self.response.read(size)
+        if self.response.isclosed():
+            # all content has been read; the connection can be reused
+            self._release_connection()
+        return data
+
+    def __iter__(self):
+        try:
+            while True:
+                chunk = self.read(self.chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        # if content was not completely read, the connection can't be reused
+        unread = not self.response.isclosed()
+        self.response.close()
+        self._release_connection(discard=unread)
+
+    def _release_connection(self, discard=False):
+        # return the connection to its pool, only once
+        release, self._release = self._release, None
+        if release is not None:
+            release(self.response, discard=discard)
+
+    def __del__(self):
+        # a stream that is dropped without being closed must not keep its
+        # connection checked out of the pool
+        if not self.closed:
+            self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
 # custom exceptions?  fedora errors:
 # fedora.server.errors.ObjectValidityException
 # ObjectExistsException
 
+# socket errors indicating that the server closed a kept-alive connection
+_STALE_CONNECTION_ERRORS = (errno.ECONNRESET, errno.ECONNABORTED, errno.EPIPE)
+
 class HttpServerConnection(object):
-    def __init__(self, url):
+    '''Make HTTP requests to a single server, using persistent HTTP/1.1
+    connections from a :class:`~eulcore.util.connection.ConnectionPool`.  Pools
+    are shared by all instances connecting to the same host, and by all
+    threads, so the number of connections to a host is limited by the
+    pool's ``max_size``; requests beyond that wait for a connection to be
+    returned, for up to the pool's ``wait_timeout``.  Idle connections are closed after the pool's
+    ``idle_timeout``, and connections the server has closed or will close
+    are not reused.
+
+    A connection is returned to the pool once its response has been read;
+    :meth:`open`, :meth:`stream`, and :meth:`RelativeServerConnection.read`
+    take care of this.  Code that uses :meth:`request` directly should call
+    :meth:`release` with the response when done with it.
+
+    :param url: url of the server; only the scheme, host and port are used
+    :param max_size: if specified, set the maximum number of connections
+        to the host
+    :param idle_timeout: if specified, set the number of seconds an unused
+        connection is kept open
+    '''
+    def __init__(self, url, max_size=None, idle_timeout=None):
         self.urlparts = urlsplit(url)
         # instead of stock httplib connection classes, use patched versions from poster module
         # - allows using a generator for content, in support of posting large files
@@ -155,8 +280,13 @@ class HttpServerConnection(object):
         elif self.urlparts.scheme == 'https':
             #self.connection_class = httplib.HTTPSConnection
             self.connection_class = streaminghttp.StreamingHTTPSConnection
-        
-        self.thread_local = threading.local()
+
+        host = self.urlparts.hostname
+        if self.urlparts.port:
+            host = '%s:%d' % (host, self.urlparts.port)
+        self.pool = get_connection_pool(self.connection_class, host,
+                                        max_size=max_size, idle_timeout=idle_timeout)
+        "shared :class:`~eulcore.util.connection.ConnectionPool` for the server"
 
     def request(self, method, url, body=None, headers=None, throw_errors=True):
         response = self._connect_and_request(method, url, body, headers)
@@ -165,62 +295,98 @@ class HttpServerConnection(object):
         if response.status >= 400 and throw_errors:
             # separate out 401 and 403 (permission errors) to enable
             # special handling in client code.
-            if response.status in (401, 403):
-                raise PermissionDenied(response)
-            else:
-                raise RequestFailed(response)
+            try:
+                if response.status in (401, 403):
+                    raise PermissionDenied(response)
+                else:
+                    raise RequestFailed(response)
+            finally:
+                self.release(response)
 
         return response
 
+    def release(self, response, discard=False):
+        '''Return the connection a response was received on to the pool, or
+        close it if the response has not been completely read or the server
+        will close it.
+
+        :param response: response returned by :meth:`request`
+        :param discard: close the connection instead of reusing it
+        '''
+        connection = getattr(response, '_pooled_connection', None)
+        if connection is None:
+            return
+        response._pooled_connection = None
+        if discard or not response.isclosed() or response.will_close:
+            self.pool.discard(connection)
+        else:
+            self.pool.release(connection)
+
     def _connect_and_request(self, method, url, body, headers):
-        if getattr(self.thread_local, 'connection', None) is not None:
-            try:
-                # we're already connected. try to reuse it.
-                return self._make_request(method, url, body, headers)
-            except:
-                # that didn't work. maybe the server disconnected on us.
-                # reset the connection and try again.
-                self._reset_connection()
-
-        # either we didn't have a conn, or we had one but it failed
-        self._get_connection()
-        
-        # now try sending the request again. this is the first time for this
-        # new connection. if this fails, all hope is lost. just try to tidy
-        # up a little then propagate the exception.
+        # a file body can be sent again after a failure only if it can be rewound
+        body_position = None
+        if hasattr(body, 'read') and hasattr(body, 'tell'):
+            body_position = body.tell()
+        retryable = body is None or isinstance(body, basestring) or \
+                    body_position is not None
+
+        connection, reused = self.pool.get()
         try:
-            return self._make_request(method, url, body, headers)
+            return self._make_request(connection, method, url, body, headers)
+        except (socket.error, httplib.BadStatusLine), e:
+            self.pool.discard(connection)
+            # the server may have closed a kept-alive connection while it
+            # was idle; if so, retry once on a new connection
+            stale = isinstance(e, httplib.BadStatusLine) or \
+                    getattr(e, 'errno', None) in _STALE_CONNECTION_ERRORS
+            if not (reused and stale and retryable):
+                raise
         except:
-            self._reset_connection()
+            self.pool.discard(connection)
             raise
 
-    def _get_connection(self):
-        connection = self.connection_class(self.urlparts.hostname, self.urlparts.port)
-        connection._http_vsn = 11
-        connection._http_vsn_str = 'HTTP/1.1'
-        self.thread_local.connection = connection
+        logger.debug('connection to %s was closed; retrying' % self.pool.host)
+        if body_position is not None:
+            body.seek(body_position)
+        connection, reused = self.pool.get(reuse=False)
+        try:
+            return self._make_request(connection, method, url, body, headers)
+        except:
+            self.pool.discard(connection)
+            raise
 
-    def _reset_connection(self):
-        self.thread_local.connection.close()
-        self.thread_local.connection = None
-        
-    def _make_request(self, method, url, body, headers):
-        self.thread_local.connection.request(method, url, body, headers)
-        return self.thread_local.connection.getresponse()
+    def _make_request(self, connection, method, url, body, headers):
+        connection.request(method, url, body, headers or {})
+        response = connection.getresponse()
+        # keep track of the connection so it can be released when the
+        # response has been read
+        response._pooled_connection = connection
+        return response
 
     @contextmanager
     def open(self, method, url, body=None, headers=None, throw_errors=True):
         response = self.request(method, url, body, headers, throw_errors)
-        yield response
-        response.read()
+        try:
+            yield response
+            response.read()
+        finally:
+            self.release(response)
+
+    def stream(self, method, url, body=None, headers=None, throw_errors=True,
+               chunk_size=None):
+        '''Make a request and return the response as a :class:`ResponseStream`,
+        so that the response content can be read incrementally.  The stream
+        should be closed when it is no longer needed.'''
+        response = self.request(method, url, body, headers, throw_errors)
+        return ResponseStream(response, self.release, chunk_size)
 
 
 # wrap up all of our common aspects of accessing data over HTTP, from
 # authentication to http/s switching to connection management to relative
 # path resolving. sorta like urllib2 with extras.
 class RelativeServerConnection(HttpServerConnection):
-    def __init__(self, base_url):
-        super(RelativeServerConnection, self).__init__(base_url)
+    def __init__(self, base_url, max_size=None, idle_timeout=None):
+        super(RelativeServerConnection, self).__init__(base_url, max_size, idle_timeout)
         self.base_url = base_url
 
     def absurl(self, rel_url):
@@ -238,7 +404,15 @@ class RelativeServerConnection(HttpServerConnection):
 
         abs_url = self.absurl(rel_url)
         response = self.request(method, abs_url, data, headers)
-        return response.read(), abs_url
+        try:
+            return response.read(), abs_url
+        finally:
+            self.release(response)
+
+    def stream(self, rel_url, headers={}, chunk_size=None):
+        abs_url = self.absurl(rel_url)
+        super_stream = super(RelativeServerConnection, self).stream
+        return super_stream('GET', abs_url, headers=headers, chunk_size=chunk_size), abs_url
 
 
 class AuthorizingServerConnection(object):
@@ -265,6 +439,9 @@ class AuthorizingServerConnection(object):
     def read(self, rel_url, data=None):
         return self.base.read(rel_url, data, self._auth_headers())
 
+    def stream(self, rel_url, chunk_size=None):
+        return self.base.stream(rel_url, self._auth_headers(), chunk_size)
+
 
 def parse_rdf(data, url, format=None):
     fobj = StringIO(data)
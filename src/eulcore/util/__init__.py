@@ -0,0 +1,23 @@
+# file util/__init__.py
+#
+#   Copyright 2010 Emory University General Library
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Utilities shared by :mod:`eulcore.existdb` and :mod:`eulcore.fedora`,
+without dependencies on either package:
+
+ * :mod:`eulcore.util.connection` -- Pools of persistent HTTP connections
+ * :mod:`eulcore.util.cache` -- In-memory and on-disk caches
+ * :mod:`eulcore.util.workers` -- Run functions on background threads
+"""
@@ -0,0 +1,215 @@
+# file util/cache.py
+#
+#   Copyright 2010 Emory University General Library
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""In-memory and on-disk caches.
+
+:class:`LRUCache` is a simple bounded in-memory cache, used to avoid
+repeating work that does not need to be repeated, such as generating the
+same XQuery over and over again.  :class:`DiskCache` keeps values in
+files, shared by all processes on a machine.
+
+"""
+
+import cPickle as pickle
+import os
+import tempfile
+import threading
+import time
+
+__all__ = ['LRUCache', 'DiskCache']
+
+
+class LRUCache(object):
+    """Thread-safe, bounded in-memory cache that discards the least
+    recently used item when full.  Keeps count of cache hits and misses.
+
+    :param max_size: maximum number of items to keep; defaults to
+        :attr:`max_size`
+    """
+
+    max_size = 100
+    "default maximum number of items to keep"
+
+    def __init__(self, max_size=None):
+        if max_size is not None:
+            self.max_size = max_size
+        self.hits = 0
+        "number of successful lookups"
+        self.misses = 0
+        "number of lookups for items not in the cache"
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        # items are stored in a dictionary for lookup and in a circular
+        # doubly-linked list (most recently used first) for ordering;
+        # list links are [previous, next, key, value]
+        self._items = {}
+        self._root = []
+        self._root[:] = [self._root, self._root, None, None]
+
+    def get(self, key, default=None):
+        """Get an item from the cache, marking it as most recently used.
+        Returns ``default`` if the item is not in the cache."""
+        self._lock.acquire()
+        try:
+            link = self._items.get(key, None)
+            if link is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._unlink(link)
+            self._link_first(link)
+            return link[3]
+        finally:
+            self._lock.release()
+
+    def set(self, key, value):
+        "Add or update an item in the cache."
+        self._lock.acquire()
+        try:
+            link = self._items.get(key, None)
+            if link is not None:
+                link[3] = value
+                self._unlink(link)
+            else:
+                link = [None, None, key, value]
+                self._items[key] = link
+            self._link_first(link)
+            while len(self._items) > self.max_size:
+                oldest = self._root[0]
+                self._unlink(oldest)
+                del self._items[oldest[2]]
+        finally:
+            self._lock.release()
+
+    def delete(self, key):
+        "Remove an item from the cache, if present."
+        self._lock.acquire()
+        try:
+            link = self._items.pop(key, None)
+            if link is not None:
+                self._unlink(link)
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        "Remove all items from the cache and reset hit and miss counts."
+        self._lock.acquire()
+        try:
+            self._clear()
+            self.hits = self.misses = 0
+        finally:
+            self._lock.release()
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def _unlink(self, link):
+        prev, next = link[0], link[1]
+        prev[1] = next
+        next[0] = prev
+
+    def _link_first(self, link):
+        first = self._root[1]
+        link[0] = self._root
+        link[1] = first
+        first[0] = link
+        self._root[1] = link
+
+
+class DiskCache(object):
+    """Cache that stores each value in a file in a local directory, shared
+    by all processes with access to the directory.  Keys are used as file
+    names, and values must be picklable.  Several caches may share a
+    directory if they use different :attr:`key_prefix` values.
+
+    :param directory: directory for cache files; created if it does not
+        exist
+    :param timeout: optional number of seconds values are kept; defaults
+        to :attr:`timeout`
+    :param key_prefix: prefix of all keys stored by this cache; defaults
+        to :attr:`key_prefix`
+    """
+
+    timeout = None
+    "default number of seconds values are kept, or None to keep them until removed"
+    key_prefix = ''
+    "prefix of all keys stored by this cache; :meth:`clear` removes only these"
+
+    def __init__(self, directory, timeout=None, key_prefix=None):
+        self.directory = directory
+        if timeout is not None:
+            self.timeout = timeout
+        if key_prefix is not None:
+            self.key_prefix = key_prefix
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        "Get a cached value, or None if it is not cached or has expired."
+        try:
+            f = open(self._path(key), 'rb')
+            try:
+                expires, value = pickle.load(f)
+            finally:
+                f.close()
+        except (IOError, EOFError, pickle.UnpicklingError, ValueError):
+            return None
+        if expires is not None and expires < time.time():
+            self.delete(key)
+            return None
+        return value
+
+    def set(self, key, value):
+        "Store a value in the cache."
+        expires = None
+        if self.timeout is not None:
+            expires = time.time() + self.timeout
+        # write to a temporary file and rename, so other processes never
+        # read a partially written value
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp')
+        try:
+            f = os.fdopen(fd, 'wb')
+            try:
+                pickle.dump((expires, value), f, pickle.HIGHEST_PROTOCOL)
+            finally:
+                f.close()
+            os.rename(tmp_path, self._path(key))
+        except:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def delete(self, key):
+        "Remove a value from the cache, if present."
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        "Remove all values stored with :attr:`key_prefix` from the cache."
+        for name in os.listdir(self.directory):
+            # skip temporary files for values still being written
+            if name.startswith(self.key_prefix) and not name.startswith('.tmp'):
+                self.delete(name)
@@ -0,0 +1,251 @@
+# file util/connection.py
+#
+#   Copyright 2010 Emory University General Library
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Persistent HTTP connections shared between threads.
+
+:class:`ConnectionPool` keeps keep-alive connections to a single host for
+reuse, limiting how many are open at once; :func:`get_connection_pool`
+returns the pool shared by everything in the process that connects to a
+host.  Used by both :mod:`eulcore.existdb` and :mod:`eulcore.fedora`.
+
+"""
+
+import logging
+import select
+import socket
+import threading
+import time
+
+__all__ = ['ConnectionPool', 'ConnectionPoolTimeout', 'get_connection_pool']
+
+logger = logging.getLogger(__name__)
+
+
+def _closed_by_server(connection):
+    # an idle keep-alive connection should have nothing to read; if its
+    # socket is readable, the server has closed the connection
+    sock = getattr(connection, 'sock', None)
+    if sock is None:
+        # not connected; connects when the next request is sent
+        return False
+    try:
+        return bool(select.select([sock], [], [], 0)[0])
+    except (select.error, socket.error, ValueError):
+        return True
+
+class ConnectionPoolTimeout(socket.timeout):
+    """Raised by :meth:`ConnectionPool.get` when no connection is returned
+    to a full pool within its wait timeout."""
+
+
+class ConnectionPool(object):
+    """Thread-safe pool of persistent HTTP/1.1 connections to a single host.
+
+    Used by :class:`~eulcore.existdb.db.TimeoutTransport` and
+    :class:`~eulcore.fedora.util.HttpServerConnection` so that requests can
+    reuse keep-alive connections instead of opening a new connection (and,
+    for https, negotiating a new SSL session) for every call.  Pools are
+    shared by all clients connecting to the same host; see
+    :func:`get_connection_pool`.
+
+    :param connection_class: :class:`httplib.HTTPConnection` or
+        :class:`httplib.HTTPSConnection` (or a subclass)
+    :param host: host name, with optional port, to connect to
+    :param timeout: socket timeout for new connections
+    :param max_size: maximum number of connections open at once; requests
+        beyond this wait until a connection is returned to the pool.
+        Defaults to :attr:`max_size`.
+    :param idle_timeout: connections unused for more than this many seconds
+        are closed instead of reused.  Defaults to :attr:`idle_timeout`.
+    :param wait_timeout: number of seconds to wait for a connection when
+        the pool is full.  Defaults to :attr:`wait_timeout`.
+
+    Idle connections that the server has closed are detected and discarded
+    when they are checked out.  The pool keeps counts of checkouts, waits,
+    and new connections, which may be useful for tuning :attr:`max_size`.
+    """
+
+    max_size = 10
+    "default maximum number of connections open at once"
+    idle_timeout = 30
+    "default number of seconds an unused connection is kept open"
+    wait_timeout = 60
+    """default number of seconds to wait for a connection when the pool is
+    full, before raising :class:`ConnectionPoolTimeout`; None to wait
+    indefinitely"""
+
+    def __init__(self, connection_class, host, timeout=None, max_size=None,
+                 idle_timeout=None, wait_timeout=None):
+        if timeout is None:
+            timeout = socket._GLOBAL_DEFAULT_TIMEOUT
+        self.connection_class = connection_class
+        self.host = host
+        self.timeout = timeout
+        if max_size is not None:
+            self.max_size = max_size
+        if idle_timeout is not None:
+            self.idle_timeout = idle_timeout
+        if wait_timeout is not None:
+            self.wait_timeout = wait_timeout
+
+        self._idle = []     # list of (connection, time last used), oldest first
+        self._open = 0      # number of connections currently open
+        self._condition = threading.Condition()
+
+        self.checkouts = 0
+        "number of connections checked out with :meth:`get`"
+        self.waits = 0
+        "number of checkouts that waited for a connection to be returned"
+        self.connects = 0
+        "number of new connections opened"
+        self.reconnects = 0
+        "number of new connections requested with ``reuse=False``, e.g. to retry a request"
+
+    @property
+    def size(self):
+        "number of connections currently open, in use or idle"
+        return self._open
+
+    def get(self, reuse=True, timeout=None):
+        """Check out a connection, waiting for one to be returned to the pool
+        if :attr:`max_size` connections are already open.
+
+        :param reuse: when False, always open a new connection
+        :param timeout: number of seconds to wait for a connection;
+            defaults to :attr:`wait_timeout`
+        :returns: tuple of connection and a boolean indicating whether the
+            connection has been used for a previous request
+        :raises: :class:`ConnectionPoolTimeout` if no connection is
+            available in time
+        """
+        if timeout is None:
+            timeout = self.wait_timeout
+        self._condition.acquire()
+        try:
+            self.checkouts += 1
+            if not reuse:
+                self.reconnects += 1
+            waited = False
+            deadline = None
+            while True:
+                self._evict_idle()
+                if reuse and self._idle:
+                    # most recently used connection is least likely to be stale
+                    connection, last_used = self._idle.pop()
+                    if _closed_by_server(connection):
+                        self._close(connection)
+                        continue
+                    return connection, True
+                if self._open < self.max_size:
+                    self._open += 1
+                    self.connects += 1
+                    break
+                if self._idle:
+                    # a new connection was requested but the pool is full;
+                    # make room by closing an idle connection
+                    self._close(self._idle.pop(0)[0])
+                    continue
+                if not waited:
+                    self.waits += 1
+                    waited = True
+                    if timeout is not None:
+                        deadline = time.time() + timeout
+                if deadline is None:
+                    self._condition.wait()
+                    continue
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise ConnectionPoolTimeout('no connection to %s available after %s seconds'
+                                                % (self.host, timeout))
+                self._condition.wait(remaining)
+        finally:
+            self._condition.release()
+
+        logger.debug('opening new connection to %s' % self.host)
+        return self.connection_class(self.host, timeout=self.timeout), False
+
+    def release(self, connection):
+        "Return a connection to the pool for reuse."
+        self._condition.acquire()
+        try:
+            self._idle.append((connection, time.time()))
+            self._condition.notify()
+        finally:
+            self._condition.release()
+
+    def discard(self, connection):
+        "Close a checked-out connection that should not be reused."
+        self._condition.acquire()
+        try:
+            self._close(connection)
+            self._condition.notify()
+        finally:
+            self._condition.release()
+
+    def clear(self):
+        "Close all idle connections."
+        self._condition.acquire()
+        try:
+            while self._idle:
+                self._close(self._idle.pop()[0])
+            self._condition.notify_all()
+        finally:
+            self._condition.release()
+
+    def _evict_idle(self):
+        # close any connections that have been idle too long; must be called
+        # with the lock held
+        cutoff = time.time() - self.idle_timeout
+        while self._idle and self._idle[0][1] < cutoff:
+            self._close(self._idle.pop(0)[0])
+
+    def _close(self, connection):
+        # must be called with the lock held
+        self._open -= 1
+        connection.close()
+
+
+_connection_pools = {}
+_connection_pools_lock = threading.Lock()
+
+def get_connection_pool(connection_class, host, timeout=None, max_size=None,
+                        idle_timeout=None, wait_timeout=None):
+    """Get the :class:`ConnectionPool` for the specified connection class,
+    host, and timeout, creating it if it does not yet exist.  Pools are
+    shared process-wide, so all clients that connect to the same server
+    share connections.
+
+    :param max_size: if specified, set the pool's maximum number of
+        connections, which limits connections to the host
+    :param idle_timeout: if specified, set the pool's idle timeout
+    :param wait_timeout: if specified, set the number of seconds to wait
+        for a connection when the pool is full
+    """
+    key = (connection_class, host, timeout)
+    _connection_pools_lock.acquire()
+    try:
+        if key not in _connection_pools:
+            _connection_pools[key] = ConnectionPool(connection_class, host, timeout)
+        pool = _connection_pools[key]
+        if max_size is not None:
+            pool.max_size = max_size
+        if idle_timeout is not None:
+            pool.idle_timeout = idle_timeout
+        if wait_timeout is not None:
+            pool.wait_timeout = wait_timeout
+        return pool
+    finally:
+        _connection_pools_lock.release()
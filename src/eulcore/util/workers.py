@@ -0,0 +1,117 @@
+# file util/workers.py
+#
+#   Copyright 2010 Emory University General Library
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""Run functions on a pool of background threads.
+
+:meth:`WorkerPool.submit` returns an :class:`AsyncResult` for each
+function; :func:`gather` waits for several results at once::
+
+    pool = WorkerPool(workers=4)
+    first, second = gather(pool.submit(func, 1), pool.submit(func, 2))
+
+"""
+
+from Queue import Queue
+import sys
+import threading
+
+__all__ = ['AsyncResult', 'WorkerPool', 'gather']
+
+
+class AsyncResult(object):
+    """The pending result of a function running on a :class:`WorkerPool`."""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._value = None
+        self._exc_info = None
+
+    def ready(self):
+        "Return True if the function has finished running."
+        return self._done.isSet()
+
+    def get(self, timeout=None):
+        """Wait for the function to finish and return its result.  If the
+        function raised an exception, it is re-raised here.
+
+        :param timeout: optional number of seconds to wait; raises
+            :class:`RuntimeError` if the result is not ready in time
+        """
+        self._done.wait(timeout)
+        if not self._done.isSet():
+            raise RuntimeError('Result not available after %s seconds' % timeout)
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._value
+
+    def _run(self, func, args, kwargs):
+        try:
+            self._value = func(*args, **kwargs)
+        except:
+            self._exc_info = sys.exc_info()
+        self._done.set()
+
+
+class WorkerPool(object):
+    """A fixed-size pool of daemon threads for running functions in the
+    background.
+
+    :param workers: number of worker threads; defaults to :attr:`workers`
+    """
+
+    workers = 8
+    "default number of worker threads"
+
+    def __init__(self, workers=None):
+        if workers is not None:
+            self.workers = workers
+        self._queue = Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def _start(self):
+        # start worker threads the first time the pool is used
+        self._lock.acquire()
+        try:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work)
+                thread.setDaemon(True)
+                thread.start()
+                self._threads.append(thread)
+        finally:
+            self._lock.release()
+
+    def _work(self):
+        while True:
+            result, func, args, kwargs = self._queue.get()
+            result._run(func, args, kwargs)
+
+    def submit(self, func, *args, **kwargs):
+        """Run a function with the specified arguments on a worker thread.
+
+        :rtype: :class:`AsyncResult`
+        """
+        if len(self._threads) < self.workers:
+            self._start()
+        result = AsyncResult()
+        self._queue.put((result, func, args, kwargs))
+        return result
+
+
+def gather(*results):
+    """Wait for all of the specified :class:`AsyncResult` objects and return
+    their values as a list, in the same order."""
+    return [result.get() for result in results]
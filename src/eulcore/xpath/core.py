@@ -26,6 +26,7 @@ eulcore.xpath, not directly from here."""
 
 import os
 import re
+import threading
 from ply import lex, yacc
 
 from eulcore.xpath import lexrules
@@ -135,7 +136,18 @@ lexer.last = None
 # than the lexer wackiness.
 parsedir = os.path.dirname(parserules.__file__)
 parser = yacc.yacc(module=parserules, outputdir=parsedir, debug=0)
-parse = parser.parse
+
+# the lexer and parser keep state while parsing, so only one thread at a
+# time may use them
+_parse_lock = threading.Lock()
+
+def parse(*args, **kwargs):
+    _parse_lock.acquire()
+    try:
+        return parser.parse(*args, **kwargs)
+    finally:
+        _parse_lock.release()
+parse.__doc__ = parser.parse.__doc__
 
 def ptokens(s):
     '''Lex a string as XPath tokens, and print each token as it is lexed.
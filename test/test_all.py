@@ -15,6 +15,7 @@ non_django_test_modules = (
     'test_binfile',
     'test_existdb',
     'test_fedora',
+    'test_util',
     'test_xmlmap', 
     'test_xpath',
     )
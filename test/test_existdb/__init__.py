@@ -1,2 +1,6 @@
+from test_existdb.test_cache import *
 from test_existdb.test_db import *
+from test_existdb.test_indexconfig import *
+from test_existdb.test_instrumentation import *
+from test_existdb.test_parallel import *
 from test_existdb.test_query import *
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+import shutil
+import tempfile
+import unittest
+
+from eulcore.existdb.cache import LRUCacheBackend, DiskCacheBackend, invalidate
+from testcore import main
+
+class LRUCacheBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = LRUCacheBackend(max_size=10)
+
+    def test_get_set(self):
+        key = self.backend.make_key('http://localhost/exist', '//a', 1)
+        self.assertEqual(key, self.backend.make_key('http://localhost/exist', '//a', 1))
+        self.assertNotEqual(key, self.backend.make_key('http://localhost/exist', '//a', 2))
+        self.assertEqual(None, self.backend.get(key))
+        self.backend.set(key, '<a/>')
+        self.assertEqual('<a/>', self.backend.get(key))
+        self.backend.delete(key)
+        self.assertEqual(None, self.backend.get(key))
+
+    def test_generation(self):
+        coll = self.backend.generation('a/b')
+        parent = self.backend.generation('/db/a')
+        other = self.backend.generation('c')
+        everything = self.backend.generation(None)
+        self.assertEqual(coll, self.backend.generation('/a/b/'))
+
+        # document change invalidates its collection and parent collections
+        invalidate('/db/a/b/doc.xml')
+        self.assertNotEqual(coll, self.backend.generation('a/b'))
+        self.assertNotEqual(parent, self.backend.generation('a'))
+        self.assertNotEqual(everything, self.backend.generation(None))
+        self.assertEqual(other, self.backend.generation('c'))
+
+        # removing a collection invalidates its subcollections
+        coll = self.backend.generation('a/b')
+        other = self.backend.generation('c')
+        invalidate('/a', collection=True)
+        self.assertNotEqual(coll, self.backend.generation('a/b'))
+        self.assertEqual(other, self.backend.generation('c'))
+
+        # document change in a subcollection does not affect its siblings
+        coll = self.backend.generation('a/b')
+        invalidate('/a/c/doc.xml')
+        self.assertEqual(coll, self.backend.generation('a/b'))
+
+
+class DiskCacheBackendTest(LRUCacheBackendTest):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.backend = DiskCacheBackend(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        del self.backend
+
+    def test_shared(self):
+        key = self.backend.make_key('//a', 1)
+        self.backend.set(key, ['data'])
+        # another backend using the same directory sees the same data
+        other = DiskCacheBackend(self.directory)
+        self.assertEqual(['data'], other.get(key))
+        self.assertEqual(self.backend.generation('a'), other.generation('a'))
+        other.clear()
+        self.assertEqual(None, self.backend.get(key))
+
+    def test_timeout(self):
+        self.backend.timeout = -1
+        key = self.backend.make_key('//a', 1)
+        self.backend.set(key, 'data')
+        self.assertEqual(None, self.backend.get(key))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,20 @@
 #!/usr/bin/env python
 
+from mock import Mock
+import os
+import shutil
+from SimpleXMLRPCServer import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+from SocketServer import ThreadingMixIn
+import socket
+import tempfile
+import threading
 import unittest
 from urlparse import urlsplit, urlunsplit
+import xmlrpclib
 
+from eulcore import xmlmap
 from eulcore.existdb import db
+from eulcore.util import connection
 from testcore import main
 
 EXISTDB_SERVER_PROTOCOL = "http://"
@@ -382,5 +393,253 @@ class ExistDBTest(unittest.TestCase):
 
     # can't figure out how to test timeout init param...
 
+
+class ResultHandleRegistryTest(unittest.TestCase):
+    # registry tests use a mock db and do not require an eXist server
+
+    def setUp(self):
+        self.db = Mock(db.ExistDB)
+        self.db.server_url = 'http://localhost:8080/exist'
+        self.db.executeQuery.side_effect = lambda xquery: self.db.executeQuery.call_count
+        self.registry = db.ResultHandleRegistry(max_size=2, ttl=60)
+
+    def test_acquire_release(self):
+        handle = self.registry.acquire(self.db, '/root')
+        self.assertEqual(1, handle.result_id)
+        # identical query on another db instance for the same server reuses the handle
+        other_db = Mock(db.ExistDB)
+        other_db.server_url = self.db.server_url
+        self.assert_(self.registry.acquire(other_db, '/root') is handle)
+        self.assertEqual(1, self.db.executeQuery.call_count)
+        self.assertEqual(0, other_db.executeQuery.call_count)
+        # different query executes separately
+        self.assertEqual(2, self.registry.acquire(self.db, '/other').result_id)
+
+        # unused handles are kept for reuse, not released
+        self.registry.release(handle)
+        self.registry.release(handle)
+        self.assertEqual(0, self.db.releaseQueryResult.call_count)
+        self.assert_(self.registry.acquire(self.db, '/root') is handle)
+
+    def test_max_size(self):
+        for xquery in ['/a', '/b', '/c']:
+            self.registry.release(self.registry.acquire(self.db, xquery))
+        # least recently used unused handle is released on the server
+        self.db.releaseQueryResult.assert_called_once_with(1)
+
+    def test_ttl(self):
+        registry = db.ResultHandleRegistry(ttl=-1)
+        handle = registry.acquire(self.db, '/root')
+        # handles in use are shared regardless of age
+        self.assert_(registry.acquire(self.db, '/root') is handle)
+        registry.release(handle)
+        registry.release(handle)
+        self.db.releaseQueryResult.assert_called_once_with(1)
+        self.assertEqual(2, registry.acquire(self.db, '/root').result_id)
+
+    def test_invalidate(self):
+        in_use = self.registry.acquire(self.db, '/a')
+        unused = self.registry.acquire(self.db, '/b')
+        self.registry.release(unused)
+        self.registry.invalidate(self.db)
+        # unused handle released immediately, handle in use when released
+        self.db.releaseQueryResult.assert_called_once_with(unused.result_id)
+        self.assertNotEqual(in_use.result_id, self.registry.acquire(self.db, '/a').result_id)
+        self.registry.release(in_use)
+        self.db.releaseQueryResult.assert_called_with(in_use.result_id)
+
+
+class IterQueryTest(unittest.TestCase):
+    # uses a mock xml-rpc server proxy; no eXist server required
+
+    def setUp(self):
+        self.db = db.ExistDB('http://localhost:8080/exist')
+        self.db.server = Mock()
+        self.db.server.query.side_effect = self._query_result
+
+    def _query_result(self, xquery, how_many, start, options, hits=5):
+        end = min(start + how_many, hits + 1)
+        items = ''.join('<item n="%d"/>' % i for i in range(start, end))
+        return u'<exist:result xmlns:exist="%s" hits="%d" start="%d" count="%d">%s</exist:result>' % \
+            (db.EXISTDB_NAMESPACE, hits, start, end - start, items)
+
+    def test_iterquery(self):
+        items = list(self.db.iterquery('//item', chunk_size=2))
+        self.assertEqual(['1', '2', '3', '4', '5'], [i.get('n') for i in items])
+        # results requested in chunks
+        self.assertEqual(3, self.db.server.query.call_count)
+        # each item is a separate document
+        self.assertEqual(['1'], items[0].xpath('/item/@n'))
+
+    def test_iterquery_limits(self):
+        class Item(xmlmap.XmlObject):
+            n = xmlmap.IntegerField('@n')
+        items = list(self.db.iterquery('//item', start=2, how_many=3, chunk_size=2,
+                                       xmlclass=Item, highlight=True))
+        self.assertEqual([2, 3, 4], [i.n for i in items])
+        args, kwargs = self.db.server.query.call_args
+        self.assertEqual(('//item', 1, 4), args[:3])
+        self.assertEqual('elements', args[3]['highlight-matches'])
+
+
+class LoadManyTest(unittest.TestCase):
+    # uses a mock xml-rpc server proxy; no eXist server required
+
+    def setUp(self):
+        self.db = db.ExistDB('http://localhost:8080/exist')
+        self.db.server = Mock()
+        self.db.server.parse.return_value = True
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_load_many(self):
+        files = []
+        for i in range(5):
+            filename = os.path.join(self.tmpdir, 'doc%d.xml' % i)
+            f = open(filename, 'w')
+            f.write('<doc n="%d"/>' % i)
+            f.close()
+            files.append(filename)
+        progress = []
+        summary = self.db.load_many(iter(files), '/db/test/', workers=2,
+                                    progress=lambda r, s: progress.append(r))
+        self.assertEqual(5, len(summary.loaded))
+        self.assertEqual([], summary.failed)
+        self.assertEqual(5, len(progress))
+        self.assertEqual(5 * len('<doc n="0"/>'), summary.bytes)
+        paths = sorted([args[1] for args, kwargs in self.db.server.parse.call_args_list])
+        self.assertEqual(['/db/test/doc%d.xml' % i for i in range(5)], paths)
+
+    def test_load_many_errors(self):
+        calls = []
+        def parse(xml, path, overwrite):
+            calls.append(path)
+            if path.endswith('retry.xml') and calls.count(path) == 1:
+                raise socket.error(104, 'Connection reset by peer')
+            if path.endswith('invalid.xml'):
+                raise xmlrpclib.Fault(0, 'not well-formed')
+            return True
+        self.db.server.parse.side_effect = parse
+        docs = [('retry.xml', '<doc/>'), ('invalid.xml', '<doc'),
+                os.path.join(self.tmpdir, 'missing.xml')]
+        summary = self.db.load_many(docs, '/db/test', retry_delay=0)
+        results = dict([(r.path, r) for r in summary.results])
+        # connection error retried
+        self.assert_(results['/db/test/retry.xml'].success)
+        self.assertEqual(2, results['/db/test/retry.xml'].attempts)
+        # eXist errors are not retried
+        self.assertFalse(results['/db/test/invalid.xml'].success)
+        self.assertEqual(1, results['/db/test/invalid.xml'].attempts)
+        self.assert_(isinstance(results['/db/test/invalid.xml'].error, db.ExistDBException))
+        # missing file is never uploaded
+        self.assert_(isinstance(results['/db/test/missing.xml'].error, IOError))
+        self.assertEqual(0, results['/db/test/missing.xml'].attempts)
+        self.assertEqual(2, len(summary.failed))
+
+
+class CollectionGenerationsTest(unittest.TestCase):
+    # uses a mock xml-rpc server proxy; no eXist server required
+
+    def setUp(self):
+        self.db = db.ExistDB('http://localhost:8080/exist')
+        self.db.server = Mock()
+        self.db.server.query.return_value = '<exist:result xmlns:exist="%s" hits="1" start="1" count="1">' \
+            % db.EXISTDB_NAMESPACE + '<exist:value>true</exist:value></exist:result>'
+        self.db.server.getCollectionDesc.return_value = {}
+        self.db.generations = db.CollectionGenerations()
+
+    def test_changes(self):
+        gen = self.db.generation
+        self.assertEqual(0, gen('/a/b'))
+        self.db.load('<doc/>', '/db/a/b/doc.xml')
+        self.assertEqual(1, gen('/a/b'))
+        self.assertEqual(1, gen('a'))
+        self.assertEqual(1, gen())
+        self.assertEqual(0, gen('c'))
+
+        self.db.moveDocument('/a/b', '/c', 'doc.xml')
+        self.assertEqual(2, gen('a/b'))
+        self.assertEqual(1, gen('c'))
+
+        # a document change in one subcollection does not affect another
+        self.db.removeDocument('/a/d/doc.xml')
+        self.assertEqual(2, gen('a/b'))
+        self.assertEqual(3, gen('a'))
+
+        # changes to a collection as a whole affect its subcollections
+        self.db.reindexCollection('/a')
+        self.assertEqual(3, gen('a/b'))
+        self.db.removeCollection('/a')
+        self.assertEqual(4, gen('a/b'))
+        self.assertEqual(1, gen('c'))
+
+    def test_shared_store(self):
+        store = {}
+        store_obj = Mock()
+        store_obj.get.side_effect = store.get
+        store_obj.set.side_effect = store.__setitem__
+        self.db.generations = db.CollectionGenerations(store=store_obj)
+        other = db.CollectionGenerations(store=store_obj)
+        self.db.load('<doc/>', '/a/doc.xml')
+        # changes made through another tracker are visible via the store
+        self.assertEqual(1, other.generation('a'))
+        other.changed('/a/doc2.xml')
+        self.assertEqual(2, self.db.generation('a'))
+
+
+class ThreadingXmlRpcServer(ThreadingMixIn, SimpleXMLRPCServer):
+    daemon_threads = True
+
+class XmlRpcRequestHandler(SimpleXMLRPCRequestHandler):
+    rpc_paths = ('/xmlrpc',)
+    protocol_version = 'HTTP/1.1'
+    connections = 0
+
+    def setup(self):
+        self.__class__.connections += 1
+        SimpleXMLRPCRequestHandler.setup(self)
+
+class ClosingXmlRpcRequestHandler(XmlRpcRequestHandler):
+    # close the connection after each request without notifying the client,
+    # like a server closing an idle kept-alive connection
+    def handle(self):
+        self.handle_one_request()
+
+class TimeoutTransportTest(unittest.TestCase):
+    # run against a local xml-rpc server instead of eXist
+
+    def start_server(self, handler):
+        handler.connections = 0
+        self.server = ThreadingXmlRpcServer(('localhost', 0), handler, logRequests=False)
+        self.server.register_function(lambda result_id: 3, 'getHits')
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.setDaemon(True)
+        thread.start()
+        return 'http://localhost:%d' % self.server.server_address[1]
+
+    def tearDown(self):
+        # close client connections so the server threads exit
+        for pool in connection._connection_pools.values():
+            pool.clear()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_keep_alive(self):
+        url = self.start_server(XmlRpcRequestHandler)
+        self.assertEqual(3, db.ExistDB(url).getHits(1))
+        # a separate instance for the same server reuses the connection
+        self.assertEqual(3, db.ExistDB(url).getHits(1))
+        self.assertEqual(1, XmlRpcRequestHandler.connections)
+
+    def test_stale_connection(self):
+        url = self.start_server(ClosingXmlRpcRequestHandler)
+        exist = db.ExistDB(url)
+        self.assertEqual(3, exist.getHits(1))
+        # connection closed by the server is retried on a new connection
+        self.assertEqual(3, exist.getHits(1))
+        self.assertEqual(2, ClosingXmlRpcRequestHandler.connections)
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+from lxml import etree
+import unittest
+
+from eulcore.existdb.indexconfig import IndexConfig, XCONF_NS
+from eulcore.existdb.query import QuerySet, lookup_usage
+from test_existdb.test_query import QueryTestModel
+from testcore import main
+
+class IndexConfigTest(unittest.TestCase):
+
+    def setUp(self):
+        lookup_usage.clear()
+        self.config = IndexConfig()
+
+    def tearDown(self):
+        lookup_usage.clear()
+
+    def test_lookups(self):
+        self.config.add_model(QueryTestModel, ['name__fulltext_terms', 'wnn__gt',
+            'or_field', 'nsfield__startswith', 'sub__subname', 'substring',
+            'last_modified__gt'])
+        self.assertEqual([
+            ('lucene', 'name'),
+            ('range', '@id', 'xs:string'),
+            ('range', 'description', 'xs:string'),
+            ('range', 'ex:field', 'xs:string'),
+            ('range', 'name', 'xs:string'),
+            ('range', 'subname', 'xs:string'),
+            ('range', 'wacky_node_name', 'xs:integer'),
+            ], self.config.definitions())
+        self.assertEqual('http://example.com/', self.config.namespaces['ex'])
+
+    def test_range_types(self):
+        # one range index per qname; a specific type wins over xs:string
+        self.config.add_lookup('wacky_node_name', 'startswith')
+        self.config.add_lookup('wacky_node_name', 'gt', 'xs:integer')
+        self.config.add_lookup('wacky_node_name', 'exact')
+        self.config.add_lookup('wacky_node_name', 'lt', 'xs:date')
+        self.assertEqual([('range', 'wacky_node_name', 'xs:integer')],
+                         self.config.definitions())
+
+        # contains and in lookups don't use range indexes
+        config = IndexConfig()
+        config.add_model(QueryTestModel, ['name__contains', 'id__in'])
+        self.assertEqual([], config.definitions())
+
+    def test_all_fields(self):
+        # no lookups: range indexes for all simple fields
+        self.config.add_model(QueryTestModel)
+        self.assert_(('range', 'name', 'xs:string') in self.config.definitions())
+        self.assert_(('range', 'wacky_node_name', 'xs:integer') in self.config.definitions())
+        self.assertFalse(self.config.lucene)
+
+    def test_recorded_lookups(self):
+        # not recorded by default
+        QuerySet(model=QueryTestModel).filter(name__fulltext_terms='foo')
+        self.assertEqual({}, lookup_usage.lookups(QueryTestModel))
+
+        lookup_usage.enabled = True
+        try:
+            QuerySet(model=QueryTestModel).filter(description__fulltext_terms='foo').order_by('wnn')
+        finally:
+            lookup_usage.enabled = False
+        self.config.add_model(QueryTestModel)
+        self.assertEqual([('lucene', 'description'), ('range', 'wacky_node_name', 'xs:integer')],
+                         self.config.definitions())
+
+    def test_to_xml(self):
+        self.config.add_model(QueryTestModel, ['name__fulltext_terms', 'nsfield'])
+        doc = etree.fromstring(self.config.to_xml())
+        ns = {'x': XCONF_NS}
+        self.assertEqual('collection', etree.QName(doc).localname)
+        self.assertEqual(['name'], doc.xpath('x:index/x:lucene/x:text/@qname', namespaces=ns))
+        self.assertEqual(['ex:field'], doc.xpath('x:index/x:create/@qname', namespaces=ns))
+        self.assertEqual('http://example.com/', doc.xpath('x:index', namespaces=ns)[0].nsmap['ex'])
+
+        # generated configuration can be read back
+        config = IndexConfig.from_xml(self.config.to_xml())
+        self.assertEqual(self.config.definitions(), config.definitions())
+
+    def test_diff(self):
+        current = '''<collection xmlns="http://exist-db.org/collection-config/1.0">
+            <index>
+                <lucene><text qname="description"/></lucene>
+                <create qname="name" type="xs:string"/>
+                <create path="//root/@id" type="xs:string"/>
+            </index>
+        </collection>'''
+        self.config.add_model(QueryTestModel, ['name__fulltext_terms', 'name'])
+        missing, extra = self.config.diff(current)
+        self.assertEqual([('lucene', 'name')], missing)
+        self.assertEqual([('lucene', 'description'), ('range', '//root/@id', 'xs:string')], extra)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+from mock import Mock
+import unittest
+import xmlrpclib
+
+from eulcore.existdb import db, instrumentation
+from eulcore.existdb.exceptions import ExistDBException
+from testcore import main
+
+class InstrumentationTest(unittest.TestCase):
+    # uses a mock xml-rpc server proxy; no eXist server required
+
+    def setUp(self):
+        self.db = db.ExistDB('http://localhost:8080/exist')
+        self.db.server = Mock()
+        self.collector = instrumentation.RingBufferCollector(max_size=3)
+        instrumentation.connect(self.collector)
+
+    def tearDown(self):
+        instrumentation.disconnect(self.collector)
+
+    def test_query_events(self):
+        self.db.server.query.return_value = '<exist:result xmlns:exist="%s" hits="12" start="1" count="0"/>' \
+            % db.EXISTDB_NAMESPACE
+        self.db.server.executeQuery.return_value = 3
+        self.db.server.querySummary.return_value = {'queryTime': 42, 'hits': 12}
+        self.db.server.retrieve.return_value = xmlrpclib.Binary('<a/>')
+
+        self.db.query('//a')
+        self.db.executeQuery('//a')
+        self.db.querySummary(3)
+        self.db.retrieve(3, 0)
+        events = self.collector.events()
+        # ring buffer keeps only the most recent events
+        self.assertEqual(['executeQuery', 'querySummary', 'retrieve'],
+                         [e.method for e in events])
+        execute, summary, retrieve = events
+        self.assertEqual('//a', execute.xquery)
+        self.assertEqual(3, execute.result_id)
+        self.assertEqual(42, summary.query_time)
+        self.assertEqual(12, summary.hits)
+        self.assertEqual(4, retrieve.bytes)
+        self.assert_(retrieve.elapsed >= 0)
+        self.assertEqual('http://localhost:8080/exist', retrieve.server_url)
+
+        self.collector.clear()
+        self.db.query('//a')
+        event = self.collector.events()[0]
+        self.assertEqual(12, event.hits)
+        self.assertEqual(len(self.db.server.query.return_value), event.bytes)
+
+    def test_errors(self):
+        self.db.server.getHits.side_effect = xmlrpclib.Fault(0, 'bad result id')
+        broken = Mock(side_effect=Exception)
+        instrumentation.connect(broken)
+        try:
+            self.assertRaises(ExistDBException, self.db.getHits, 5)
+        finally:
+            instrumentation.disconnect(broken)
+        event = self.collector.events()[0]
+        self.assert_(isinstance(event.error, xmlrpclib.Fault))
+        self.assertEqual(5, event.result_id)
+
+    def test_slowest(self):
+        for elapsed in (0.2, 0.5, 0.1):
+            event = instrumentation.QueryEvent('query')
+            event.elapsed = elapsed
+            self.collector(event)
+        self.assertEqual([0.5, 0.2], [e.elapsed for e in self.collector.slowest(2)])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+from mock import Mock
+import unittest
+
+from eulcore import xmlmap
+from eulcore.existdb.db import ExistDB, QueryResult
+from eulcore.existdb.parallel import AsyncExistDB, AsyncQuerySet, MultiQuerySet, \
+    WorkerPool, gather
+from test_existdb.test_query import QueryTestModel
+from testcore import main
+
+class AsyncExistDBTest(unittest.TestCase):
+    # uses a mock db; no eXist server required
+
+    def setUp(self):
+        self.db = Mock(ExistDB)
+        self.db.executeQuery.return_value = 1
+        self.db.getHits.return_value = 3
+        self.db.retrieve.side_effect = lambda result_id, i, **kwargs: \
+            Mock(data='<root id="%d"/>' % i)
+        self.pool = WorkerPool(workers=2)
+
+    def test_async_db(self):
+        adb = AsyncExistDB(self.db, pool=self.pool)
+        self.assertEqual(3, adb.getHits(1).get(1))
+        self.db.getHits.assert_called_with(1)
+
+    def test_async_queryset(self):
+        qs = AsyncQuerySet(using=self.db, xpath='/root', model=QueryTestModel, pool=self.pool)
+        # pool is preserved on copies
+        fqs = qs.filter(id='1')
+        self.assert_(isinstance(fqs, AsyncQuerySet))
+        self.assert_(fqs.pool is self.pool)
+
+        count, items = gather(fqs.count_async(), fqs.fetch_async(1))
+        self.assertEqual(3, count)
+        self.assertEqual(['1', '2'], [i.id for i in items])
+        # query only executed once
+        self.assertEqual(1, self.db.executeQuery.call_count)
+
+
+class MultiQuerySetTest(unittest.TestCase):
+    # uses mock dbs; no eXist server required
+
+    def setUp(self):
+        self.pool = WorkerPool(workers=2)
+        # scores for results in each source, highest first
+        self.dbs = [self._mock_db(['9', '5', '2']), self._mock_db(['8', '7', '6', '1'])]
+        self.qs = MultiQuerySet([(self.dbs[0], '/coll/a'), (self.dbs[1], '/coll/b')],
+                                model=QueryTestModel, pool=self.pool, chunk_size=2)
+
+    def _mock_db(self, scores, hits=None):
+        # hits: optional hit count to report, when not the number of scores
+        db = Mock(ExistDB)
+        def query(xquery, start=1, how_many=10, **kwargs):
+            end = min(start + how_many, len(scores) + 1)
+            item = '<root id="%s"/>'
+            if 'sort_value' in xquery:
+                # sort value is returned after the result node in a wrapper element
+                item = '<root>%s<r_sort_value>%%s</r_sort_value></root>' % item
+            items = ''.join([item.replace('%s', scores[i - 1]) for i in range(start, end)])
+            xml = '<exist:result xmlns:exist="http://exist.sourceforge.net/NS/exist" ' + \
+                  'start="%d" count="%d" hits="%d">%s</exist:result>' % \
+                  (start, end - start, hits or len(scores), items)
+            return xmlmap.load_xmlobject_from_string(xml, QueryResult)
+        db.query.side_effect = query
+        return db
+
+    def test_count(self):
+        self.assertEqual(7, self.qs.count())
+        self.assertEqual([3, 4], self.qs.counts())
+        self.assertEqual(7, len(self.qs))
+        # count and first chunk retrieved with a single request per source
+        for db in self.dbs:
+            self.assertEqual(1, db.query.call_count)
+            args, kwargs = db.query.call_args
+            self.assertEqual(2, kwargs['how_many'])
+        self.assert_('collection("/db/coll/a")' in self.dbs[0].query.call_args[0][0])
+        self.assert_('collection("/db/coll/b")' in self.dbs[1].query.call_args[0][0])
+
+    def test_merge(self):
+        qs = self.qs.filter(fulltext_terms='foo').order_by('-fulltext_score')
+        self.assert_(isinstance(qs, MultiQuerySet))
+        self.assertEqual(['9', '8', '7', '6', '5', '2', '1'], [r.id for r in qs])
+        self.assertEqual(['6', '5'], [r.id for r in qs[3:5]])
+        self.assertEqual('9', qs[0].id)
+        self.assertRaises(IndexError, qs.__getitem__, 7)
+        args, kwargs = self.dbs[0].query.call_args
+        self.assert_('ft:query' in args[0])
+        self.assert_('order by' in args[0])
+
+    def test_slice(self):
+        qs = self.qs.filter(fulltext_terms='foo').order_by('-fulltext_score')
+        self.assertEqual(['9', '8', '7'], [r.id for r in qs[:3]])
+        # merged from the first chunk retrieved from each source
+        self.assertEqual(1, self.dbs[0].query.call_count)
+        self.assertEqual(1, self.dbs[1].query.call_count)
+        # next result requires more from the second source only
+        self.assertEqual('6', qs[3].id)
+        self.assertEqual(1, self.dbs[0].query.call_count)
+        self.assertEqual(2, self.dbs[1].query.call_count)
+        args, kwargs = self.dbs[1].query.call_args
+        self.assertEqual(3, kwargs['start'])
+
+    def test_fewer_results(self):
+        # documents removed after the first request: a source reports 5
+        # hits, but only has 2 results
+        self.dbs[0] = self._mock_db(['9', '5'], hits=5)
+        for order in (None, '-fulltext_score'):
+            qs = MultiQuerySet([(self.dbs[0], '/coll/a'), (self.dbs[1], '/coll/b')],
+                               model=QueryTestModel, pool=self.pool, chunk_size=2)
+            if order:
+                qs = qs.filter(fulltext_terms='foo').order_by(order)
+            self.assertEqual(9, qs.count())
+            ids = [r.id for r in qs]
+            self.assertEqual(['1', '5', '6', '7', '8', '9'], sorted(ids))
+            # count is corrected to match the results returned
+            self.assertEqual(6, qs.count())
+            self.assertEqual([2, 4], qs.counts())
+            self.assertRaises(IndexError, qs.__getitem__, 6)
+
+    def test_unsorted(self):
+        self.assertEqual(['9', '5', '2', '8', '7', '6', '1'], [r.id for r in self.qs])
+        self.assertEqual(['2', '8'], [r.id for r in self.qs[2:4]])
+
+    def test_sorted_requires_model(self):
+        qs = MultiQuerySet([(self.dbs[0], '/coll/a')], pool=self.pool).order_by('name')
+        self.assertRaises(ValueError, qs.count)
+
+
+if __name__ == '__main__':
+    main()
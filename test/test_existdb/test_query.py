@@ -1,10 +1,13 @@
 #!/usr/bin/env python
 
-from datetime import datetime
+from datetime import date, datetime
+from decimal import Decimal
+from mock import Mock
 import unittest
 
 from eulcore import xmlmap
-from eulcore.existdb.db import ExistDB
+from eulcore.existdb.cache import LRUCache, LRUCacheBackend
+from eulcore.existdb.db import ExistDB, QueryResult, result_handles
 from eulcore.existdb.exceptions import DoesNotExist
 from eulcore.existdb.exceptions import ReturnedMultiple
 from eulcore.existdb.query import QuerySet
@@ -171,6 +174,15 @@ class ExistQueryTest(unittest.TestCase):
                          "should get 1 match for filter on name starts with 'o' (got %s)" % fqs.count())
         self.assertEqual(NUM_FIXTURES, self.qs.count(), "main queryset remains unchanged by filter")
 
+    def test_filter_range(self):
+        fqs = self.qs.filter(wnn__gt=40)
+        self.assertEqual(1, fqs.count(),
+            "should get 1 match for filter on wnn > 40 (got %s)" % fqs.count())
+        self.assertEqual(0, self.qs.filter(wnn__lt='42').count())
+        self.assertEqual(1, self.qs.filter(wnn__range=(42, 50)).count())
+        self.assertEqual(NUM_FIXTURES, self.qs.filter(
+            last_modified__gte=datetime(2000, 1, 1)).count())
+
     def test_filter_subobject_field(self):
         fqs = self.qs.filter(sub__subname="la")
         self.assertEqual(1, fqs.count(),
@@ -536,6 +548,266 @@ class ExistQueryTest__FullText(unittest.TestCase):
 
 
 
+class MockDBTestCase(unittest.TestCase):
+    # base class for QuerySet tests with a mock db; no eXist server access required
+
+    def setUp(self):
+        self.db = Mock(ExistDB)
+        self.db.executeQuery.return_value = 1
+        self.db.getHits.return_value = self.hits = 5
+        self.db.query.side_effect = self._query_result
+        self.qs = QuerySet(using=self.db, xpath='/root', collection=COLLECTION,
+                           model=QueryTestModel, chunk_size=3)
+
+    def _query_result(self, xquery, start=1, how_many=10, **kwargs):
+        end = min(start + how_many, self.hits + 1)
+        items = ''.join('<root id="%d"/>' % i for i in range(start, end))
+        xml = '<exist:result xmlns:exist="http://exist.sourceforge.net/NS/exist" ' + \
+              'start="%d" count="%d" hits="%d">%s</exist:result>' % \
+              (start, end - start, self.hits, items)
+        return xmlmap.load_xmlobject_from_string(xml, QueryResult)
+
+class QuerySetChunkTest(MockDBTestCase):
+    # chunked retrieval of results
+
+    def test_iter(self):
+        ids = [obj.id for obj in self.qs]
+        self.assertEqual(['1', '2', '3', '4', '5'], ids)
+        # two chunked queries instead of five retrieve calls
+        self.assertEqual(2, self.db.query.call_count)
+        self.assertEqual(0, self.db.retrieve.call_count)
+        args, kwargs = self.db.query.call_args
+        self.assertEqual(4, kwargs['start'])
+        self.assertEqual(2, kwargs['how_many'])
+
+        # chunk size is preserved on copies; cached results are not re-fetched
+        self.assertEqual(3, self.qs.all().chunk_size)
+        list(self.qs)
+        self.assertEqual(2, self.db.query.call_count)
+
+    def test_slice_iter(self):
+        ids = [obj.id for obj in self.qs[1:3]]
+        self.assertEqual(['2', '3'], ids)
+        args, kwargs = self.db.query.call_args
+        self.assertEqual(2, kwargs['start'])
+        self.assertEqual(2, kwargs['how_many'])
+
+    def test_no_chunking(self):
+        self.qs.chunk_size = None
+        self.db.retrieve.return_value = Mock(data='<root id="x"/>')
+        self.assertEqual(['x'] * 5, [obj.id for obj in self.qs])
+        self.assertEqual(0, self.db.query.call_count)
+        self.assertEqual(5, self.db.retrieve.call_count)
+
+class QuerySetResultHandleTest(MockDBTestCase):
+    # server-side results shared between querysets
+
+    def test_shared_result_handle(self):
+        # identical querysets share a single server-side result
+        result_handles.clear()
+        qs = self.qs.filter(name='one')
+        other = self.qs.filter(name='one')
+        self.assertEqual(qs.result_id, other.result_id)
+        self.assertEqual(1, self.db.executeQuery.call_count)
+        del qs, other
+        self.assertEqual(0, self.db.releaseQueryResult.call_count)
+        result_handles.clear()
+        self.db.releaseQueryResult.assert_called_once_with(1)
+
+class QuerySetGetTest(MockDBTestCase):
+    # single-request get
+
+    def test_get(self):
+        self.hits = 1
+        obj = self.qs.get(id='1')
+        self.assertEqual('1', obj.id)
+        # one query returns hit count and first results; no result set is used
+        self.assertEqual(1, self.db.query.call_count)
+        args, kwargs = self.db.query.call_args
+        self.assertEqual(1, kwargs['start'])
+        self.assertEqual(2, kwargs['how_many'])
+        self.assertEqual(0, self.db.executeQuery.call_count)
+        self.assertEqual(0, self.db.getHits.call_count)
+        self.assertEqual(0, self.db.retrieve.call_count)
+
+        self.hits = 0
+        self.assertRaises(DoesNotExist, self.qs.get, id='1')
+        self.hits = 5
+        self.assertRaises(ReturnedMultiple, self.qs.get, id='1')
+
+class QuerySetSummaryTest(MockDBTestCase):
+    # query summary information
+
+    def test_summary(self):
+        result_handles.clear()
+        self.db.querySummary.return_value = {'queryTime': 12, 'hits': 5,
+            'documents': [[1, 'a.xml', 3], [2, 'b.xml', 2]], 'doctypes': []}
+        qs = self.qs.filter(name='one')
+        self.assertEqual(12, qs.queryTime())
+        self.assertEqual({'a.xml': 3, 'b.xml': 2}, qs.summary.document_hits())
+        # summary and hit count are retrieved once per server result
+        other = self.qs.filter(name='one')
+        self.assertEqual(5, other.summary.hits)
+        self.assertEqual(5, other.count())
+        self.assertEqual(1, self.db.querySummary.call_count)
+        self.assertEqual(0, self.db.getHits.call_count)
+        result_handles.clear()
+
+class QuerySetCacheBackendTest(MockDBTestCase):
+    # caching results across querysets
+
+    def test_cache_backend(self):
+        backend = LRUCacheBackend()
+        qs = self.qs.all()
+        qs.cache_backend = backend
+        self.assertEqual(['1', '2', '3', '4', '5'], [obj.id for obj in qs.filter(name='a')])
+        self.assertEqual(2, self.db.query.call_count)
+
+        # identical query in another queryset does not contact eXist
+        self.db.reset_mock()
+        other = QuerySet(using=self.db, xpath='/root', collection=COLLECTION,
+                         model=QueryTestModel, chunk_size=3, cache_backend=backend)
+        self.assertEqual(['1', '2', '3', '4', '5'], [obj.id for obj in other.filter(name='a')])
+        self.assertEqual(0, self.db.query.call_count)
+        self.assertEqual(0, self.db.executeQuery.call_count)
+        self.assertEqual(0, self.db.getHits.call_count)
+
+        # loading a document in the collection invalidates cached results
+        db = ExistDB('http://localhost:8080/exist')
+        db.server = Mock()
+        db.load('<root/>', COLLECTION + '/new.xml')
+        list(other.filter(name='a'))
+        self.assertEqual(2, self.db.query.call_count)
+
+class QuerySetParameterizeTest(MockDBTestCase):
+    # filter values passed as external variables
+
+    def test_parameterize(self):
+        result_handles.clear()
+        qs = QuerySet(using=self.db, xpath='/root', collection=COLLECTION,
+                      model=QueryTestModel, chunk_size=3, parameterize=True)
+        items = list(qs.filter(name='one'))
+        args, kwargs = self.db.query.call_args
+        self.assert_('declare variable $p1 external;' in args[0])
+        self.assertEqual({'p1': 'one'}, kwargs['variables'])
+
+        # server results are not shared by queries with different values
+        self.db.executeQuery.return_value = 1
+        qs.filter(name='one').result_id
+        qs.filter(name='two').result_id
+        self.assertEqual(2, self.db.executeQuery.call_count)
+        args, kwargs = self.db.executeQuery.call_args
+        self.assertEqual({'p1': 'two'}, kwargs['variables'])
+        result_handles.clear()
+
+class QuerySetRangeFilterTest(MockDBTestCase):
+    # typed range filters
+
+    def test_filter_range(self):
+        # field type determines comparison type for string values
+        qs = self.qs.filter(wnn__gt='5', name__lte='m', id__range=(1, 9))
+        query = qs.query.getQuery()
+        self.assert_('[wacky_node_name > xs:integer("5")]' in query)
+        self.assert_('[name <= "m"]' in query)
+        self.assert_('[@id >= xs:integer("1") and @id <= xs:integer("9")]' in query)
+
+class QuerySetExplainTest(MockDBTestCase):
+    # query tracing
+
+    def test_explain(self):
+        trace = '<prof:profile xmlns:prof="http://exist-db.org/xquery/profiling">%s</prof:profile>'
+        fulltext = '<prof:index type="lucene" source="ft:query" optimization="2" calls="1" elapsed="3"/>'
+        scan = '<prof:index type="range" source="GeneralComparison" optimization="0" calls="1" elapsed="9"/>'
+        xml = '<exist:result xmlns:exist="http://exist.sourceforge.net/NS/exist" ' + \
+              'hits="1" start="1" count="1"><explain hits="2" elapsed="15">' + \
+              '<query>%s</query>' % (trace % (fulltext + scan)) + \
+              '<filter hits="5">%s</filter>' % (trace % fulltext) + \
+              '<filter hits="3">%s</filter>' % (trace % scan) + \
+              '</explain></exist:result>'
+        self.db.query.side_effect = None
+        self.db.query.return_value = xmlmap.load_xmlobject_from_string(xml, QueryResult)
+        plan = self.qs.filter(name__fulltext_terms='one', wnn__gt=5).explain()
+        args, kwargs = self.db.query.call_args
+        self.assert_('system:trace()' in args[0])
+        self.assertEqual(2, plan.hits)
+        self.assertEqual(15, plan.elapsed)
+        self.assertEqual(2, len(plan.indexes))
+        self.assertEqual(2, len(plan.filters))
+        indexed, = plan.indexed_filters()
+        scanned, = plan.scanned_filters()
+        self.assert_(indexed.xquery.startswith('ft:query(name'))
+        self.assertEqual(['lucene'], indexed.index_types)
+        self.assertEqual(5, indexed.hits)
+        self.assert_(scanned.xquery.startswith('wacky_node_name >'))
+        self.assert_('scan' in plan.report())
+
+class QuerySetCursorTest(MockDBTestCase):
+    # cursor-based paging
+
+    def test_cursor_page(self):
+        self.assertRaises(ValueError, self.qs.after)
+        def query(xquery, start=1, how_many=10, **kwargs):
+            # additional return fields follow the result node in a wrapper element
+            items = ''.join(['<root><root id="%(i)d"><name>n%(i)d</name></root>' % {'i': i}
+                             + '<r_cursor_value>n%(i)d</r_cursor_value>' % {'i': i}
+                             + '<r_cursor_id>doc%d.xml#1</r_cursor_id></root>' % i
+                             for i in range(start, start + how_many)])
+            xml = '<exist:result xmlns:exist="http://exist.sourceforge.net/NS/exist" ' + \
+                  'start="%d" count="%d" hits="10">%s</exist:result>' % (start, how_many, items)
+            return xmlmap.load_xmlobject_from_string(xml, QueryResult)
+        self.db.query.side_effect = query
+
+        qs = self.qs.order_by('name')
+        items, cursor = qs.cursor_page(size=2)
+        self.assertEqual(['1', '2'], [i.id for i in items])
+        self.assertEqual(('n2', 'doc2.xml#1'), cursor)
+        self.assertEqual(1, self.db.query.call_count)
+        args, kwargs = self.db.query.call_args
+        self.assertEqual(3, kwargs['how_many'])
+        self.assert_('order by' in args[0])
+
+        items, next_cursor = qs.cursor_page(cursor, size=2)
+        args, kwargs = self.db.query.call_args
+        self.assert_('where (string($n/name) > "n2"' in args[0])
+
+class QuerySetFacetTest(MockDBTestCase):
+    # facet counts
+
+    def test_facet(self):
+        result_handles.clear()
+        xml = '<exist:result xmlns:exist="http://exist.sourceforge.net/NS/exist" hits="2" start="1" count="2">' + \
+              '<facet name="name"><value count="3">one</value><value count="1">two</value></facet>' + \
+              '<facet name="sub__subname"><value count="4">a</value></facet></exist:result>'
+        self.db.query.side_effect = None
+        self.db.query.return_value = xmlmap.load_xmlobject_from_string(xml, QueryResult)
+        qs = self.qs.filter(name='one')
+        qs.count()
+        facets = qs.facet('name', 'sub__subname', limit=5)
+        self.assertEqual([('one', 3), ('two', 1)], facets['name'])
+        self.assertEqual([('a', 4)], facets['sub__subname'])
+        args, kwargs = self.db.query.call_args
+        self.assert_('distinct-values($results/(sub/subname))' in args[0])
+        # cached with the result handle
+        other = self.qs.filter(name='one')
+        other.count()
+        self.assertEqual(facets, other.facet('name', 'sub__subname', limit=5))
+        self.assertEqual(1, self.db.query.call_count)
+        result_handles.clear()
+
+class QuerySetPrefetchTest(MockDBTestCase):
+    # prefetching node fields
+
+    def test_prefetch(self):
+        self.assertRaises(TypeError, self.qs.prefetch, 'name')
+        # no change to query when full results are returned
+        self.assertEqual(self.qs.query.getQuery(), self.qs.prefetch('sub').query.getQuery())
+
+        for qs in (self.qs.only('name').prefetch('sub__ssc'),
+                   self.qs.prefetch('sub__ssc').only('name')):
+            self.assert_('<field>{$n/sub/subsubclass}</field>' in qs.query.getQuery())
+            self.assert_('sub' in qs.return_type._fields)
+            self.assert_('ssc' in qs.return_type._fields['sub'].node_class._fields)
+
 class XqueryTest(unittest.TestCase):
 
     def test_defaults(self):
@@ -572,6 +844,124 @@ class XqueryTest(unittest.TestCase):
         xq.set_collection(None)
         self.assertEquals('/node()', xq.getQuery())
 
+    def test_cursor(self):
+        xq = Xquery(collection="mycoll")
+        xq.sort('@id')
+        xq.set_cursor()
+        query = xq.getQuery()
+        id_xpath = "concat(document-uri(root($n)), '#', util:node-id($n))"
+        self.assert_('order by $n/@id ascending, %s ascending' % id_xpath in query)
+        self.assert_('where' not in query)
+
+        xq.set_cursor(('abc', '/db/mycoll/a.xml#1'))
+        query = xq.getQuery()
+        self.assert_('where (string($n/@id) > "abc" or (string($n/@id) = "abc" and '
+                     + '%s > "/db/mycoll/a.xml#1"))' % id_xpath in query)
+
+        # descending sort and special fields
+        xq.sort('fulltext_score', ascending=False)
+        self.assert_('$fulltext_score < xs:double("abc")' in xq.getQuery())
+
+    def test_parameterize(self):
+        xq = Xquery(xpath='/el', namespaces={'ex': 'http://example.com/'}, parameterize=True)
+        xq.add_filter('.', 'contains', 'foo')
+        xq.add_filter('@id', 'in', ['a', 'b'])
+        xq.add_filter('.', 'highlight', 'bar')
+        query = xq.getQuery()
+        self.assert_(query.startswith("declare namespace ex='http://example.com/';\n" +
+            'declare variable $p1 external;\ndeclare variable $p2 external;\n' +
+            'declare variable $p3 external;\ndeclare variable $p4 external;\n'))
+        self.assert_('/el[contains(., $p1)][contains(($p2,$p3), @id)]' in query)
+        self.assert_('ft:query(., $p4)' in query)
+        self.assert_('foo' not in query)
+        self.assertEqual({'p1': 'foo', 'p2': 'a', 'p3': 'b', 'p4': 'bar'}, xq.getVariables())
+
+        # same query text for different values
+        other = Xquery(xpath='/el', namespaces={'ex': 'http://example.com/'}, parameterize=True)
+        other.add_filter('.', 'contains', 'baz')
+        other.add_filter('@id', 'in', ['c', 'd'])
+        other.add_filter('.', 'highlight', 'qux')
+        self.assertEqual(query, other.getQuery())
+        self.assertEqual('baz', other.getVariables()['p1'])
+
+        # copies keep variables; cursor values are also variables
+        xq = xq.getCopy()
+        xq.sort('@id')
+        xq.set_cursor(('abc', '/db/a.xml#1'))
+        query = xq.getQuery()
+        self.assert_('string($n/@id) > $cursor_value' in query)
+        self.assert_('declare variable $cursor_id external;' in query)
+        variables = xq.getVariables()
+        self.assertEqual('abc', variables['cursor_value'])
+        self.assertEqual('foo', variables['p1'])
+
+        # not parameterized by default
+        xq = Xquery()
+        xq.add_filter('.', 'contains', 'foo')
+        self.assert_('contains(., "foo")' in xq.getQuery())
+        self.assertEqual({}, xq.getVariables())
+
+    def test_parameterize_clear_filters(self):
+        xq = Xquery(xpath='/el', parameterize=True)
+        xq.add_filter('.', 'contains', 'foo')
+        xq.add_filter('@id', 'exact', 'a', mode='OR')
+        xq.add_filter('.', 'highlight', 'bar')
+        xq.clear_filters()
+        # variables used by the remaining filter and highlighting are kept
+        self.assertEqual({'p2': 'a', 'p3': 'bar'}, xq.getVariables())
+        query = xq.getQuery()
+        self.assert_('declare variable $p2 external;' in query)
+        self.assert_('declare variable $p1 external;' not in query)
+        # new variables don't reuse names of those still in use
+        xq.add_filter('.', 'contains', 'baz')
+        self.assertEqual({'p2': 'a', 'p3': 'bar', 'p4': 'baz'}, xq.getVariables())
+        self.assert_('[contains(., $p4)]' in xq.getQuery())
+
+    def test_explain_query(self):
+        xq = Xquery(xpath='/el', collection='mycoll', namespaces={'ex': 'http://example.com/'})
+        xq.add_filter('.', 'contains', 'foo')
+        xq.add_filter('@id', 'exact', 'a', mode='OR')
+        xq.sort('@id')
+        self.assertEqual(['contains(., "foo")', '@id = "a"'], xq.explain_filters())
+        query = xq.getExplainQuery()
+        self.assert_(query.startswith("declare namespace ex='http://example.com/';"))
+        self.assert_('system:enable-tracing(true())' in query)
+        self.assert_('system:enable-tracing(false())' in query)
+        # each filter is traced on its own
+        self.assert_('[contains(., "foo")])' in query)
+        self.assert_('$hits1' in query)
+        self.assert_('<filter hits="{$hits1}">{$trace1}</filter></explain>' in query)
+
+    def test_explain_query_parameterized_cursor(self):
+        xq = Xquery(xpath='/el', namespaces={'ex': 'http://example.com/'}, parameterize=True)
+        xq.add_filter('.', 'contains', 'foo')
+        xq.sort('@id')
+        xq.set_cursor(('abc', '/db/a.xml#1'))
+        variables = xq.getVariables()
+        for query in (xq.getExplainQuery(), xq.getFacetQuery({'name': 'name'})):
+            # every variable passed with the query is declared once, in the prolog
+            prolog, body = query.split('\nlet ', 1)
+            for name in variables:
+                self.assert_('declare variable $%s external;' % name in prolog)
+            self.assertEqual(1, query.count("declare namespace ex='http://example.com/';"))
+            self.assert_('declare' not in body)
+        self.assert_('[contains(., $p1)]' in xq.getExplainQuery())
+
+    def test_facet_query(self):
+        xq = Xquery(xpath='/el', collection='mycoll', namespaces={'ex': 'http://example.com/'})
+        xq.add_filter('.', 'contains', 'foo')
+        xq.sort('@id')
+        xq.set_limits(5, 10)
+        query = xq.getFacetQuery({'name': 'name'}, limit=3)
+        self.assert_(query.startswith("declare namespace ex='http://example.com/';\n"))
+        self.assert_('let $results := collection("/db/mycoll")/el[contains(., "foo")]\n' in query)
+        self.assert_('for $v in distinct-values($results/(name))' in query)
+        self.assert_('let $c := count($results[(name) = $v])' in query)
+        self.assert_('<facet name="name">{subsequence(' in query)
+        # sorting and limits are not applied to facets
+        self.assert_('order by $n' not in query)
+        self.assert_('subsequence(let' not in query)
+
     def test_sort(self):
         xq = Xquery(collection="mycoll")
         xq.xq_var = '$n'
@@ -636,6 +1026,44 @@ class XqueryTest(unittest.TestCase):
         self.assert_('let $document_name' in xq.getQuery())
         self.assert_('where contains(("a.xml","b.xml"), $document_name)' in xq.getQuery())
 
+    def test_filter_range(self):
+        xq = Xquery(xpath='/el')
+        xq.add_filter('year', 'gt', 1900)
+        xq.add_filter('@when', 'lte', date(2010, 3, 1))
+        xq.add_filter('score', 'range', (0.5, Decimal('1.5')))
+        self.assertEquals('/el[year > xs:integer("1900")][@when <= xs:date("2010-03-01")]'
+            + '[score >= xs:double("0.5") and score <= xs:decimal("1.5")]',
+            xq.getQuery())
+
+        # string values use the specified type, if any
+        xq = Xquery(xpath='/el')
+        xq.add_filter('year', 'gte', '1900', xsd_type='xs:integer')
+        xq.add_filter('@when', 'lt', date(2010, 3, 1), xsd_type='xs:dateTime')
+        xq.add_filter('name', 'lt', 'm')
+        self.assertEquals('/el[year >= xs:integer("1900")]'
+            + '[@when < xs:dateTime("2010-03-01T00:00:00")][name < "m"]', xq.getQuery())
+
+        # date-only strings compared with a dateTime start at midnight
+        xq = Xquery(xpath='/el')
+        xq.add_filter('@when', 'gte', '2010-01-01', xsd_type='xs:dateTime')
+        xq.add_filter('@when', 'lt', '2010-02-01Z', xsd_type='xs:dateTime')
+        xq.add_filter('@when', 'gt', '2010-01-01T12:30:00', xsd_type='xs:dateTime')
+        self.assertEquals('/el[@when >= xs:dateTime("2010-01-01T00:00:00")]'
+            + '[@when < xs:dateTime("2010-02-01T00:00:00Z")]'
+            + '[@when > xs:dateTime("2010-01-01T12:30:00")]', xq.getQuery())
+
+        # special fields
+        xq = Xquery(xpath='/el')
+        xq.add_filter('last_modified', 'gt', '2010-01-01T00:00:00')
+        self.assert_('where $last_modified > xs:dateTime("2010-01-01T00:00:00")'
+                     in xq.getQuery())
+
+        # parameterized
+        xq = Xquery(xpath='/el', parameterize=True)
+        xq.add_filter('year', 'range', (1900, 2000))
+        self.assert_('/el[year >= xs:integer($p1) and year <= xs:integer($p2)]' in xq.getQuery())
+        self.assertEqual({'p1': '1900', 'p2': '2000'}, xq.getVariables())
+
     def test_or_filters(self):
         xq = Xquery(xpath='/el')
         xq.add_filter('.', 'contains', 'dog', mode='OR')
@@ -768,6 +1196,26 @@ class XqueryTest(unittest.TestCase):
         self.assertEqual('fn:lower-case($n/name|$n/title)',
                 xq.prep_xpath('fn:lower-case(name|title)'))
 
+    def test_query_cache(self):
+        cache = LRUCache()
+        xq = Xquery(xpath='/el')
+        xq.query_cache = cache
+        xq.return_only({'myid':'@id'})
+        query = xq.getQuery()
+        self.assertEqual(1, cache.misses)
+        # identically configured query is generated once
+        xq2 = xq.getCopy()
+        xq2.query_cache = cache
+        xq2.return_xpaths = []
+        self.assertEqual(query, xq2.getQuery())
+        self.assertEqual(1, cache.hits)
+        # return xpaths are restored from the cache
+        self.assertEqual(xq.get_return_xpaths(), xq2.get_return_xpaths())
+        # any change in configuration generates a new query
+        xq2.add_filter('.', 'contains', 'dog')
+        self.assertNotEqual(query, xq2.getQuery())
+        self.assertEqual(2, cache.misses)
+
     def test_namespaces(self):
         xq = Xquery(xpath='/foo:el', namespaces={'foo': 'urn:foo#'})
         ns_declaration = '''declare namespace foo='urn:foo#';'''
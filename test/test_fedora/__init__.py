@@ -1,3 +1,5 @@
 from test_fedora.test_server import *
 from test_fedora.test_api import *
 from test_fedora.test_models import *
+from test_fedora.test_cache import *
+from test_fedora.test_util import *
@@ -4,7 +4,8 @@ from test_fedora.base import FedoraTestCase, load_fixture_data, FEDORA_ROOT_NONS
                 FEDORA_USER, FEDORA_PASSWORD, FEDORA_PIDSPACE
 from eulcore.fedora.api import REST_API, API_A_LITE, API_M_LITE, API_M
 from eulcore.fedora.rdfns import model as modelns
-from eulcore.fedora.util import AuthorizingServerConnection, fedoratime_to_datetime, datetime_to_fedoratime
+from eulcore.fedora.util import AuthorizingServerConnection, fedoratime_to_datetime, datetime_to_fedoratime, \
+    ResponseStream
 from eulcore.fedora.xml import FEDORA_MANAGE_NS, FEDORA_ACCESS_NS
 from testcore import main
 
@@ -95,6 +96,25 @@ Hey, nonny-nonny."""
             asOfDateTime=created + ONE_SEC)
         self.assertEqual(dc, postcreate_dc)    # unchanged within its first sec
 
+        # streaming
+        stream, url = self.rest_api.getDatastreamDissemination(self.pid, "DC",
+            stream=True, chunk_size=100)
+        self.assert_(isinstance(stream, ResponseStream))
+        self.assertEqual(len(dc), stream.size)
+        chunks = list(stream)
+        self.assert_(len(chunks) > 1)
+        self.assert_(max([len(chunk) for chunk in chunks]) <= 100)
+        self.assertEqual(dc, ''.join(chunks))
+        self.assert_(stream.closed)
+        self.assertRaises(ValueError, stream.read)
+
+        # closing a partially-read stream doesn't interfere with the next request
+        stream, url = self.rest_api.getDatastreamDissemination(self.pid, "DC", stream=True)
+        self.assertEqual(dc[:10], stream.read(10))
+        stream.close()
+        again, url = self.rest_api.getDatastreamDissemination(self.pid, "DC")
+        self.assertEqual(dc, again)
+
         # bogus datastream
         self.assertRaises(Exception, self.rest_api.getDatastreamDissemination,
             self.pid, "BOGUS")
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+from datetime import datetime
+import shutil
+import tempfile
+import unittest
+
+from dateutil.tz import tzutc
+
+from eulcore.fedora.cache import DatastreamCache
+from eulcore.fedora.xml import DatastreamProfile
+from testcore import main
+
+class DatastreamCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='eulcore-fedora-cache-')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_version(self):
+        info = DatastreamProfile()
+        info.version_id = 'DC.1'
+        info.created = datetime(2010, 11, 2, 14, 3, 0, 0, tzutc())
+        info.checksum_type = 'DISABLED'
+        info.checksum = 'none'
+        self.assertEqual('DC.1@2010-11-02T14:03:00.000Z', DatastreamCache.version(info))
+        info.checksum_type = 'MD5'
+        info.checksum = 'd745e8a99847777dabf0d8c6e11fca84'
+        self.assertEqual('MD5:d745e8a99847777dabf0d8c6e11fca84', DatastreamCache.version(info))
+
+    def test_memory(self):
+        cache = DatastreamCache(max_items=2, max_memory_size=10, max_content_size=20)
+        self.assertEqual(None, cache.get('pid:1', 'DC', 'v1'))
+        cache.set('pid:1', 'DC', 'v1', 'content', 'http://fedora/dc')
+        self.assertEqual(('content', 'http://fedora/dc'), cache.get('pid:1', 'DC', 'v1'))
+        # other versions, datastreams and objects are not matched
+        self.assertEqual(None, cache.get('pid:1', 'DC', 'v2'))
+        self.assertEqual(None, cache.get('pid:1', 'TEXT', 'v1'))
+        self.assertEqual(None, cache.get('pid:2', 'DC', 'v1'))
+
+        # content too large for memory, with no disk cache
+        cache.set('pid:1', 'TEXT', 'v1', 'x' * 15, 'http://fedora/text')
+        self.assertEqual(None, cache.get('pid:1', 'TEXT', 'v1'))
+
+        self.assert_(cache.cacheable(None))
+        self.assert_(cache.cacheable(20))
+        self.failIf(cache.cacheable(21))
+
+        cache.clear()
+        self.assertEqual(None, cache.get('pid:1', 'DC', 'v1'))
+
+    def test_disk(self):
+        cache = DatastreamCache(directory=self.tmpdir, max_memory_size=10,
+                                max_content_size=20)
+        cache.set('pid:1', 'TEXT', 'v1', 'x' * 15, 'http://fedora/text')
+        cache.set('pid:1', 'BIG', 'v1', 'x' * 25, 'http://fedora/big')
+        self.assertEqual(('x' * 15, 'http://fedora/text'), cache.get('pid:1', 'TEXT', 'v1'))
+        self.assertEqual(None, cache.get('pid:1', 'BIG', 'v1'))
+        self.assertEqual(0, len(cache.memory))
+
+        # small content found on disk is also kept in memory
+        cache.set('pid:1', 'DC', 'v1', 'content', 'http://fedora/dc')
+        other = DatastreamCache(directory=self.tmpdir)
+        self.assertEqual(('content', 'http://fedora/dc'), other.get('pid:1', 'DC', 'v1'))
+        self.assertEqual(1, len(other.memory))
+
+        cache.clear()
+        self.assertEqual(None, cache.get('pid:1', 'TEXT', 'v1'))
+
+
+if __name__ == '__main__':
+    main()
@@ -4,10 +4,13 @@ import os
 import tempfile
 
 from dateutil.tz import tzutc
+from mock import Mock
 from rdflib import URIRef, Graph as RdfGraph
 
 from eulcore.fedora import models
+from eulcore.fedora.cache import DatastreamCache
 from eulcore.fedora.rdfns import relsext, model as modelns
+from eulcore.fedora.util import ResponseStream
 from eulcore.fedora.xml import ObjectDatastream
 from eulcore.xmlmap.dc import DublinCore
 
@@ -83,6 +86,26 @@ class TestDatastreams(FedoraTestCase):
         self.assert_(isinstance(self.obj.text, models.DatastreamObject))
         self.assertEqual(self.obj.text.content, TEXT_CONTENT)
 
+    def test_content_cache(self):
+        cache = DatastreamCache()
+        self.obj.content_cache = cache
+        self.assertEqual(self.obj.text.content, TEXT_CONTENT)
+        self.assertEqual(1, len(cache.memory))
+
+        # a new copy of the object uses cached content for the current version
+        obj = MyDigitalObject(self.api, self.pid)
+        obj.content_cache = cache
+        obj.api = Mock(wraps=self.api)
+        self.assertEqual(obj.text.content, TEXT_CONTENT)
+        self.assertEqual(0, obj.api.getDatastreamDissemination.call_count)
+
+        # once the datastream changes, the cached copy is no longer used
+        obj.text.content = 'new text content'
+        obj.save()
+        obj = MyDigitalObject(self.api, self.pid)
+        obj.content_cache = cache
+        self.assertEqual('new text content', obj.text.content)
+
     def test_get_ds_info(self):
         self.assertEqual(self.obj.dc.label, "Dublin Core")
         self.assertEqual(self.obj.dc.mimetype, "text/xml")
@@ -168,6 +191,14 @@ class TestDatastreams(FedoraTestCase):
         # access via file datastream descriptor
         self.assert_(isinstance(self.obj.image, models.FileDatastreamObject))
         self.assertEqual(self.obj.image.content.read(), open(filename).read())
+        # content is buffered and can be re-read
+        self.obj.image.content.seek(0)
+        self.assertEqual(self.obj.image.content.read(), open(filename).read())
+        # or streamed from fedora
+        stream = self.obj.image.open_stream(chunk_size=1024)
+        self.assert_(isinstance(stream, ResponseStream))
+        self.assertEqual(''.join(stream), open(filename).read())
+        self.assertTrue(stream.closed)
 
         # update via descriptor
         self.assertFalse(self.obj.image.isModified())
@@ -537,6 +568,45 @@ class TestDigitalObject(FedoraTestCase):
 
         # how to force an error that can't be backed out?
 
+    def test_save_concurrently(self):
+        self.obj.save_workers = 4
+        self.obj.text.content = "some new text"
+        self.obj.dc.content.title = "new dublin core title"
+        self.assertTrue(self.obj.save())
+        data, url = self.obj.api.getDatastreamDissemination(self.pid, self.obj.text.id)
+        self.assertEqual("some new text", data)
+        data, url = self.obj.api.getDatastreamDissemination(self.pid, self.obj.dc.id)
+        self.assert_('<dc:title>new dublin core title</dc:title>' in data)
+
+        # a failure on one datastream backs out the others, as for sequential saves
+        self.obj = MyDigitalObject(self.api, self.pid)
+        self.obj.save_workers = 4
+        self.obj.text.content = "more new text"
+        self.obj.dc.content = "this is not dublin core!"
+        save_error = None
+        try:
+            self.obj.save()
+        except models.DigitalObjectSaveFailure, f:
+            save_error = f
+        self.assert_(isinstance(save_error, models.DigitalObjectSaveFailure))
+        self.assertEqual("DC", save_error.failure)
+        self.assertEqual(['TEXT', 'DC'], save_error.to_be_saved)
+        self.assertEqual(['TEXT'], save_error.saved)
+        self.assertEqual(['TEXT'], save_error.cleaned)
+        self.assertTrue(save_error.recovered)
+        data, url = self.obj.api.getDatastreamDissemination(self.pid, self.obj.text.id)
+        self.assertEqual("some new text", data)
+
+        # an exception on one datastream also backs out the others, and is re-raised
+        self.obj = MyDigitalObject(self.api, self.pid)
+        self.obj.save_workers = 4
+        self.obj.text.content = "more new text"
+        self.obj.dc.content.title = "another dublin core title"
+        self.obj.dc.save = Mock(side_effect=Exception('connection lost'))
+        self.assertRaises(Exception, self.obj.save)
+        data, url = self.obj.api.getDatastreamDissemination(self.pid, self.obj.text.id)
+        self.assertEqual("some new text", data)
+
     def test_datastreams_list(self):
         self.assert_("DC" in self.obj.ds_list.keys())
         self.assert_(isinstance(self.obj.ds_list["DC"], ObjectDatastream))
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+import httplib
+import socket
+import unittest
+
+from eulcore.util.connection import ConnectionPool
+from eulcore.fedora.util import RelativeServerConnection, RequestFailed, ResponseStream
+from testcore import main
+
+class FakeResponse(object):
+    # minimal stand-in for httplib.HTTPResponse
+    def __init__(self, status=200, content='content', will_close=False):
+        self.status = status
+        self.reason = 'reason'
+        self.content = content
+        self.will_close = will_close
+        self.closed = False
+
+    def read(self, amt=None):
+        if amt is None or amt >= len(self.content):
+            data, self.content = self.content, ''
+            self.closed = True
+        else:
+            data, self.content = self.content[:amt], self.content[amt:]
+        return data
+
+    def isclosed(self):
+        return self.closed
+
+    def close(self):
+        self.closed = True
+
+    def getheader(self, name, default=None):
+        return default
+
+class FakeConnection(object):
+    # connection that returns queued responses, or raises queued errors
+    responses = []
+
+    def __init__(self, host, timeout=None):
+        self.host = host
+        self.closed = False
+        self.requests = []
+
+    def request(self, method, url, body=None, headers=None):
+        self.requests.append((method, url, body))
+
+    def getresponse(self):
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def close(self):
+        self.closed = True
+
+
+class HttpServerConnectionTest(unittest.TestCase):
+    # connection pooling tests do not require a Fedora server
+
+    def setUp(self):
+        self.conn = RelativeServerConnection('http://localhost:8080/fedora/')
+        self.conn.pool = ConnectionPool(FakeConnection, 'localhost:8080', max_size=2)
+        FakeConnection.responses = []
+
+    def test_shared_pool(self):
+        conn = RelativeServerConnection('http://localhost:8080/fedora/', max_size=4)
+        other = RelativeServerConnection('http://localhost:8080/other/')
+        self.assert_(conn.pool is other.pool)
+        self.assertEqual(4, other.pool.max_size)
+        self.assertEqual('localhost:8080', conn.pool.host)
+
+    def test_read(self):
+        FakeConnection.responses = [FakeResponse(), FakeResponse(content='more')]
+        data, url = self.conn.read('objects')
+        self.assertEqual('content', data)
+        self.assertEqual('http://localhost:8080/fedora/objects', url)
+        # connection is returned to the pool and reused
+        data, url = self.conn.read('objects')
+        self.assertEqual('more', data)
+        self.assertEqual(2, self.conn.pool.checkouts)
+        self.assertEqual(1, self.conn.pool.connects)
+
+    def test_will_close(self):
+        FakeConnection.responses = [FakeResponse(will_close=True), FakeResponse()]
+        self.conn.read('objects')
+        self.conn.read('objects')
+        self.assertEqual(2, self.conn.pool.connects)
+
+    def test_errors(self):
+        FakeConnection.responses = [FakeResponse(status=404)]
+        self.assertRaises(RequestFailed, self.conn.read, 'objects/bogus')
+        # unread error content; connection is not reused
+        self.assertEqual(0, self.conn.pool.size)
+
+    def test_stream(self):
+        FakeConnection.responses = [FakeResponse(content='0123456789'), FakeResponse()]
+        stream = self.conn.stream('content', chunk_size=4)[0]
+        self.assert_(isinstance(stream, ResponseStream))
+        self.assertEqual(['0123', '4567', '89'], list(stream))
+        self.assertEqual(1, self.conn.pool.size)
+        # partially read stream; connection is closed
+        stream = self.conn.stream('content')[0]
+        stream.read(2)
+        stream.close()
+        self.assertEqual(0, self.conn.pool.size)
+
+    def test_stream_released_when_read(self):
+        FakeConnection.responses = [FakeResponse(), FakeResponse(content='more')]
+        stream = self.conn.stream('content')[0]
+        self.assertEqual('content', stream.read())
+        # connection is returned to the pool without closing the stream
+        self.assertEqual(1, len(self.conn.pool._idle))
+        self.assertEqual('', stream.read())
+        stream.close()
+        data, url = self.conn.read('objects')
+        self.assertEqual('more', data)
+        self.assertEqual(1, self.conn.pool.connects)
+
+    def test_stream_not_closed(self):
+        # streams that are dropped without being closed don't fill the pool
+        FakeConnection.responses = [FakeResponse(), FakeResponse(), FakeResponse()]
+        for i in range(3):
+            stream = self.conn.stream('content')[0]
+            stream.read(2)
+            del stream
+        self.assertEqual(0, self.conn.pool.size)
+        self.assertEqual(3, self.conn.pool.connects)
+
+    def test_stale_connection(self):
+        FakeConnection.responses = [FakeResponse(), httplib.BadStatusLine(''),
+                                    FakeResponse(content='retried')]
+        self.conn.read('objects')
+        # reused connection was closed by the server; retried on a new one
+        data, url = self.conn.read('objects')
+        self.assertEqual('retried', data)
+        self.assertEqual(1, self.conn.pool.reconnects)
+
+        # errors on a new connection are not retried
+        FakeConnection.responses = [socket.error(104, 'Connection reset by peer')]
+        self.conn.pool.clear()
+        self.assertRaises(socket.error, self.conn.read, 'objects')
+        self.assertEqual(0, self.conn.pool.size)
+
+
+if __name__ == '__main__':
+    main()
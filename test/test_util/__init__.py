@@ -0,0 +1,3 @@
+from test_util.test_cache import *
+from test_util.test_connection import *
+from test_util.test_workers import *
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from eulcore.util.cache import LRUCache, DiskCache
+from testcore import main
+
+class LRUCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = LRUCache(max_size=2)
+
+    def test_get_set(self):
+        self.assertEqual(None, self.cache.get('a'))
+        self.assertEqual('default', self.cache.get('a', 'default'))
+        self.cache.set('a', 1)
+        self.assertEqual(1, self.cache.get('a'))
+        self.assert_('a' in self.cache)
+        self.cache.set('a', 2)
+        self.assertEqual(2, self.cache.get('a'))
+        self.assertEqual(1, len(self.cache))
+        self.assertEqual(2, self.cache.hits)
+        self.assertEqual(2, self.cache.misses)
+
+    def test_max_size(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        # accessing a makes b the least recently used item
+        self.cache.get('a')
+        self.cache.set('c', 3)
+        self.assertEqual(2, len(self.cache))
+        self.assert_('b' not in self.cache)
+        self.assertEqual(1, self.cache.get('a'))
+        self.assertEqual(3, self.cache.get('c'))
+
+    def test_delete_clear(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.delete('a')
+        self.cache.delete('not-there')
+        self.assert_('a' not in self.cache)
+        self.cache.get('b')
+        self.cache.clear()
+        self.assertEqual(0, len(self.cache))
+        self.assertEqual(0, self.cache.hits)
+        self.cache.set('c', 3)
+        self.assertEqual(3, self.cache.get('c'))
+
+
+class DiskCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = DiskCache(os.path.join(self.directory, 'cache'), key_prefix='test-')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_get_set(self):
+        self.assertEqual(None, self.cache.get('test-a'))
+        self.cache.set('test-a', {'value': 1})
+        self.assertEqual({'value': 1}, self.cache.get('test-a'))
+        # another cache using the same directory sees the same data
+        other = DiskCache(self.cache.directory)
+        self.assertEqual({'value': 1}, other.get('test-a'))
+        self.cache.delete('test-a')
+        self.cache.delete('test-not-there')
+        self.assertEqual(None, self.cache.get('test-a'))
+
+    def test_clear(self):
+        # only values with the cache's key prefix are removed
+        other = DiskCache(self.cache.directory, key_prefix='other-')
+        self.cache.set('test-a', 1)
+        other.set('other-a', 2)
+        self.cache.clear()
+        self.assertEqual(None, self.cache.get('test-a'))
+        self.assertEqual(2, other.get('other-a'))
+
+    def test_timeout(self):
+        self.cache.timeout = -1
+        self.cache.set('test-a', 'data')
+        self.assertEqual(None, self.cache.get('test-a'))
+
+
+if __name__ == '__main__':
+    main()
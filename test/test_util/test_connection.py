@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+
+import socket
+import threading
+import unittest
+
+from eulcore.util.connection import ConnectionPool, ConnectionPoolTimeout, \
+     get_connection_pool
+from testcore import main
+
+class FakeConnection(object):
+    def __init__(self, host, timeout=None):
+        self.host = host
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+class ConnectionPoolTest(unittest.TestCase):
+    def test_get_release(self):
+        pool = ConnectionPool(FakeConnection, 'localhost:8080')
+        conn, reused = pool.get()
+        self.assertEqual('localhost:8080', conn.host)
+        self.assertFalse(reused)
+        pool.release(conn)
+        # released connection is reused
+        conn2, reused = pool.get()
+        self.assert_(conn2 is conn)
+        self.assertTrue(reused)
+        # explicitly request a new connection
+        pool.release(conn2)
+        conn3, reused = pool.get(reuse=False)
+        self.assert_(conn3 is not conn)
+        self.assertFalse(reused)
+        # discarded connections are closed
+        pool.discard(conn3)
+        self.assertTrue(conn3.closed)
+        pool.clear()
+        self.assertTrue(conn.closed)
+
+    def test_idle_timeout(self):
+        pool = ConnectionPool(FakeConnection, 'localhost', idle_timeout=-1)
+        conn, reused = pool.get()
+        pool.release(conn)
+        conn2, reused = pool.get()
+        self.assertFalse(reused)
+        self.assertTrue(conn.closed)
+
+    def test_max_size(self):
+        pool = ConnectionPool(FakeConnection, 'localhost', max_size=1)
+        conn, reused = pool.get()
+        checked_out = []
+        waiter = threading.Thread(target=lambda: checked_out.append(pool.get()))
+        waiter.start()
+        waiter.join(0.1)
+        # second request waits until the connection is returned
+        self.assertEqual([], checked_out)
+        pool.release(conn)
+        waiter.join(1)
+        self.assertEqual([(conn, True)], checked_out)
+
+    def test_wait_timeout(self):
+        pool = ConnectionPool(FakeConnection, 'localhost', max_size=1, wait_timeout=0.05)
+        conn, reused = pool.get()
+        self.assertRaises(ConnectionPoolTimeout, pool.get)
+        self.assertRaises(socket.timeout, pool.get, timeout=0.01)
+        # the connection is still available once returned
+        pool.release(conn)
+        self.assertEqual((conn, True), pool.get())
+
+    def test_shared_pools(self):
+        pool = get_connection_pool(FakeConnection, 'localhost:8080')
+        self.assert_(pool is get_connection_pool(FakeConnection, 'localhost:8080'))
+        self.assert_(pool is not get_connection_pool(FakeConnection, 'otherhost'))
+        # size settings apply to the shared pool
+        pool = get_connection_pool(FakeConnection, 'sizedhost', max_size=3, idle_timeout=5,
+                                   wait_timeout=10)
+        self.assertEqual(3, pool.max_size)
+        self.assertEqual(5, pool.idle_timeout)
+        self.assertEqual(10, pool.wait_timeout)
+
+    def test_stats(self):
+        pool = ConnectionPool(FakeConnection, 'localhost', max_size=1)
+        conn, reused = pool.get()
+        self.assertEqual(1, pool.size)
+        waiter = threading.Thread(target=pool.get)
+        waiter.start()
+        waiter.join(0.1)
+        pool.release(conn)
+        waiter.join(1)
+        self.assertEqual(2, pool.checkouts)
+        self.assertEqual(1, pool.waits)
+        self.assertEqual(1, pool.connects)
+        pool.discard(conn)
+        conn, reused = pool.get(reuse=False)
+        self.assertEqual(1, pool.reconnects)
+        self.assertEqual(2, pool.connects)
+
+    def test_closed_by_server(self):
+        # idle connections closed by the server are not reused
+        pool = ConnectionPool(FakeConnection, 'localhost')
+        conn, reused = pool.get()
+        conn.sock, server = socket.socketpair()
+        pool.release(conn)
+        conn2, reused = pool.get()
+        self.assert_(conn2 is conn)
+        pool.release(conn2)
+        server.close()
+        conn3, reused = pool.get()
+        self.assert_(conn3 is not conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(1, pool.size)
+        conn.sock.close()
+
+
+if __name__ == '__main__':
+    main()
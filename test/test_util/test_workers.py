@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+
+import threading
+import unittest
+
+from eulcore.util.workers import WorkerPool, gather
+from testcore import main
+
+class WorkerPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = WorkerPool(workers=2)
+
+    def test_submit(self):
+        result = self.pool.submit(lambda x, y=1: x + y, 1, y=2)
+        self.assertEqual(3, result.get(1))
+        self.assertTrue(result.ready())
+
+    def test_exception(self):
+        def fail():
+            raise ValueError('bad value')
+        result = self.pool.submit(fail)
+        self.assertRaises(ValueError, result.get, 1)
+
+    def test_concurrent(self):
+        # both functions must be running at the same time to finish
+        barrier = threading.Semaphore(0)
+        def wait():
+            barrier.release()
+            barrier.acquire()
+            return True
+        self.assertEqual([True, True], gather(self.pool.submit(wait), self.pool.submit(wait)))
+
+    def test_timeout(self):
+        event = threading.Event()
+        result = self.pool.submit(event.wait)
+        self.assertRaises(RuntimeError, result.get, 0.01)
+        event.set()
+
+
+if __name__ == '__main__':
+    main()